@@ -1,58 +1,152 @@
 # file: analyse_staff.py
-import os, io, time, json, logging, requests
+import os, io, time, json, logging, contextvars
+from collections import Counter
+from types import SimpleNamespace
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
-import torch
+import numpy as np
 from dotenv import load_dotenv
-from pydub import AudioSegment
 from tqdm import tqdm
-from openai import OpenAI
 import re
 
-import warnings, torchaudio
+import analyze
+import api_client
+import models
+import tracing
+import voice_bank
+from assessment import ASSESS_MODEL, SCORE_KEYS, AssessmentError, assess_request, parse_assessment
+from audio import AUDIO_SAMPLE_RATE, CallAudio, plan_chunks
+from cache import cache, text_fingerprint
+from channel_diarization import channel_turns
+from keywords import KEYWORDS
+from models import DIAR_PIPELINE
+from stage_graph import run_graph
+from word_table import SegmentTable, WordTable
+
+# torch, pyannote and openai are imported lazily by the model registry
+import warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="torchaudio")
 
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-HF_TOKEN= os.getenv("HF_TOKEN")
 
 
 
-AUDIO_SAMPLE_RATE = 16_000
+WHISPER_MODEL = "whisper-1"
+# calls longer than this are cut at pauses and transcribed as parallel requests;
+# 120 s of 16 kHz WAV is ~3.8 MB, far below the 25 MB upload limit
+WHISPER_CHUNK_SEC = float(os.getenv("WHISPER_CHUNK_SEC", "120"))
+WHISPER_PARALLEL = int(os.getenv("WHISPER_PARALLEL", "8"))
+# "openai" (whisper-1 API) or "local" (faster-whisper on CPU, see local_whisper.py)
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "openai")
+LOCAL_WHISPER_SIZE = os.getenv("LOCAL_WHISPER_SIZE", "small")
+GPT_MODEL = "gpt-4-turbo-preview"
+# "cascade": skip / local heuristic / small model / ASSESS_MODEL, cheapest that is sure (default)
+# "combined": one structured request for scores + coaching on ASSESS_MODEL
+# "split": the original gpt_score + gpt_summary pair
+SCORING_MODE = os.getenv("SCORING_MODE", "cascade")
+CASCADE_SMALL_MODEL = os.getenv("CASCADE_SMALL_MODEL", "gpt-4o-mini")
+CASCADE_MIN_WORDS = int(os.getenv("CASCADE_MIN_WORDS", "15"))        # fewer agent words: skip
+CASCADE_LOCAL = os.getenv("CASCADE_LOCAL", "on").lower() not in ("0", "off", "false", "no")
+CASCADE_LOCAL_MIN_SEGMENTS = int(os.getenv("CASCADE_LOCAL_MIN_SEGMENTS", "10"))
+# analyze.py score (-1..3) decided locally: below LOW (exclusive, so by default only calls
+# with net hesitation; no keyword evidence at all is not clear-cut) or at least HIGH
+CASCADE_LOCAL_LOW = float(os.getenv("CASCADE_LOCAL_LOW", "0.0"))
+CASCADE_LOCAL_HIGH = float(os.getenv("CASCADE_LOCAL_HIGH", "2.0"))
+CASCADE_PASS_MARK = float(os.getenv("CASCADE_PASS_MARK", "60"))      # small-model staff_score within
+CASCADE_MARGIN = float(os.getenv("CASCADE_MARGIN", "10"))            # MARGIN of it goes to the large model
+# "full": pyannote defaults; "fast": two speakers, coarser step (see fast_diarization.py);
+# "enrolled": agent-vs-customer assignment when the call's agent is enrolled (voice_bank.py)
+DIAR_MODE = os.getenv("DIAR_MODE", "full")
+# stereo calls (one party per channel) take turns from channel VAD unless "off"
+DIAR_CHANNELS = os.getenv("DIAR_CHANNELS", "auto")
 logging.basicConfig(
     filename="logs/staff_score.log",
     level=logging.INFO,
     format="%(asctime)s | %(levelname)s | %(message)s",
 )
+# stage timings live in tracing spans; keep model-library chatter out of the log
+logging.getLogger("speechbrain").setLevel(logging.WARNING)
 
 # Block  Tiny helpers
 def ts() -> str:
     return datetime.utcnow().strftime("%H:%M:%S")
 
+@tracing.spanned("download")
 def download_to_bytes(url: str) -> io.BytesIO:
     logging.info(f"Downloading {url}")
-    resp = requests.get(url, timeout=120)
-    resp.raise_for_status()
-    return io.BytesIO(resp.content)
+    return io.BytesIO(api_client.download(url))
+
+@tracing.spanned("decode")
+def decode_audio(raw_bytes: io.BytesIO) -> CallAudio:
+    """Decode once to 16 kHz mono PCM shared by Whisper and pyannote."""
+    audio = CallAudio.from_bytes(raw_bytes)
+    tracing.set_attrs(audio_sec=round(audio.duration, 3))
+    tracing.add(bytes_in=raw_bytes.getbuffer().nbytes)
+    return audio
 
 def convert_to_wav(raw_bytes: io.BytesIO) -> io.BytesIO:
     """Return 16 kHz mono WAV in memory."""
-    audio = AudioSegment.from_file(raw_bytes).set_channels(1).set_frame_rate(AUDIO_SAMPLE_RATE)
-    out = io.BytesIO()
-    audio.export(out, format="wav")
-    out.seek(0)
-    return out
+    return io.BytesIO(decode_audio(raw_bytes).wav_bytes())
 
 # Block 3:
-def whisper_json(wav_bytes: io.BytesIO, language: str = "ta"):
-    wav_bytes.seek(0)
+@tracing.spanned("whisper")
+def whisper_json(audio: CallAudio, language: str = "ta"):
+    tracing.set_attrs(audio_sec=round(audio.duration, 3), backend=WHISPER_BACKEND)
+    if WHISPER_BACKEND == "local":
+        name = f"faster-whisper:{LOCAL_WHISPER_SIZE}"
+        key = cache.key("whisper", audio.fingerprint(), model=name, language=language,
+                        compute_type=os.getenv("LOCAL_WHISPER_COMPUTE", "int8"))
+        return cache.get_or_compute(
+            key, lambda: models.get(name).transcribe(audio, language)["transcribe"])
+
+    key = cache.key("whisper", audio.fingerprint(),
+                    model=WHISPER_MODEL, language=language, granularity="word",
+                    chunk_sec=WHISPER_CHUNK_SEC,
+                    upload_codec=os.getenv("WHISPER_UPLOAD_CODEC", "auto"))
+    return cache.get_or_compute(key, lambda: _whisper_chunked(audio, language))
+
+def _whisper_chunked(audio: CallAudio, language: str):
+    """
+    Cut long audio at pauses, transcribe the pieces concurrently and stitch
+    the words back onto one timeline.  Short audio is a single request.
+    """
+    bounds = plan_chunks(audio.pcm, audio.sample_rate, WHISPER_CHUNK_SEC)
+    if len(bounds) == 1:
+        return _whisper_json(audio, language)
+
+    logging.info(f"Whisper: {len(bounds)} chunks of <= {WHISPER_CHUNK_SEC:.0f} s")
+    with ThreadPoolExecutor(max_workers=min(WHISPER_PARALLEL, len(bounds))) as pool:
+        # each chunk request runs in a copy of this context, so it counts toward the whisper span
+        futures = [pool.submit(contextvars.copy_context().run, _whisper_json, audio.slice(*b), language)
+                   for b in bounds]
+        parts = [f.result() for f in futures]
+    return stitch_transcripts(parts, [s / audio.sample_rate for s, _ in bounds])
+
+def stitch_transcripts(parts: list, offsets: list[float]):
+    """
+    Merge per-chunk verbose_json results into one object with .text/.words,
+    shifting every word by its chunk's start offset (seconds).
+    """
+    words = [
+        SimpleNamespace(word=w.word, start=w.start + off, end=w.end + off)
+        for part, off in zip(parts, offsets)
+        for w in (part.words or [])
+    ]
+    return SimpleNamespace(
+        text=" ".join(p.text.strip() for p in parts if p.text),
+        words=words,
+        language=getattr(parts[0], "language", None),
+        duration=offsets[-1] + (getattr(parts[-1], "duration", None) or 0),
+    )
+
+def _whisper_json(audio: CallAudio, language: str):
     logging.info("Whisper start")
-    result = client.audio.transcriptions.create(
-    model="whisper-1",
-    file=("audio.wav", wav_bytes.read()),
+    result = api_client.transcribe(
+    model=WHISPER_MODEL,
+    file=audio.upload_file(),   # FLAC/Opus, see WHISPER_UPLOAD_CODEC
     response_format="verbose_json",   # gives word-level timestamps
     language=language,
     timestamp_granularities=["word"]
@@ -61,102 +155,181 @@ def whisper_json(wav_bytes: io.BytesIO, language: str = "ta"):
     return result  # OpenAI object with .words and .text
 
 # BLOCK 4 – speaker diarization (pyannote)
-from pyannote.audio import Pipeline
-pipeline = Pipeline.from_pretrained(
-    "pyannote/speaker-diarization-3.1",
-    use_auth_token=HF_TOKEN  # hugging-face token once
-)
-# pipeline.to(torch.device("cpu"))  # or "cuda" if you have GPU
+# the pipeline is loaded on first use: models.get("diarization")
+# models.get("diarization").to(torch.device("cpu"))  # or "cuda" if you have GPU
 
-def diarize(wav_bytes: io.BytesIO):
-    wav_bytes.seek(0)
-    logging.info("Diarization start")
-    # pyannote needs a file-like object that supports seeking
-    diar = pipeline({"uri": "memo", "audio": wav_bytes})
+@tracing.spanned("diarize")
+def diarize(audio: CallAudio, mode: str = None, agent_id: str = None):
+    """
+    <mode> (default DIAR_MODE): "full", "fast" or "enrolled"; the latter runs a
+    two-class assignment against <agent_id>'s enrolled voice, and is "full" for
+    calls whose agent is unknown or not enrolled.
+    """
+    tracing.set_attrs(audio_sec=round(audio.duration, 3))
+    if audio.channels is not None and DIAR_CHANNELS != "off":
+        # one speaker per channel: milliseconds of numpy, not worth a cache entry
+        logging.info(f"Diarization from {len(audio.channels)} channels")
+        return channel_turns(audio.channels, audio.sample_rate)
+    mode = mode or DIAR_MODE
+    params, agent = {}, None
+    if mode == "enrolled":
+        vb = voice_bank.bank()
+        if agent_id is not None and agent_id in vb:
+            agent = vb.vector(agent_id).copy()
+            params = {"mode": mode, "agent": text_fingerprint(agent.tobytes().hex()),
+                      "threshold": voice_bank.DIAR_THRESHOLD}
+        else:
+            mode = "full"
+    if mode == "fast":
+        from fast_diarization import FAST_PARAMS
+        params = {"mode": mode, **{k: v for k, v in FAST_PARAMS.items() if k != "torch_threads"}}
+    if models.DIAR_BACKEND == "onnx":
+        import onnx_diarization
+        params.update(onnx_diarization.cache_params())
+    key = cache.key("diarize", audio.fingerprint(), pipeline=DIAR_PIPELINE, **params)
+    return cache.get_or_compute(key, lambda: _diarize(audio, mode, agent))
+
+def _diarize(audio: CallAudio, mode: str = "full", agent: np.ndarray = None):
+    logging.info(f"Diarization start ({mode})")
+    # pre-decoded waveform: pyannote skips its own file decode
+    if mode == "fast":
+        diar = models.get("diarization-fast")(audio.pyannote_input(), num_speakers=2)
+    elif mode == "enrolled":
+        with voice_bank.enrolled_agent(agent):
+            diar = models.get("diarization-enrolled")(audio.pyannote_input())
+    else:
+        diar = models.get("diarization")(audio.pyannote_input())
     logging.info("Diarization done")
     return diar  # pyannote.core.Annotation object
 
+def pipeline_models() -> list:
+    """Registry names (models.py) analyse_call loads under the current DIAR_MODE / WHISPER_BACKEND."""
+    # enrolled mode runs the full pipeline for calls whose agent is unknown
+    names = {"fast": ["diarization-fast"],
+             "enrolled": ["diarization-enrolled", "diarization"]}.get(DIAR_MODE, ["diarization"])
+    if voice_bank.active():
+        names.append("speaker-embedding")
+    if WHISPER_BACKEND == "local":
+        names.append(f"faster-whisper:{LOCAL_WHISPER_SIZE}")
+    return names
+
+@tracing.spanned("voices")
+def speaker_voices(audio: CallAudio, diar) -> dict:
+    """{diar label: speaker embedding} for voice identification; {} if that fails."""
+    turns = [(round(seg.start, 3), round(seg.end, 3), label)
+             for seg, _, label in diar.itertracks(yield_label=True)]
+    key = cache.key("voices", audio.fingerprint(), turns=text_fingerprint(json.dumps(turns)),
+                    model=models.SPEAKER_EMBEDDING, windows=voice_bank.MAX_WINDOWS)
+    try:
+        return cache.get_or_compute(key, lambda: voice_bank.speaker_embeddings(audio, diar))
+    except Exception as e:
+        logging.warning(f"Speaker embeddings failed, tagging staff by keywords: {e}")
+        return {}
+
 # BLOCK 5 – fuse Whisper words + diar labels
+def flatten_turns(diar):
+    """
+    Flatten a pyannote Annotation into start-sorted arrays
+    (starts, ends, label codes) plus the sorted label list the codes index.
+    """
+    turns = sorted((seg.start, seg.end, label) for seg, _, label in diar.itertracks(yield_label=True))
+    labels = sorted({label for _, _, label in turns})
+    code = {label: i for i, label in enumerate(labels)}
+    starts = np.array([t[0] for t in turns], dtype=np.float64)
+    ends = np.array([t[1] for t in turns], dtype=np.float64)
+    codes = np.array([code[t[2]] for t in turns], dtype=np.int64)
+    return starts, ends, codes, labels
+
+def assign_speakers(mids: np.ndarray, starts, ends, codes) -> np.ndarray:
+    """
+    Label code of the turn covering each midpoint, in one searchsorted pass.
+    Overlapping turns resolve to the lowest label (as Annotation.argmax does on
+    ties); midpoints in a gap take the nearest turn.
+    """
+    if len(starts) == 0:
+        return np.full(len(mids), -1, dtype=np.int64)
+
+    # turns [0, k) have started by mid; reach[k-1] = furthest end among them
+    k = np.searchsorted(starts, mids, side="right")
+    reach = np.maximum.accumulate(ends)
+    reach_idx = np.maximum.accumulate(np.where(ends == reach, np.arange(len(ends)), 0))
+    prev = np.clip(k - 1, 0, None)
+    covered = (k > 0) & (reach[prev] > mids)
+
+    out = np.empty(len(mids), dtype=np.int64)
+    # gaps: previous-ending turn vs next-starting turn, whichever is closer
+    gap_prev = np.where(k > 0, mids - reach[prev], np.inf)
+    nxt = np.clip(k, None, len(starts) - 1)
+    gap_next = np.where(k < len(starts), starts[nxt] - mids, np.inf)
+    out[:] = np.where(gap_prev <= gap_next, codes[reach_idx[prev]], codes[nxt])
+
+    # covered: the latest-started turn covers mid unless overlap is involved
+    last = codes[prev]
+    simple = covered & (ends[prev] > mids) & ((prev == 0) | (reach[prev - 1] <= mids))
+    out[simple] = last[simple]
+
+    # overlapped speech: sweep back over the started turns that still reach mid
+    for i in np.flatnonzero(covered & ~simple):
+        m, j, best = mids[i], prev[i], None
+        while j >= 0 and reach[j] > m:
+            if ends[j] > m and (best is None or codes[j] < best):
+                best = codes[j]
+            j -= 1
+        out[i] = best
+    return out
+
+@tracing.spanned("align")
+def align_word_table(whisper_result, diar) -> WordTable:
+    """
+    Columnar form of align_words_to_speakers(): one WordTable instead of a
+    dict per word.  Each word takes the speaker covering its midpoint.
+    """
+    words = whisper_result.words
+    starts, ends, codes, labels = flatten_turns(diar)
+    mids = np.array([(w.start + w.end) / 2 for w in words], dtype=np.float64)
+    return WordTable.from_words(words, assign_speakers(mids, starts, ends, codes), labels)
+
 def align_words_to_speakers(whisper_result, diar) -> list[dict]:
     """
     Returns list of dicts:
     {"word": "வணக்கம்", "start": 0.34, "end": 0.88, "speaker": "SPEAKER_00"}
+    Each word takes the speaker covering its midpoint.
     """
-    words = whisper_result.words
-    aligned = []
-    for w in words:
-        start, end = w.start, w.end
-        # pick speaker that covers the middle of the word
-        mid = (start + end) / 2
-        # speaker = diar.crop((mid, mid)).argmax()
-        segment = diar.crop((mid, mid))
-        speaker = segment.argmax() if segment else "UNKNOWN"
-        aligned.append({
-            "word": w.word.strip(),
-            "start": start,
-            "end": end,
-            "speaker": speaker
-        })
-    return aligned
+    return align_word_table(whisper_result, diar).to_dicts()
 
 # BLOCK 6 – build speaker segments
-def build_segments(aligned_words: list[dict], min_sec=1.0) -> list[dict]:
+@tracing.spanned("segment")
+def build_segments(aligned_words, min_sec=1.0) -> list[dict]:
     """
     Group consecutive same-speaker words into segments.
     [{"speaker": "SPEAKER_00", "text": "வணக்கம் மெம்", "start": 0.34, "end": 2.10}, ...]
+    <aligned_words> is a WordTable or align_words_to_speakers() dicts.
     """
-    segments = []
-    current_spk = None
-    buf_words = []
-    buf_start = None
-
-    for w in aligned_words:
-        if w["speaker"] != current_spk:
-            # flush previous
-            if buf_words and (buf_words[-1]["end"] - buf_start) >= min_sec:
-                segments.append({
-                    "speaker": current_spk,
-                    "text": " ".join([ww["word"] for ww in buf_words]),
-                    "start": buf_start,
-                    "end": buf_words[-1]["end"]
-                })
-            # new bucket
-            current_spk = w["speaker"]
-            buf_words = [w]
-            buf_start = w["start"]
-        else:
-            buf_words.append(w)
-
-    # final flush
-    if buf_words and (buf_words[-1]["end"] - buf_start) >= min_sec:
-        segments.append({
-            "speaker": current_spk,
-            "text": " ".join([ww["word"] for ww in buf_words]),
-            "start": buf_start,
-            "end": buf_words[-1]["end"]
-        })
-    return segments
+    if not isinstance(aligned_words, WordTable):
+        aligned_words = WordTable.from_dicts(aligned_words)
+    return aligned_words.segments(min_sec).to_dicts()
 
 # BLOCK 7 – identify staff speaker
-def tag_staff_Speaker(segments: list[dict]) -> str:
+def tag_staff_Speaker(segments) -> str:
     """
-    Heuristic: speaker who speaks first AND mentions company keyword.
-    Returns the speaker label to be scored.
+    Heuristic: speaker who speaks first AND mentions company keyword
+    (keywords.LEXICONS["company"]).  Returns the speaker label to be scored.
+    <segments> is a SegmentTable or build_segments() dicts.
     """
-    keywords = {"பஜாஜ்", "bajaj", "பஜார்", "finance", "பைனான்ஸ்"}
-    for seg in segments:
-        if any(k in seg["text"].lower() for k in keywords):
-            return seg["speaker"]
-    # fallback: most talkative speaker
-    from collections import Counter
-    dur = Counter()
-    for s in segments:
-        dur[s["speaker"]] += s["end"] - s["start"]
-    return dur.most_common(1)[0][0]   # longest
+    if not isinstance(segments, SegmentTable):
+        segments = SegmentTable.from_dicts(segments)
+    speakers = segments.speakers()
+    for speaker, cats in zip(speakers, KEYWORDS.categories_many(segments.texts())):
+        if "company" in cats:
+            return speaker
+    # fallback: most talkative speaker; ties go to whoever spoke first
+    talk = segments.talk_time()
+    return max(dict.fromkeys(speakers), key=lambda sp: talk.get(sp, 0.0))
 
 # BLOCK 8 – score agent text via GPT-4
 import re
 
+@tracing.spanned("score")
 def gpt_score(agent_text: str) -> dict:
     prompt = (
         "You are a call-centre quality analyst.\n"
@@ -166,13 +339,22 @@ def gpt_score(agent_text: str) -> dict:
         "{\"politeness\":<int>,\"clarity\":<int>,\"knowledge\":<int>,\"compliance\":<int>}\n\n"
         f"Transcript:\n{agent_text}"
     )
+    key = cache.key("score", text_fingerprint(prompt), model=GPT_MODEL, temperature=0)
+    try:
+        return cache.get_or_compute(key, lambda: _gpt_score(prompt))
+    except ValueError as e:
+        # ultimate fallback, applied outside the cache so the next run asks again
+        logging.warning(f"GPT returned no usable scores ({e}), using 0 scores")
+        return {"politeness": 0, "clarity": 0, "knowledge": 0, "compliance": 0}
+
+def _gpt_score(prompt: str) -> dict:
     logging.info("GPT-4 scoring start")
-    resp = client.chat.completions.create(
-        model="gpt-4-turbo-preview",
+    resp = api_client.chat(
+        model=GPT_MODEL,
         messages=[{"role": "user", "content": prompt}],
         temperature=0
     )
-    txt = resp.choices[0].message.content.strip()
+    txt = (resp.choices[0].message.content or "").strip()
     logging.info("GPT-4 raw reply: %s", txt)
 
     # --- safe parse ---
@@ -183,28 +365,117 @@ def gpt_score(agent_text: str) -> dict:
         m = re.search(r'\{.*?\}', txt, flags=re.DOTALL)
         if m:
             return json.loads(m.group(0))
-        # ultimate fallback
-        logging.warning("GPT returned non-JSON, using 0 scores")
-        return {"politeness": 0, "clarity": 0, "knowledge": 0, "compliance": 0}
+        raise ValueError("non-JSON reply")
 
 # BLOCK 9 – coaching summary (optional)
+@tracing.spanned("summary")
 def gpt_summary(agent_text: str) -> str:
     prompt = (
         "Summarise in 3 bullets what the agent did well and 3 bullets for improvement.\n"
         "Keep each bullet under 12 words.\n\n"
         f"Transcript:\n{agent_text}"
     )
-    resp = client.chat.completions.create(
-        model="gpt-4-turbo-preview",
+    key = cache.key("summary", text_fingerprint(prompt), model=GPT_MODEL, temperature=0.3)
+    return cache.get_or_compute(key, lambda: _gpt_summary(prompt))
+
+def _gpt_summary(prompt: str) -> str:
+    resp = api_client.chat(
+        model=GPT_MODEL,
         messages=[{"role": "user", "content": prompt}],
         temperature=0.3
     )
     return resp.choices[0].message.content
 
+# BLOCK 9b – scores + coaching in one structured request (schema and parser: assessment.py)
+@tracing.spanned("assess")
+def gpt_assess(agent_text: str, model: str = None, fallback: bool = True) -> tuple[dict, str]:
+    """
+    (score_dict, summary) from a single schema-validated request.  An unusable
+    reply raises AssessmentError, or with <fallback> gives 0 scores and no
+    summary; either way nothing is cached, so the next run asks again.
+    """
+    body = assess_request(agent_text, model)
+    tracing.set_attrs(model=body["model"])
+    key = cache.key("assess", text_fingerprint(json.dumps(body, sort_keys=True, ensure_ascii=False)))
+    try:
+        return cache.get_or_compute(key, lambda: _gpt_assess(body))
+    except AssessmentError as e:
+        if not fallback:
+            raise
+        logging.warning(f"Assessment by {body['model']} unusable ({e}), using 0 scores")
+        return {k: 0 for k in SCORE_KEYS}, ""
+
+def _gpt_assess(body: dict) -> tuple[dict, str]:
+    logging.info("GPT assessment start")
+    resp = api_client.chat(**body)
+    message = resp.choices[0].message
+    if getattr(message, "refusal", None):
+        raise AssessmentError(f"refused: {message.refusal}")
+    try:
+        return parse_assessment(message.content)
+    except AssessmentError:
+        logging.info(f"Assessment reply failed the schema check: {message.content!r}")
+        raise
+
+# BLOCK 9c – tiered scoring cascade
+def cascade_assess(view: dict) -> tuple[dict, str, dict]:
+    """
+    (score_dict, summary, route) from the cheapest tier that is sure of the call:
+      skip   no usable agent text (empty, < CASCADE_MIN_WORDS, or the staff label
+             looks misattributed); no request, empty scores
+      local  the analyze.py keyword score is clear-cut (CASCADE_LOCAL_LOW/HIGH);
+             only a staff_score (in the route), no rubric breakdown
+      small  CASCADE_SMALL_MODEL, unless its reply is unusable or borderline
+      large  ASSESS_MODEL
+    """
+    segments, staff_label, agent_text = view["segments"], view["staff_label"], view["agent_text"]
+    n_words = len(agent_text.split())
+    if n_words < CASCADE_MIN_WORDS:
+        return {}, "", _route("skip", f"{n_words} agent words")
+
+    hits = KEYWORDS.categories_many([s["text"] for s in segments])
+    staff_terms = Counter()
+    for seg, cats in zip(segments, hits):
+        staff_terms[seg["speaker"]] += len(cats & {"company", "loan", "eligibility", "closing"})
+    other = max((sp for sp in staff_terms if sp != staff_label), key=staff_terms.get, default=None)
+    if other is not None and staff_terms[staff_label] == 0 and staff_terms[other] > 0:
+        return {}, "", _route("skip", f"misattributed: {other} uses the agent vocabulary")
+
+    agent_segments = sum(seg["speaker"] == staff_label for seg in segments)
+    local = analyze.score_staff_segments(segments, staff_label, hits)
+    if CASCADE_LOCAL and agent_segments >= CASCADE_LOCAL_MIN_SEGMENTS and \
+            (local < CASCADE_LOCAL_LOW or local >= CASCADE_LOCAL_HIGH):
+        # one keyword number says nothing per rubric dimension: no breakdown
+        route = _route("local", f"keyword score {local}", local)
+        route["staff_score"] = round(min(max((local + 1) / 4 * 100, 0), 100), 1)
+        summary = ("Keyword heuristic: " +
+                   ("strong product language, little hesitation." if local >= CASCADE_LOCAL_HIGH
+                    else "more hesitation than product language."))
+        return {}, summary, route
+
+    try:
+        scores, summary = gpt_assess(agent_text, CASCADE_SMALL_MODEL, fallback=False)
+    except AssessmentError as e:
+        reason = f"{CASCADE_SMALL_MODEL} reply unusable ({e})"
+    else:
+        small = sum(scores.values()) / len(SCORE_KEYS)
+        if abs(small - CASCADE_PASS_MARK) >= CASCADE_MARGIN:
+            return scores, summary, _route("small", f"{CASCADE_SMALL_MODEL} score {small:.1f}", local)
+        reason = f"{CASCADE_SMALL_MODEL} score {small:.1f} is borderline"
+    scores, summary = gpt_assess(agent_text, ASSESS_MODEL)
+    return scores, summary, _route("large", reason, local)
+
+def _route(tier: str, reason: str, local_score: float = None) -> dict:
+    logging.info(f"Scoring route: {tier} ({reason})")
+    route = {"tier": tier, "reason": reason}
+    if local_score is not None:
+        route["local_score"] = local_score
+    return route
+
 # BLOCK 10 – glue everything together
 
-def print_conversation(segments: list[dict], max_lines=30):
-    """Pretty-print the first <max_lines> segments."""
+def print_conversation(segments, max_lines=30):
+    """Pretty-print the first <max_lines> segments (a SegmentTable or dicts)."""
     print("\n========== CONVERSATION ==========")
     for i, s in enumerate(segments[:max_lines], 1):
         start = f"{s['start']:>5.1f}"
@@ -213,47 +484,174 @@ def print_conversation(segments: list[dict], max_lines=30):
         print(f"...  {len(segments)-max_lines} more segments")
     print("==================================\n")
     
-def analyse_call(s3_url: str) -> dict:
-    ts0 = time.time()
-    raw = download_to_bytes(s3_url)
-    wav = convert_to_wav(raw)
-
-    whisper_result = whisper_json(wav, language="ta")
-    diar = diarize(wav)
-
-    aligned = align_words_to_speakers(whisper_result, diar)
-    segments = build_segments(aligned, min_sec=1.0)
-    print_conversation(segments)          # <-- add this line
-
-
-    staff_label = tag_staff_Speaker(segments)
-    agent_segments = [s for s in segments if s["speaker"] == staff_label]
-    agent_text = " ".join([s["text"] for s in agent_segments])
-
-    score_dict = gpt_score(agent_text)
-    summary = gpt_summary(agent_text)
+def agent_view(whisper_result, diar, show_conversation: bool = False, voices: dict = None,
+               staff_id: str = None) -> dict:
+    """Align words to speakers, build segments and pick out the agent's text."""
+    aligned = align_word_table(whisper_result, diar)
+    return segments_view(aligned.segments(min_sec=1.0), show_conversation, voices, staff_id)
+
+def segments_view(segments, show_conversation: bool = False, voices: dict = None,
+                  staff_id: str = None) -> dict:
+    """
+    agent_view for segments that are already built (e.g. by streaming.py), as a
+    SegmentTable or build_segments() dicts.  Tagging and the agent text work on
+    the table; the view's "segments" are dicts.
+    With speaker <voices> an enrolled agent's voice picks the staff label;
+    the keyword heuristic is the fallback.
+    """
+    if isinstance(segments, SegmentTable):
+        table, segments = segments, segments.to_dicts()
+    else:
+        table = SegmentTable.from_dicts(segments)
+    if show_conversation:
+        print_conversation(table)
+
+    match = None
+    if voices:
+        vb = voice_bank.bank()
+        if staff_id is None or staff_id in vb:
+            match = vb.identify(voices, staff_id)
+        if match and match["label"] not in table.speakers():
+            match = None
+    staff_label = match["label"] if match else tag_staff_Speaker(table)
+    agent_text = table.text_of(staff_label)
+    if voices:
+        keyword_tagged = match is None and "company" in KEYWORDS.categories(agent_text)
+        vb.observe(voices, match, staff_id, staff_label, keyword_tagged)
+    return {
+        "segments": segments,
+        "staff_label": staff_label,
+        "staff_id": match["agent_id"] if match else staff_id,
+        "staff_match": match,
+        "agent_text": agent_text,
+    }
 
+def call_result(call_id: str, view: dict, score_dict: dict, summary: str,
+                with_segments: bool = False, route: dict = None) -> dict:
+    segments, agent_text = view["segments"], view["agent_text"]
     total_sec = segments[-1]["end"] if segments else 0
-    staff_score = round(sum(score_dict.values()) / 4, 1)
+    # calls the cascade skipped have no scores rather than zeros; the local tier
+    # gives only an overall score
+    staff_score = (round(sum(score_dict.values()) / 4, 1) if score_dict
+                   else (route or {}).get("staff_score"))
 
     out = {
-        "call_id": Path(s3_url).stem,
-        "staff_label": staff_label,
+        "call_id": call_id,
+        "staff_label": view["staff_label"],
+        **({"staff_id": view["staff_id"]} if view.get("staff_id") else {}),
+        **({"staff_match": view["staff_match"]} if view.get("staff_match") else {}),
         "staff_score": staff_score,
         "breakdown": score_dict,
         "summary": summary,
         "duration_sec": round(total_sec, 1),
         "agent_word_count": len(agent_text.split()),
     }
+    if route is not None:
+        out["route"] = route
+    if with_segments:
+        out["segments"] = segments
+    return out
+
+def scoring_stages(call_id: str, show_conversation: bool = False, with_segments: bool = False,
+                   staff_id: str = None, voices: bool = True) -> dict:
+    """
+    Graph stages from ("whisper", "diar") to "result".  In "split" mode score
+    and summary are separate requests running in parallel.  With <voices> and
+    an enrolled agent (or a <staff_id> to enroll) a "voices" stage, which also
+    needs "audio", identifies the agent by voice (voice_bank.py).
+    """
+    if voices and voice_bank.active(staff_id):
+        stages = {
+            "voices": (speaker_voices, ["audio", "diar"]),
+            "view": (lambda w, d, vo: agent_view(w, d, show_conversation, vo, staff_id),
+                     ["whisper", "diar", "voices"]),
+        }
+    else:
+        stages = {"view": (lambda w, d: agent_view(w, d, show_conversation, staff_id=staff_id),
+                           ["whisper", "diar"])}
+    if SCORING_MODE == "cascade":
+        return {
+            **stages,
+            "assess": (cascade_assess, ["view"]),
+            "result": (lambda v, a: call_result(call_id, v, a[0], a[1], with_segments, route=a[2]),
+                       ["view", "assess"]),
+        }
+    if SCORING_MODE == "combined":
+        return {
+            **stages,
+            "assess": (lambda v: gpt_assess(v["agent_text"]), ["view"]),
+            "result": (lambda v, a: call_result(call_id, v, *a, with_segments), ["view", "assess"]),
+        }
+    return {
+        **stages,
+        "score": (lambda v: gpt_score(v["agent_text"]), ["view"]),
+        "summary": (lambda v: gpt_summary(v["agent_text"]), ["view"]),
+        "result": (lambda v, sc, sm: call_result(call_id, v, sc, sm, with_segments),
+                   ["view", "score", "summary"]),
+    }
+
+def score_call(call_id: str, whisper_result, diar, show_conversation: bool = False,
+               with_segments: bool = False, audio: CallAudio = None, staff_id: str = None) -> dict:
+    """
+    Align, segment, tag the agent and GPT-score one call's stage outputs.
+    Voice identification needs the call's <audio>.
+    """
+    done = {"whisper": whisper_result, "diar": diar, "audio": audio}
+    stages = scoring_stages(call_id, show_conversation, with_segments, staff_id, voices=audio is not None)
+    return run_graph(stages, done=done)["result"]
+
+def analyse_call(s3_url: str, show_conversation: bool = True, with_segments: bool = False,
+                 staff_id: str = None) -> dict:
+    """
+    Whisper and diarization only depend on the decoded audio, so they run side by
+    side; per-call latency is max(whisper, diarize) rather than their sum.
+    <staff_id>, when the call's agent is known, is checked against (or enrolled
+    in) the voice bank and enables DIAR_MODE=enrolled.
+    """
+    ts0 = time.time()
+    call_id = Path(s3_url).stem
+    stages = {
+        "raw": (lambda: download_to_bytes(s3_url), []),
+        "audio": (decode_audio, ["raw"]),
+        "whisper": (lambda audio: whisper_json(audio, language="ta"), ["audio"]),
+        "diar": (lambda audio: diarize(audio, agent_id=staff_id), ["audio"]),
+        **scoring_stages(call_id, show_conversation, with_segments, staff_id),
+    }
+    with tracing.trace(call_id):
+        out = run_graph(stages)["result"]
     logging.info(f"Finished call {out['call_id']} in {round(time.time()-ts0,1)} s")
     return out
 
 # BLOCK 11 – batch runner
 if __name__ == "__main__":
+    import argparse
+    from batch import run_batch
+
+    ap = argparse.ArgumentParser(description="Score call-centre agents from call recordings.")
+    ap.add_argument("--no-cache", action="store_true", help="ignore and do not write the stage cache")
+    ap.add_argument("--profile-startup", action="store_true",
+                    help="report import and model-load time per backend, then exit")
+    ap.add_argument("--store", metavar="DB",
+                    help="also write results and segments to this SQLite store (see results_store.py)")
+    args = ap.parse_args()
+    if args.profile_startup:
+        print(json.dumps(models.profile_startup(), indent=2))
+        raise SystemExit(0)
+    if args.no_cache:
+        cache.enabled = False
+
     urls = [
         "https://ai-elroi-bucket.s3.ap-south-1.amazonaws.com/call_audio/call__audio_bajaj_2_trimmed.wav",
         # add more
     ]
-    for url in tqdm(urls, desc="Calls"):
-        result = analyse_call(url)
-        print(json.dumps(result, indent=2, ensure_ascii=False))
\ No newline at end of file
+    store = None
+    if args.store:
+        from results_store import ResultsStore
+        store = ResultsStore(args.store)
+
+    # results arrive as each call finishes, not in input order
+    for result in tqdm(run_batch(urls, with_segments=store is not None), total=len(urls), desc="Calls"):
+        if store is not None:
+            store.add_many([result])
+            result.pop("segments", None)
+        print(json.dumps(result, indent=2, ensure_ascii=False))
@@ -1,15 +1,20 @@
-def map_speakers(segments):
+from keywords import KEYWORDS
+
+
+def map_speakers(segments, hits=None):
     """
     Automatically map speakers to 'staff' and 'customer' based on loan-related keywords.
     Assumes the speaker who uses more loan-related terms is the staff.
+    <hits> are the segments' KEYWORDS categories, if already computed.
     """
+    if hits is None:
+        hits = KEYWORDS.categories_many([seg["text"] for seg in segments])
     speaker_counts = {}
-    for seg in segments:
+    for seg, cats in zip(segments, hits):
         speaker = seg["speaker"]
-        text = seg["text"].lower()
         if speaker not in speaker_counts:
             speaker_counts[speaker] = {"loan_words": 0, "total": 0}
-        if any(word in text for word in ["loan", "interest", "repayment", "approval", "emi", "eligible", "apply"]):
+        if cats & {"loan", "eligibility"}:
             speaker_counts[speaker]["loan_words"] += 1
         speaker_counts[speaker]["total"] += 1
 
@@ -22,21 +27,22 @@ def map_speakers(segments):
     }
 
 
-def score_staff_segments(segments, staff_speaker):
+def score_staff_segments(segments, staff_speaker, hits=None):
     """
     Score staff performance based on presence of persuasive phrases, clarity, and confidence.
     """
+    if hits is None:
+        hits = KEYWORDS.categories_many([seg["text"] for seg in segments])
     score = 0
     total = 0
-    for seg in segments:
+    for seg, cats in zip(segments, hits):
         if seg["speaker"] != staff_speaker:
             continue
-        text = seg["text"].lower()
-        if any(word in text for word in ["loan", "interest", "repayment", "approval", "emi"]):
+        if "loan" in cats:
             score += 2
-        if any(word in text for word in ["apply", "eligible", "shall i proceed", "can i help"]):
+        if cats & {"eligibility", "closing"}:
             score += 1
-        if any(word in text for word in ["uh", "hmm", "not sure", "don’t know"]):
+        if "hesitation" in cats:
             score -= 1
         total += 1
 
@@ -47,8 +53,9 @@ def summarize_performance(segments):
     """
     Full analysis pipeline: maps speakers, scores staff, returns summary.
     """
-    mapping = map_speakers(segments)
-    staff_score = score_staff_segments(segments, mapping["staff"])
+    hits = KEYWORDS.categories_many([seg["text"] for seg in segments])
+    mapping = map_speakers(segments, hits)
+    staff_score = score_staff_segments(segments, mapping["staff"], hits)
 
     summary = ""
     if staff_score >= 6:
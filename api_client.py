@@ -0,0 +1,269 @@
+"""
+api_client.py  –  one shared async client for downloads, transcription and chat.
+
+All traffic goes through a single event loop (in a background thread) with
+    * one pooled httpx.AsyncClient (keep-alive, HTTP connection reuse),
+    * token buckets for requests/minute and tokens/minute per API,
+    * per-stage timeouts and exponential backoff with jitter that honours
+      Retry-After on 429/5xx, and hedged (duplicate-after-delay) downloads.
+
+Async code awaits adownload / atranscribe / achat directly; threaded code
+uses the sync wrappers download / transcribe / chat, which share the same
+pool and limits, so dozens of calls can be in flight without tripping 429s.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+
+import tracing
+
+# seconds per attempt; a stalled request fails fast and is retried
+STAGE_TIMEOUTS = {
+    "download": float(os.getenv("DOWNLOAD_TIMEOUT", "120")),
+    "transcribe": float(os.getenv("TRANSCRIBE_TIMEOUT", "300")),
+    "chat": float(os.getenv("CHAT_TIMEOUT", "60")),
+}
+CONNECT_TIMEOUT = float(os.getenv("CONNECT_TIMEOUT", "10"))
+MAX_ATTEMPTS = int(os.getenv("API_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+HEDGE_AFTER_SEC = float(os.getenv("DOWNLOAD_HEDGE_SEC", "15"))
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Refills <per_minute> units per minute up to <per_minute>; acquire() waits."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)   # an oversized request still gets through
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class RateLimits:
+    def __init__(self, rpm: float, tpm: float = None):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    async def acquire(self, tokens: int = 0):
+        await self.requests.acquire()
+        if self.tokens and tokens:
+            await self.tokens.acquire(tokens)
+
+
+def _retry_after(exc) -> float:
+    response = getattr(exc, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _retryable(exc) -> bool:
+    if isinstance(exc, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is None and getattr(exc, "response", None) is not None:
+        status = exc.response.status_code
+    if status is not None:
+        return status in RETRY_STATUS
+    # openai.APIConnectionError / APITimeoutError carry no status
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class ApiClient:
+    def __init__(self):
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "64")),
+                                max_keepalive_connections=32),
+            follow_redirects=True,
+            # httpx's 5 s default is far too short for call audio; each stage sets its own
+            timeout=httpx.Timeout(STAGE_TIMEOUTS["download"], connect=CONNECT_TIMEOUT),
+        )
+        from openai import AsyncOpenAI
+        # retries are ours (backoff + Retry-After); the SDK's default would double them
+        self.openai = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"),
+                                  http_client=self.http, max_retries=0)
+        self.limits = {
+            "chat": RateLimits(float(os.getenv("OPENAI_RPM", "500")),
+                               float(os.getenv("OPENAI_TPM", "200000"))),
+            "transcribe": RateLimits(float(os.getenv("WHISPER_RPM", "100"))),
+        }
+        self.retries = {"download": 0, "transcribe": 0, "chat": 0}
+
+    async def _with_retry(self, stage: str, make_call):
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                return await asyncio.wait_for(make_call(), STAGE_TIMEOUTS[stage])
+            except Exception as exc:
+                if attempt == MAX_ATTEMPTS or not _retryable(exc):
+                    raise
+                delay = _retry_after(exc)
+                if delay is None:
+                    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                self.retries[stage] += 1
+                tracing.add(retries=1)
+                logging.warning(f"{stage} attempt {attempt} failed ({type(exc).__name__}: {exc}); "
+                                f"retrying in {delay:.1f} s")
+                await asyncio.sleep(delay)
+
+    async def download(self, url: str) -> bytes:
+        async def once():
+            resp = await self.http.get(
+                url, timeout=httpx.Timeout(STAGE_TIMEOUTS["download"], connect=CONNECT_TIMEOUT))
+            resp.raise_for_status()
+            return resp.content
+
+        async def hedged():
+            # a second identical GET after HEDGE_AFTER_SEC; the first one to succeed wins,
+            # and the attempt fails only when both have
+            first = asyncio.ensure_future(once())
+            done, _ = await asyncio.wait({first}, timeout=HEDGE_AFTER_SEC)
+            if done:
+                return first.result()
+            pending, error = {first, asyncio.ensure_future(once())}, None
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            return task.result()
+                        error = error or task.exception()
+                raise error
+            finally:
+                for p in pending:
+                    p.cancel()
+
+        data = await self._with_retry("download", hedged)
+        tracing.add(bytes_in=len(data))
+        return data
+
+    def _openai(self, stage: str):
+        return self.openai.with_options(
+            timeout=httpx.Timeout(STAGE_TIMEOUTS[stage], connect=CONNECT_TIMEOUT))
+
+    async def transcribe(self, translate: bool = False, **kwargs):
+        """Whisper transcription, or translation to English with <translate>."""
+        await self.limits["transcribe"].acquire()
+        upload = kwargs.get("file")
+        if isinstance(upload, tuple):
+            tracing.add(bytes_out=len(upload[1]))
+        audio = self._openai("transcribe").audio
+        endpoint = audio.translations if translate else audio.transcriptions
+        return await self._with_retry("transcribe", lambda: endpoint.create(**kwargs))
+
+    async def chat(self, **kwargs):
+        text = "".join(str(m.get("content", "")) for m in kwargs.get("messages", []))
+        est_tokens = len(text) // 3 + kwargs.get("max_tokens", 500)
+        await self.limits["chat"].acquire(est_tokens)
+        completions = self._openai("chat").chat.completions
+        resp = await self._with_retry("chat", lambda: completions.create(**kwargs))
+        usage = getattr(resp, "usage", None)
+        if usage:
+            tracing.add(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+        return resp
+
+
+# ---------- one loop, one client per process ----------
+_loop = None
+_client = None
+_init_lock = threading.Lock()
+
+
+def _ensure_loop():
+    global _loop, _client
+    with _init_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="api-loop", daemon=True).start()
+            # build the client on its loop so pools/locks bind there
+            _client = asyncio.run_coroutine_threadsafe(_make_client(), loop).result()
+            _loop = loop
+    return _loop
+
+
+async def _make_client():
+    return ApiClient()
+
+
+def _reset_after_fork():
+    # the loop thread does not survive fork(); a child builds its own on first use
+    global _loop, _client, _init_lock
+    _loop, _client, _init_lock = None, None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def client() -> ApiClient:
+    _ensure_loop()
+    return _client
+
+
+def _carry_span(coro):
+    # tasks on the loop thread don't inherit the caller's context; bring its span along
+    span = tracing.current_span()
+    if span is None:
+        return coro
+
+    async def bound():
+        tracing.enter(span)
+        return await coro
+    return bound()
+
+
+def run(coro):
+    """Run a coroutine on the shared loop from a (non-loop) thread and wait for it."""
+    return asyncio.run_coroutine_threadsafe(_carry_span(coro), _ensure_loop()).result()
+
+
+async def _on_loop(make_coro):
+    """Await <make_coro()> on the shared loop, whichever loop the caller is on."""
+    loop = _ensure_loop()
+    if asyncio.get_running_loop() is loop:
+        return await make_coro()
+    return await asyncio.wrap_future(
+        asyncio.run_coroutine_threadsafe(_carry_span(make_coro()), loop))
+
+
+async def adownload(url: str) -> bytes:
+    return await _on_loop(lambda: client().download(url))
+
+
+async def atranscribe(**kwargs):
+    return await _on_loop(lambda: client().transcribe(**kwargs))
+
+
+async def achat(**kwargs):
+    return await _on_loop(lambda: client().chat(**kwargs))
+
+
+def download(url: str) -> bytes:
+    return run(adownload(url))
+
+
+def transcribe(**kwargs):
+    return run(atranscribe(**kwargs))
+
+
+def chat(**kwargs):
+    return run(achat(**kwargs))
@@ -0,0 +1,82 @@
+"""
+assessment.py  –  the combined agent assessment: request body, schema and reply parser.
+
+One structured-outputs request returns the four rubric scores and the coaching
+bullets.  analyse_staff.py sends it per call and bulk_scoring.py in Batch API
+jobs; results_store.py only needs SCORE_KEYS.  This module has no side effects
+on import (no logging setup, no clients, no models), so all of them can share it.
+"""
+import json
+import os
+
+SCORE_KEYS = ("politeness", "clarity", "knowledge", "compliance")
+# structured outputs (json_schema) need a gpt-4o-family model
+ASSESS_MODEL = os.getenv("ASSESS_MODEL", "gpt-4o-2024-08-06")
+ASSESS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        **{k: {"type": "integer", "description": "0-100"} for k in SCORE_KEYS},
+        "did_well": {"type": "array", "items": {"type": "string"}},
+        "improve": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": [*SCORE_KEYS, "did_well", "improve"],
+    "additionalProperties": False,
+}
+
+
+class AssessmentError(ValueError):
+    """The reply carries no usable assessment: a refusal, no content, or a schema violation."""
+
+
+def assess_request(agent_text: str, model: str = None) -> dict:
+    """Chat-completions body for the combined assessment."""
+    prompt = (
+        "You are a call-centre quality analyst.\n"
+        "Rate this agent transcript 0-100 on politeness, clarity, product knowledge "
+        "(knowledge) and compliance.\n"
+        "Also give 3 bullets for what the agent did well (did_well) and 3 for "
+        "improvement (improve), each under 12 words.\n\n"
+        f"Transcript:\n{agent_text}"
+    )
+    return {
+        "model": model or ASSESS_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0,
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "agent_assessment", "strict": True, "schema": ASSESS_SCHEMA},
+        },
+    }
+
+
+def parse_assessment(txt: str) -> tuple[dict, str]:
+    """
+    Validate a structured reply against ASSESS_SCHEMA.
+    Returns (score_dict, summary); raises AssessmentError on a missing reply or
+    schema violations.
+    """
+    if txt is None:
+        raise AssessmentError("reply has no content")
+    try:
+        data = json.loads(txt)
+    except json.JSONDecodeError as e:
+        raise AssessmentError(f"reply is not JSON: {e}") from None
+    if not isinstance(data, dict):
+        raise AssessmentError("assessment is not a JSON object")
+    scores = {}
+    for k in SCORE_KEYS:
+        v = data.get(k)
+        if not isinstance(v, int) or isinstance(v, bool) or not 0 <= v <= 100:
+            raise AssessmentError(f"{k}={v!r} is not an integer in 0-100")
+        scores[k] = v
+    bullets = {}
+    for k in ("did_well", "improve"):
+        items = data.get(k)
+        if not isinstance(items, list) or not all(isinstance(i, str) for i in items):
+            raise AssessmentError(f"{k} is not a list of strings")
+        bullets[k] = [i.strip() for i in items if i.strip()]
+    summary = "\n".join(
+        ["Did well:", *[f"- {b}" for b in bullets["did_well"]],
+         "To improve:", *[f"- {b}" for b in bullets["improve"]]]
+    )
+    return scores, summary
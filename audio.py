@@ -0,0 +1,180 @@
+"""
+audio.py  –  decode a call recording once and share it between stages.
+
+CallAudio holds the 16 kHz mono PCM as one int16 array.  pyannote gets a
+float32 torch view of it ({"waveform", "sample_rate"}), Whisper gets WAV bytes
+encoded from the same array, so nothing is decoded or re-parsed twice.
+
+Dual-channel telephony recordings (agent and customer on separate channels)
+also keep their per-channel PCM in CallAudio.channels, so diarization can read
+speaker turns straight off the channels (see channel_diarization.py).
+"""
+import hashlib
+import io
+import logging
+import os
+import wave
+
+import numpy as np
+from pydub import AudioSegment
+
+AUDIO_SAMPLE_RATE = 16_000
+
+# transcription upload: codec -> (file extension, pydub export kwargs)
+UPLOAD_CODECS = {
+    "wav": ("wav", {"format": "wav"}),
+    "flac": ("flac", {"format": "flac"}),
+    "opus": ("ogg", {"format": "ogg", "codec": "libopus", "bitrate": "24k"}),
+    "mp3": ("mp3", {"format": "mp3", "bitrate": "32k"}),
+}
+UPLOAD_LIMIT_BYTES = 25 * 1024 * 1024   # OpenAI audio endpoint limit
+# rough size per second of 16 kHz mono speech, used to pick a codec up front
+_BYTES_PER_SEC = {"wav": 32_000, "flac": 20_000, "opus": 3_000, "mp3": 4_000}
+
+
+def choose_upload_codec(duration: float, limit: int = UPLOAD_LIMIT_BYTES) -> str:
+    """Lossless FLAC when it comfortably fits the limit, low-bitrate Opus otherwise."""
+    return "flac" if duration * _BYTES_PER_SEC["flac"] <= 0.9 * limit else "opus"
+
+
+class CallAudio:
+    def __init__(self, pcm: np.ndarray, sample_rate: int = AUDIO_SAMPLE_RATE,
+                 channels: np.ndarray = None):
+        self.pcm = pcm                  # int16, shape (n_samples,)
+        self.sample_rate = sample_rate
+        self.channels = channels        # int16 (n_channels, n_samples), or None for mono
+        self._float = None
+        self._fingerprint = None
+
+    @classmethod
+    def from_bytes(cls, raw_bytes: io.BytesIO) -> "CallAudio":
+        """
+        Decode any ffmpeg-readable container to 16 kHz mono int16.  Multi-channel
+        sources with genuinely different channels keep those as well.
+        """
+        raw_bytes.seek(0)
+        seg = (AudioSegment.from_file(raw_bytes)
+               .set_frame_rate(AUDIO_SAMPLE_RATE)
+               .set_sample_width(2))
+        channels = None
+        if seg.channels > 1:
+            interleaved = np.frombuffer(seg.raw_data, dtype=np.int16)
+            split = interleaved.reshape(-1, seg.channels).T
+            if distinct_channels(split):
+                channels = np.ascontiguousarray(split)
+            seg = seg.set_channels(1)
+        return cls(np.frombuffer(seg.raw_data, dtype=np.int16), AUDIO_SAMPLE_RATE, channels)
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / self.sample_rate
+
+    @property
+    def samples(self) -> np.ndarray:
+        """float32 in [-1, 1); computed once and shared by every float consumer."""
+        if self._float is None:
+            self._float = self.pcm.astype(np.float32) / 32768.0
+        return self._float
+
+    def pyannote_input(self, uri: str = "memo") -> dict:
+        """In-memory pyannote input; torch.from_numpy shares the float buffer."""
+        import torch
+        waveform = torch.from_numpy(self.samples).unsqueeze(0)   # (channel, time)
+        return {"waveform": waveform, "sample_rate": self.sample_rate, "uri": uri}
+
+    def wav_bytes(self) -> bytes:
+        """16-bit PCM WAV encoding of the same buffer, for upload."""
+        out = io.BytesIO()
+        with wave.open(out, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(self.sample_rate)
+            wf.writeframes(memoryview(self.pcm).cast("B"))
+        return out.getvalue()
+
+    def encode(self, codec: str = "wav") -> bytes:
+        """Encode the PCM buffer in memory as one of UPLOAD_CODECS."""
+        if codec == "wav":
+            return self.wav_bytes()
+        _, kwargs = UPLOAD_CODECS[codec]
+        seg = AudioSegment(data=self.pcm.tobytes(), sample_width=2,
+                           frame_rate=self.sample_rate, channels=1)
+        out = io.BytesIO()
+        seg.export(out, **kwargs)
+        return out.getvalue()
+
+    def upload_file(self, codec: str = None, limit: int = UPLOAD_LIMIT_BYTES) -> tuple[str, bytes]:
+        """
+        (filename, bytes) tuple for the transcription endpoint.  <codec> defaults
+        to $WHISPER_UPLOAD_CODEC, and "auto" picks by duration and size limit.
+        """
+        codec = codec or os.getenv("WHISPER_UPLOAD_CODEC", "auto")
+        if codec == "auto":
+            codec = choose_upload_codec(self.duration, limit)
+        data = self.encode(codec)
+        if len(data) > limit and codec != "opus":
+            logging.info(f"{codec} upload is {len(data)} bytes, over limit; re-encoding as opus")
+            codec, data = "opus", self.encode("opus")
+        ext, _ = UPLOAD_CODECS[codec]
+        return f"audio.{ext}", data
+
+    def fingerprint(self) -> str:
+        """sha256 of the decoded PCM; the cache key for audio-derived stages."""
+        if self._fingerprint is None:
+            h = hashlib.sha256(f"{self.sample_rate}:1:2".encode())
+            h.update(memoryview(self.pcm).cast("B"))
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    def slice(self, start: int, end: int) -> "CallAudio":
+        """Zero-copy view of samples [start, end)."""
+        channels = None if self.channels is None else self.channels[:, start:end]
+        return CallAudio(self.pcm[start:end], self.sample_rate, channels)
+
+    def __getstate__(self):
+        # the float view is derived; don't ship it to worker processes
+        return {"pcm": self.pcm, "sample_rate": self.sample_rate, "channels": self.channels,
+                "_float": None, "_fingerprint": self._fingerprint}
+
+
+def distinct_channels(channels: np.ndarray, tolerance: float = 0.05) -> bool:
+    """
+    False for "stereo" files that carry the same mono signal on every channel
+    (a common export default); those are no better than the downmix.
+    """
+    x = channels[:, ::16].astype(np.float32)      # a decimated view is plenty for this
+    level = float(np.mean(np.abs(x))) or 1.0
+    return any(float(np.mean(np.abs(x[i] - x[0]))) > tolerance * level
+               for i in range(1, len(x)))
+
+
+def plan_chunks(pcm: np.ndarray, sample_rate: int, max_sec: float,
+                search_sec: float = 10.0, frame_sec: float = 0.03) -> list[tuple[int, int]]:
+    """
+    Split points for long audio: every chunk is at most <max_sec> long and is
+    cut at the quietest frame in the last <search_sec> before that limit, so
+    cuts land in pauses rather than mid-word.  Returns [(start, end), ...]
+    in samples.
+    """
+    n = len(pcm)
+    max_len = int(max_sec * sample_rate)
+    if n <= max_len:
+        return [(0, n)]
+
+    frame = max(int(frame_sec * sample_rate), 1)
+    n_frames = n // frame
+    x = pcm[:n_frames * frame].reshape(n_frames, frame).astype(np.float32)
+    energy = np.einsum("ij,ij->i", x, x)        # per-frame energy
+    del x
+
+    bounds, pos = [], 0
+    search = min(int(search_sec * sample_rate), max_len - frame)
+    while n - pos > max_len:
+        f_lo = (pos + max_len - search) // frame
+        f_hi = max((pos + max_len) // frame, f_lo + 1)
+        cut = (f_lo + int(np.argmin(energy[f_lo:f_hi]))) * frame + frame // 2
+        cut = min(max(cut, pos + frame), pos + max_len)
+        bounds.append((pos, cut))
+        pos = cut
+    bounds.append((pos, n))
+    return bounds
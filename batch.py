@@ -0,0 +1,215 @@
+"""
+batch.py  –  pipelined batch runner for analyse_staff.
+
+Each stage (download, decode, whisper, diarize, score) has its own bounded
+queue and worker count, so one call's diarization overlaps the next call's
+download and Whisper upload.  Diarization runs in a process pool because it is
+CPU-bound; the other stages are network-bound and use threads.  The pool's
+processes are spawned, not forked: by the time a call reaches it this process
+already runs the stage threads and the API client's event loop.
+
+    for result in run_batch(urls):
+        print(result)          # yielded as soon as each call is scored
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import analyse_staff as core
+import tracing
+from cache import cache
+
+DEFAULT_WORKERS = {
+    "download": 4,
+    "decode": 2,
+    "whisper": 4,
+    "diarize": 2,   # processes
+    "score": 4,
+}
+DEFAULT_QUEUE_SIZE = 8
+_STOP = object()
+_FED = object()     # the feeder is done; run_batch() then knows how many results to expect
+
+
+class _Join:
+    """Waits for both the Whisper and the diarization half of a call."""
+
+    def __init__(self, on_ready, on_error):
+        self._parts = {}
+        self._lock = threading.Lock()
+        self._on_ready = on_ready
+        self._on_error = on_error
+
+    def put(self, job: dict, part: str, value=None, error: Exception = None):
+        with self._lock:
+            parts = self._parts.setdefault(job["idx"], {})
+            parts[part] = (value, error)
+            if len(parts) < 2:
+                return
+            del self._parts[job["idx"]]
+        errors = [(part, e) for part, (_, e) in parts.items() if e is not None]
+        if errors:
+            part, e = errors[0]
+            self._on_error(job, e, part)
+            return
+        job["whisper"] = parts["whisper"][0]
+        job["diar"] = parts["diarize"][0]
+        self._on_ready(job)
+
+
+def _init_diarize_worker(n_workers: int, cache_enabled: bool):
+    # spawned processes start from a fresh interpreter: carry over what the parent set at run time
+    os.environ["DIAR_WORKERS"] = str(n_workers)     # cores per process, see fast_diarization.py
+    cache.enabled = cache_enabled
+
+
+def _diarize_timed(audio, agent_id=None):
+    # runs in the worker process: report its CPU time, which the parent's span can't see
+    cpu0 = time.process_time()
+    diar = core.diarize(audio, agent_id=agent_id)
+    return diar, time.process_time() - cpu0
+
+
+def _stage(name: str, inbox: queue.Queue, n_workers: int, handle, fail):
+    """Start <n_workers> threads that feed items from <inbox> to <handle>."""
+    def loop():
+        while True:
+            job = inbox.get()
+            if job is _STOP:
+                break
+            try:
+                with job["trace"].activate():
+                    handle(job)
+            except Exception as e:
+                fail(job, e, name)
+
+    threads = [threading.Thread(target=loop, name=f"{name}-{i}", daemon=True)
+               for i in range(n_workers)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def run_batch(urls, workers: dict = None, queue_size: int = DEFAULT_QUEUE_SIZE,
+              with_segments: bool = False):
+    """
+    Analyse <urls> (any iterable) through the staged pipeline.
+    Yields one dict per call in completion order; failed calls yield
+    {"call_id": ..., "error": "..."} instead of stopping the batch.
+    An item may be (url, staff_id) when the call's agent is known.
+    <with_segments> keeps each call's conversation segments in its result.
+    """
+    n = {**DEFAULT_WORKERS, **(workers or {})}
+    q = {name: queue.Queue(maxsize=queue_size) for name in n}
+    results = queue.Queue()
+
+    def fail(job, e, stage):
+        logging.error(f"Call {job['call_id']} failed in {stage}: {e}")
+        job["trace"].close(error=f"{stage}: {e}")
+        results.put({"call_id": job["call_id"], "error": f"{stage}: {e}"})
+
+    def on_ready(job):
+        q["score"].put(job)
+
+    join = _Join(on_ready, fail)
+
+    def do_download(job):
+        job["raw"] = core.download_to_bytes(job["url"])
+        q["decode"].put(job)
+
+    def do_decode(job):
+        job["audio"] = core.decode_audio(job.pop("raw"))
+        # fan out: both halves read the same decoded PCM
+        q["whisper"].put(job)
+        q["diarize"].put(job)
+
+    def do_whisper(job):
+        try:
+            value = core.whisper_json(job["audio"], language="ta")
+        except Exception as e:
+            join.put(job, "whisper", error=e)
+            return
+        join.put(job, "whisper", value)
+
+    def do_diarize(job):
+        try:
+            with tracing.span("diarize", audio_sec=round(job["audio"].duration, 3)) as span:
+                value, cpu_sec = diar_pool.submit(_diarize_timed, job["audio"], job["staff_id"]).result()
+                span.add(cpu_sec=cpu_sec)
+        except Exception as e:
+            join.put(job, "diarize", error=e)
+            return
+        join.put(job, "diarize", value)
+
+    def do_score(job):
+        out = core.score_call(job["call_id"], job.pop("whisper"), job.pop("diar"),
+                              with_segments=with_segments, audio=job.pop("audio"),
+                              staff_id=job["staff_id"])
+        logging.info(f"Finished call {out['call_id']} in {round(time.time()-job['t0'],1)} s")
+        job["trace"].close()
+        results.put(out)
+
+    diar_pool = ProcessPoolExecutor(max_workers=n["diarize"],
+                                    mp_context=multiprocessing.get_context("spawn"),
+                                    initializer=_init_diarize_worker,
+                                    initargs=(n["diarize"], cache.enabled))
+    handlers = {
+        "download": do_download,
+        "decode": do_decode,
+        "whisper": do_whisper,
+        "diarize": do_diarize,
+        "score": do_score,
+    }
+    threads = {name: _stage(name, q[name], n[name], handlers[name], fail)
+               for name in handlers}
+
+    fed = 0
+    stop = threading.Event()        # the consumer went away: feed nothing more
+
+    def put(job) -> bool:
+        while not stop.is_set():
+            try:
+                q["download"].put(job, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def feed():
+        nonlocal fed
+        try:
+            for item in urls:
+                url, staff_id = item if isinstance(item, tuple) else (item, None)
+                call_id = Path(url).stem
+                if not put({"idx": fed, "url": url, "call_id": call_id, "staff_id": staff_id,
+                            "t0": time.time(), "trace": tracing.Trace(call_id)}):
+                    break
+                fed += 1
+        except Exception as e:
+            logging.error(f"Reading the batch input failed after {fed} calls: {e}")
+        finally:
+            results.put(_FED)
+
+    feeder = threading.Thread(target=feed, name="feeder", daemon=True)
+    feeder.start()
+    try:
+        received, expected = 0, None
+        while expected is None or received < expected:
+            out = results.get()
+            if out is _FED:
+                expected = fed
+                continue
+            received += 1
+            yield out
+    finally:
+        stop.set()
+        feeder.join()
+        for name in handlers:
+            for _ in threads[name]:
+                q[name].put(_STOP)
+        diar_pool.shutdown(wait=False, cancel_futures=True)
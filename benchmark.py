@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+benchmark.py  –  performance checks for the call-analysis pipeline.
+
+    python benchmark.py upload call1.wav https://.../call2.wav [--transcribe]
+    python benchmark.py diarize call1.wav [--stride 1 2 4]
+    python benchmark.py diarize-onnx call1.wav [--threads 2 4] [--quantize off int8]
+    python benchmark.py suite [--lengths 30 120 600] [--repeats 5] [--data DIR]
+    python benchmark.py record call1.wav --data DIR
+    python benchmark.py preprocess [--lengths 60 600] [--rate 44100]
+
+Every sub-command prints a JSON report (or writes it with --out) so runs can be
+diffed across commits.
+"""
+import argparse
+import difflib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import wave
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+import api_client
+from audio import UPLOAD_CODECS, CallAudio, choose_upload_codec
+
+SAMPLE_CALLS = [
+    "https://ai-elroi-bucket.s3.ap-south-1.amazonaws.com/call_audio/call__audio_bajaj_2_trimmed.wav",
+]
+
+
+def load_call(src: str) -> CallAudio:
+    if src.startswith(("http://", "https://")):
+        return CallAudio.from_bytes(io.BytesIO(api_client.download(src)))
+    with open(src, "rb") as f:
+        return CallAudio.from_bytes(io.BytesIO(f.read()))
+
+
+def _transcribe(upload: tuple, language: str = "ta") -> str:
+    return api_client.transcribe(
+        model="whisper-1", file=upload, response_format="text", language=language)
+
+
+# ---------- upload codecs ----------
+def bench_upload(sources: list, transcribe: bool = False) -> dict:
+    """Upload bytes, encode time and (optionally) transcript agreement per codec."""
+    report = {}
+    for src in sources:
+        audio = load_call(src)
+        rows = {"duration_sec": round(audio.duration, 1),
+                "auto_codec": choose_upload_codec(audio.duration), "codecs": {}}
+        reference = None
+        for codec, (ext, _) in UPLOAD_CODECS.items():
+            t0 = time.perf_counter()
+            data = audio.encode(codec)
+            row = {"bytes": len(data),
+                   "ratio_vs_wav": None,
+                   "encode_sec": round(time.perf_counter() - t0, 3)}
+            if transcribe:
+                t0 = time.perf_counter()
+                text = _transcribe((f"audio.{ext}", data))
+                row["transcribe_sec"] = round(time.perf_counter() - t0, 2)
+                if codec == "wav":
+                    reference = text
+                row["transcript_equal"] = text.strip() == reference.strip()
+                row["word_similarity"] = round(difflib.SequenceMatcher(
+                    None, reference.split(), text.split()).ratio(), 3)
+            rows["codecs"][codec] = row
+        wav_bytes = rows["codecs"]["wav"]["bytes"]
+        for row in rows["codecs"].values():
+            row["ratio_vs_wav"] = round(row["bytes"] / wav_bytes, 3)
+        report[Path(src).name] = rows
+    return report
+
+
+# ---------- diarization modes ----------
+def bench_diarize(sources: list, strides=(1,)) -> dict:
+    """
+    Real-time factor of the full and fast diarization modes, and the fast mode's
+    DER with the full mode's output on the same file as reference.
+    """
+    import models
+    from fast_diarization import FAST_PARAMS, configure
+    from pyannote.metrics.diarization import DiarizationErrorRate
+
+    full = models.get("diarization")
+    fast = {stride: configure(models._diarization(), **{**FAST_PARAMS, "embedding_stride": stride})
+            for stride in strides}
+    report = {"fast_params": {**FAST_PARAMS, "embedding_stride": list(strides)}}
+    for src in sources:
+        audio = load_call(src)
+        t0 = time.perf_counter()
+        reference = full(audio.pyannote_input())
+        full_sec = time.perf_counter() - t0
+        rows = {"duration_sec": round(audio.duration, 1),
+                "full": {"sec": round(full_sec, 2), "rtf": round(full_sec / audio.duration, 4),
+                         "speakers": len(reference.labels())}}
+        for stride, pipeline in fast.items():
+            t0 = time.perf_counter()
+            hypothesis = pipeline(audio.pyannote_input(), num_speakers=2)
+            sec = time.perf_counter() - t0
+            der = DiarizationErrorRate()(reference, hypothesis, detailed=True)
+            rows[f"fast_stride{stride}"] = {
+                "sec": round(sec, 2), "rtf": round(sec / audio.duration, 4),
+                "speedup": round(full_sec / sec, 2),
+                "der_vs_full": round(der["diarization error rate"], 4),
+                "confusion_sec": round(der["confusion"], 2),
+                "missed_sec": round(der["missed detection"], 2),
+                "false_alarm_sec": round(der["false alarm"], 2),
+            }
+        report[Path(src).name] = rows
+    return report
+
+
+def bench_diarize_onnx(sources: list, threads=None, quantize=("off", "int8")) -> dict:
+    """
+    The full pipeline on PyTorch against the ONNX Runtime backend (fp32 and/or
+    int8, at each intra-op thread count): real-time factor, speed-up, and DER
+    with the PyTorch output on the same file as reference.
+    """
+    import models
+    import onnx_diarization
+    from pyannote.metrics.diarization import DiarizationErrorRate
+
+    from fast_diarization import default_threads
+
+    threads = threads or [onnx_diarization.ONNX_PARAMS["threads"] or default_threads()]
+    reference_pipeline = models._pyannote_pipeline()
+    variants = {}
+    for q in quantize:
+        for n in threads:
+            t0 = time.perf_counter()
+            pipeline = onnx_diarization.configure(
+                models._pyannote_pipeline(),
+                **{**onnx_diarization.ONNX_PARAMS, "quantize": q, "threads": n})
+            variants[f"onnx_{'int8' if q == 'int8' else 'fp32'}_t{n}"] = (pipeline, time.perf_counter() - t0)
+
+    onnx_dir = Path(onnx_diarization.ONNX_DIR)
+    report = {"meta": _meta(1), "onnx_params": onnx_diarization.ONNX_PARAMS,
+              "model_mb": {f.name: round(f.stat().st_size / 2**20, 1)
+                           for f in sorted(onnx_dir.glob("*.onnx")) if ".tmp." not in f.name},
+              "load_sec": {name: round(sec, 2) for name, (_, sec) in variants.items()}}
+    for src in sources:
+        audio = load_call(src)
+        t0 = time.perf_counter()
+        reference = reference_pipeline(audio.pyannote_input())
+        torch_sec = time.perf_counter() - t0
+        rows = {"duration_sec": round(audio.duration, 1),
+                "torch": {"sec": round(torch_sec, 2), "rtf": round(torch_sec / audio.duration, 4),
+                          "speakers": len(reference.labels())}}
+        for name, (pipeline, _) in variants.items():
+            t0 = time.perf_counter()
+            hypothesis = pipeline(audio.pyannote_input())
+            sec = time.perf_counter() - t0
+            der = DiarizationErrorRate()(reference, hypothesis, detailed=True)
+            rows[name] = {
+                "sec": round(sec, 2), "rtf": round(sec / audio.duration, 4),
+                "speedup": round(torch_sec / sec, 2),
+                "speakers": len(hypothesis.labels()),
+                "der_vs_torch": round(der["diarization error rate"], 4),
+                "confusion_sec": round(der["confusion"], 2),
+                "missed_sec": round(der["missed detection"], 2),
+                "false_alarm_sec": round(der["false alarm"], 2),
+            }
+        report[Path(src).name] = rows
+    return report
+
+
+# ---------- offline suite: synthetic calls, replayed services ----------
+SUITE_LENGTHS = (30, 120, 600)
+SUITE_DATA = ".cache/bench"
+AGENT_WORDS = ["வணக்கம்", "பஜாஜ்", "finance", "loan", "emi", "interest", "apply",
+               "eligible", "சார்", "உங்க", "கணக்கு", "approval"]
+CUSTOMER_WORDS = ["சரி", "ஆமா", "இல்ல", "எவ்வளவு", "hmm", "okay", "எப்போ", "தெரியல"]
+
+
+def synth_call(seconds: float, seed: int = 0, sample_rate: int = 16_000):
+    """
+    Two-speaker call: alternating turns of voiced "words" (harmonic bursts at
+    each speaker's pitch) over a noise floor.  Returns (int16 pcm, verbose_json
+    dict, turns) where words and turns are the ground truth used for replay.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    pcm = rng.normal(0, 60, n)
+    pitch = {"SPEAKER_00": 125.0, "SPEAKER_01": 210.0}
+    vocab = {"SPEAKER_00": AGENT_WORDS, "SPEAKER_01": CUSTOMER_WORDS}
+    words, turns, segments = [], [], []
+    t, speaker = 0.3, "SPEAKER_00"
+    while t < seconds - 1.0:
+        turn_end = min(t + rng.uniform(1.5, 6.0), seconds - 0.5)
+        start, turn_words = t, []
+        while t < turn_end - 0.25:
+            dur = rng.uniform(0.25, 0.5)
+            w = {"word": str(rng.choice(vocab[speaker])),
+                 "start": round(t, 3), "end": round(min(t + dur, turn_end), 3)}
+            a, b = int(w["start"] * sample_rate), int(w["end"] * sample_rate)
+            tt = np.arange(b - a) / sample_rate
+            f0 = pitch[speaker] * rng.uniform(0.9, 1.1)
+            voice = sum(np.sin(2 * np.pi * f0 * k * tt) / k for k in range(1, 6))
+            pcm[a:b] += 4000 * voice * np.hanning(b - a)
+            turn_words.append(w)
+            t = w["end"] + rng.uniform(0.05, 0.15)
+        if turn_words:
+            words.extend(turn_words)
+            turns.append([round(start, 3), turn_words[-1]["end"], speaker])
+            segments.append({"id": len(segments), "seek": 0, "start": round(start, 3),
+                             "end": turn_words[-1]["end"],
+                             "text": " ".join(w["word"] for w in turn_words)})
+        t += rng.uniform(0.2, 0.8)
+        speaker = "SPEAKER_01" if speaker == "SPEAKER_00" else "SPEAKER_00"
+    whisper = {"task": "transcribe", "language": "tamil", "duration": seconds,
+               "text": " ".join(w["word"] for w in words), "words": words, "segments": segments}
+    return np.clip(pcm, -32768, 32767).astype(np.int16), whisper, turns
+
+
+def write_recording(data_dir, name: str, pcm: np.ndarray, sample_rate: int,
+                    whisper: dict, turns: list) -> Path:
+    """<name>.wav / .whisper.json / .diar.json in the layout fake_services replays."""
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    wav_path = data_dir / f"{name}.wav"
+    with wave.open(str(wav_path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm.tobytes())
+    wav_path.with_suffix(".whisper.json").write_text(json.dumps(whisper, ensure_ascii=False), encoding="utf-8")
+    wav_path.with_suffix(".diar.json").write_text(json.dumps(turns), encoding="utf-8")
+    return wav_path
+
+
+def record(sources: list, data_dir: str) -> dict:
+    """Run the real Whisper and pyannote stages once and save them for replay."""
+    import analyse_staff as core
+
+    saved = {}
+    for src in sources:
+        audio = load_call(src)
+        result = core.whisper_json(audio, language="ta")
+        whisper = {"text": result.text, "language": getattr(result, "language", None),
+                   "duration": audio.duration,
+                   "words": [{"word": w.word, "start": w.start, "end": w.end} for w in result.words]}
+        turns = [[seg.start, seg.end, label]
+                 for seg, _, label in core.diarize(audio).itertracks(yield_label=True)]
+        saved[src] = str(write_recording(data_dir, Path(src).stem, audio.pcm,
+                                         audio.sample_rate, whisper, turns))
+    return saved
+
+
+class PeakRss:
+    """Samples resident set size on a thread while the block runs (Linux /proc)."""
+
+    def __init__(self, interval: float = 0.002):
+        self.interval = interval
+        self.start = self.peak = 0
+
+    @staticmethod
+    def current() -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            import resource    # no /proc: process high-water mark, bytes on Linux/kB elsewhere
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.start = self.peak = self.current()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def measure(fn, repeats: int, audio_sec: float = None, items: int = None) -> dict:
+    """Latency over <repeats> runs, peak RSS while running, and throughput."""
+    times = []
+    try:
+        with PeakRss() as rss:
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - t0)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    median = statistics.median(times)
+    row = {
+        "latency_ms": {"min": round(min(times) * 1000, 3), "median": round(median * 1000, 3),
+                       "mean": round(statistics.fmean(times) * 1000, 3)},
+        "peak_rss_mb": round(rss.peak / 2 ** 20, 1),
+        "rss_growth_mb": round((rss.peak - rss.start) / 2 ** 20, 1),
+        "repeats": repeats,
+    }
+    if audio_sec:
+        row["audio_sec_per_sec"] = round(audio_sec / median, 1)
+    if items:
+        row["items_per_sec"] = round(items / median, 1)
+    return row
+
+
+def _as_result(whisper: dict):
+    # verbose_json as the SDK exposes it: attribute access on words
+    return SimpleNamespace(text=whisper["text"], language=whisper.get("language"),
+                           words=[SimpleNamespace(**w) for w in whisper["words"]])
+
+
+def bench_suite(lengths=SUITE_LENGTHS, repeats: int = 5, data_dir: str = SUITE_DATA,
+                port: int = 0) -> dict:
+    """
+    Offline benchmark of the pipeline stages on synthetic calls.  OpenAI and
+    S3 are served by fake_services (replaying the recordings in <data_dir>),
+    pyannote is replaced by ReplayDiarization, and the stage cache is off.
+    """
+    for seconds in lengths:
+        name = f"synth_{int(seconds)}s"
+        if not (Path(data_dir) / f"{name}.wav").exists():
+            write_recording(data_dir, name, *_synth(seconds))
+
+    from fake_services import ReplayDiarization, make_server, turns_annotation
+    server = make_server("127.0.0.1", port, data_dir)
+    host, port = server.server_address
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({"OPENAI_BASE_URL": f"http://{host}:{port}/v1", "OPENAI_API_KEY": "fake",
+                       "CALL_CACHE": "off", "WHISPER_UPLOAD_CODEC": "wav"})
+
+    import models
+    recordings = server.RequestHandlerClass.state.recordings
+    models.register("diarization")(lambda: ReplayDiarization(recordings))
+    import analyse_staff as core
+    import analyze
+
+    cases = {}
+
+    def case(name: str, label: str, row: dict):
+        cases.setdefault(name, {})[label] = row
+
+    for name, rec in sorted(recordings.items(), key=lambda kv: len(kv[1]["pcm"])):
+        audio_sec = len(rec["pcm"]) / 2 / rec["sample_rate"]
+        label = name
+        wav = (Path(data_dir) / f"{name}.wav").read_bytes()
+        whisper = _as_result(rec["whisper"])
+        diar = turns_annotation(rec["turns"])
+        aligned = core.align_words_to_speakers(whisper, diar)
+        table = core.align_word_table(whisper, diar)
+        segments = core.build_segments(aligned)
+        n_words, n_segs = len(aligned), len(segments)
+
+        case("convert_to_wav", label, measure(
+            lambda: core.convert_to_wav(io.BytesIO(wav)), repeats, audio_sec))
+        case("align_words_to_speakers", label, measure(
+            lambda: core.align_words_to_speakers(whisper, diar), repeats, audio_sec, n_words))
+        case("align_word_table", label, measure(
+            lambda: core.align_word_table(whisper, diar), repeats, audio_sec, n_words))
+        case("build_segments", label, measure(
+            lambda: core.build_segments(aligned), repeats, audio_sec, n_words))
+        case("build_segments (WordTable)", label, measure(
+            lambda: core.build_segments(table), repeats, audio_sec, n_words))
+        case("tag_staff_Speaker", label, measure(
+            lambda: core.tag_staff_Speaker(segments), repeats, audio_sec, n_segs))
+        seg_table = table.segments(min_sec=1.0)
+        case("tag_staff_Speaker (SegmentTable)", label, measure(
+            lambda: core.tag_staff_Speaker(seg_table), repeats, audio_sec, n_segs))
+        case("analyze.map_speakers", label, measure(
+            lambda: analyze.map_speakers(segments), repeats, audio_sec, n_segs))
+        case("analyze.score_staff_segments", label, measure(
+            lambda: analyze.score_staff_segments(segments, segments[0]["speaker"]),
+            repeats, audio_sec, n_segs))
+        case("analyze.summarize_performance", label, measure(
+            lambda: analyze.summarize_performance(segments), repeats, audio_sec, n_segs))
+        case("analyse_call", label, measure(
+            lambda: core.analyse_call(f"http://{host}:{port}/audio/{name}.wav",
+                                      show_conversation=False),
+            max(1, repeats // 2), audio_sec))
+    server.shutdown()
+    return {"meta": _meta(repeats), "cases": cases}
+
+
+def bench_preprocess(lengths=(60, 600), repeats: int = 3, sample_rate: int = 44_100,
+                     data_dir: str = SUITE_DATA) -> dict:
+    """
+    utils.reduce_noise -> normalize_audio -> chunk_audio (file round-trips)
+    against PreprocessChain, on synthetic noisy calls at <sample_rate>.
+    """
+    import tempfile
+    import utils
+
+    chain = utils.PreprocessChain(chunk_sec=60)
+    cases = {}
+    for seconds in lengths:
+        label = f"{seconds:g}s@{sample_rate}"
+        pcm = synth_call(seconds, seed=int(seconds), sample_rate=sample_rate)[0]
+        src = str(Path(data_dir) / f"prep_{label}.wav")
+        Path(data_dir).mkdir(parents=True, exist_ok=True)
+        with wave.open(src, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(sample_rate)
+            wf.writeframes(pcm.tobytes())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            def files_chain():
+                utils.reduce_noise(src, f"{tmp}/clean.wav")
+                utils.normalize_audio(f"{tmp}/clean.wav", f"{tmp}/norm.wav")
+                utils.chunk_audio(f"{tmp}/norm.wav", f"{tmp}/chunks")
+
+            cases.setdefault("utils file chain", {})[label] = measure(files_chain, repeats, seconds)
+            cases.setdefault("PreprocessChain.to_files", {})[label] = measure(
+                lambda: chain.to_files(src, f"{tmp}/norm2.wav", f"{tmp}/chunks2"), repeats, seconds)
+        cases.setdefault("PreprocessChain in memory", {})[label] = measure(
+            lambda: sum(len(c) for c in chain.iter_chunks(src)), repeats, seconds)
+    return {"meta": _meta(repeats), "cases": cases}
+
+
+def _synth(seconds: float):
+    pcm, whisper, turns = synth_call(seconds, seed=int(seconds))
+    return pcm, 16_000, whisper, turns
+
+
+def _meta(repeats: int) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "python": sys.version.split()[0], "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "numpy": np.__version__, "repeats": repeats,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Call-analysis benchmarks.")
+    ap.add_argument("--out", help="write the JSON report here instead of stdout")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("upload", help="compare transcription upload codecs")
+    p.add_argument("sources", nargs="*", default=SAMPLE_CALLS, help="audio files or URLs")
+    p.add_argument("--transcribe", action="store_true",
+                   help="also upload each encoding and compare transcripts with WAV")
+
+    p = sub.add_parser("diarize", help="full vs two-speaker fast diarization: RTF and DER")
+    p.add_argument("sources", nargs="*", default=SAMPLE_CALLS, help="audio files or URLs")
+    p.add_argument("--stride", type=int, nargs="+", default=[1],
+                   help="embedding strides to try in fast mode")
+
+    p = sub.add_parser("diarize-onnx", help="PyTorch vs ONNX Runtime diarization: RTF and DER")
+    p.add_argument("sources", nargs="*", default=SAMPLE_CALLS, help="audio files or URLs")
+    p.add_argument("--threads", type=int, nargs="+", help="ONNX Runtime intra-op threads to try")
+    p.add_argument("--quantize", nargs="+", choices=["off", "int8"], default=["off", "int8"])
+
+    p = sub.add_parser("suite", help="offline stage benchmarks on synthetic calls with fakes")
+    p.add_argument("--lengths", type=float, nargs="+", default=list(SUITE_LENGTHS),
+                   help="synthetic call lengths in seconds")
+    p.add_argument("--repeats", type=int, default=5)
+    p.add_argument("--data", default=SUITE_DATA, help="recordings directory (created if missing)")
+
+    p = sub.add_parser("record", help="save real Whisper/pyannote outputs for offline replay")
+    p.add_argument("sources", nargs="+", help="audio files or URLs")
+    p.add_argument("--data", default=SUITE_DATA, help="recordings directory")
+
+    p = sub.add_parser("preprocess", help="file-based utils chain vs in-memory PreprocessChain")
+    p.add_argument("--lengths", type=float, nargs="+", default=[60, 600], help="call lengths in seconds")
+    p.add_argument("--rate", type=int, default=44_100, help="input sample rate")
+    p.add_argument("--repeats", type=int, default=3)
+    p.add_argument("--data", default=SUITE_DATA, help="where the input WAVs are written")
+
+    args = ap.parse_args()
+    if args.cmd == "upload":
+        report = bench_upload(args.sources, args.transcribe)
+    elif args.cmd == "diarize":
+        report = bench_diarize(args.sources, args.stride)
+    elif args.cmd == "diarize-onnx":
+        report = bench_diarize_onnx(args.sources, args.threads, args.quantize)
+    elif args.cmd == "suite":
+        report = bench_suite(args.lengths, args.repeats, args.data)
+    elif args.cmd == "record":
+        report = record(args.sources, args.data)
+    elif args.cmd == "preprocess":
+        report = bench_preprocess(args.lengths, args.repeats, args.rate, args.data)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
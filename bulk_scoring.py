@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+bulk_scoring.py  –  offline cross-call scoring through the Batch API.
+
+Collects many calls' agent text into one JSONL batch job (one combined
+assessment request per call, custom_id = call_id), submits it, and maps the
+results back by call_id.  Point OPENAI_BASE_URL at fake_services.py to run it
+without network:
+
+    python fake_services.py --port 8780 &
+    OPENAI_BASE_URL=http://127.0.0.1:8780/v1 OPENAI_API_KEY=x \\
+        python bulk_scoring.py agent_texts.json --out scores.json
+
+agent_texts.json is {"<call_id>": "<agent text>", ...}.
+"""
+import json
+import logging
+import time
+from pathlib import Path
+
+import models
+from assessment import SCORE_KEYS, assess_request, parse_assessment
+
+ENDPOINT = "/v1/chat/completions"
+
+
+def build_batch_lines(agent_texts: dict) -> list[str]:
+    return [
+        json.dumps({"custom_id": call_id, "method": "POST", "url": ENDPOINT,
+                    "body": assess_request(text)}, ensure_ascii=False)
+        for call_id, text in agent_texts.items()
+    ]
+
+
+def submit(agent_texts: dict) -> str:
+    """Upload the batch file and create the job; returns the batch id."""
+    client = models.get("openai")
+    data = ("\n".join(build_batch_lines(agent_texts)) + "\n").encode("utf-8")
+    f = client.files.create(file=("assessments.jsonl", data), purpose="batch")
+    batch = client.batches.create(input_file_id=f.id, endpoint=ENDPOINT, completion_window="24h")
+    logging.info(f"Submitted batch {batch.id} with {len(agent_texts)} calls")
+    return batch.id
+
+
+def wait(batch_id: str, poll_sec: float = 30, timeout_sec: float = 24 * 3600):
+    client = models.get("openai")
+    deadline = time.time() + timeout_sec
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in ("completed", "failed", "expired", "cancelled"):
+            return batch
+        if time.time() > deadline:
+            raise TimeoutError(f"Batch {batch_id} still {batch.status} after {timeout_sec} s")
+        time.sleep(poll_sec)
+
+
+def collect(batch) -> dict:
+    """{call_id: {"breakdown", "summary"} or {"error"}} from a finished batch."""
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} ended as {batch.status}")
+    text = models.get("openai").files.content(batch.output_file_id).text
+    results = {}
+    for line in filter(None, (l.strip() for l in text.splitlines())):
+        row = json.loads(line)
+        call_id = row["custom_id"]
+        response = row.get("response") or {}
+        if row.get("error") or response.get("status_code", 200) != 200:
+            results[call_id] = {"error": row.get("error") or response.get("body")}
+            continue
+        try:
+            message = response["body"]["choices"][0]["message"]
+            if message.get("refusal"):
+                results[call_id] = {"error": "refusal", "refusal": message["refusal"]}
+                continue
+            scores, summary = parse_assessment(message.get("content"))
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            results[call_id] = {"error": f"bad assessment: {e}"}
+            continue
+        results[call_id] = {
+            "staff_score": round(sum(scores[k] for k in SCORE_KEYS) / len(SCORE_KEYS), 1),
+            "breakdown": scores,
+            "summary": summary,
+        }
+    return results
+
+
+def score_bulk(agent_texts: dict, poll_sec: float = 30) -> dict:
+    return collect(wait(submit(agent_texts), poll_sec=poll_sec))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Score many calls in one batch job.")
+    ap.add_argument("agent_texts", help='JSON file {"call_id": "agent text", ...}')
+    ap.add_argument("--out", help="write results JSON here instead of stdout")
+    ap.add_argument("--poll", type=float, default=30, help="seconds between status checks")
+    args = ap.parse_args()
+
+    texts = json.loads(Path(args.agent_texts).read_text(encoding="utf-8"))
+    out = json.dumps(score_bulk(texts, poll_sec=args.poll), indent=2, ensure_ascii=False)
+    if args.out:
+        Path(args.out).write_text(out, encoding="utf-8")
+    else:
+        print(out)
@@ -0,0 +1,122 @@
+"""
+cache.py  –  content-addressed on-disk cache for expensive stage results.
+
+Keys are a hash of the stage name, the decoded audio (or prompt text) and the
+stage parameters, so changing e.g. the scoring prompt only invalidates the
+scoring entries.  Entries are pickles under CALL_CACHE_DIR; when the directory
+grows past CALL_CACHE_MAX_MB the least recently used files are evicted.
+
+Set CALL_CACHE=off (or pass --no-cache to analyse_staff.py) to bypass it.
+"""
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+from pathlib import Path
+
+import tracing
+
+PIPELINE_VERSION = "1"   # bump to invalidate every cached stage at once
+# full directory scans between evictions, unless our own writes already passed the cap;
+# other processes write to the same directory, so the running estimate is only a lower bound
+EVICT_EVERY = int(os.getenv("CALL_CACHE_EVICT_EVERY", "50"))
+
+
+def text_fingerprint(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, root: str, max_bytes: int, enabled: bool = True):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._approx_bytes = None       # directory size at the last scan + our writes since
+        self._puts = 0
+
+    def key(self, stage: str, content_hash: str, **params) -> str:
+        blob = json.dumps(
+            {"stage": stage, "content": content_hash, "version": PIPELINE_VERSION, **params},
+            sort_keys=True, ensure_ascii=False,
+        )
+        return f"{stage}-{hashlib.sha256(blob.encode('utf-8')).hexdigest()[:32]}"
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.pkl"
+
+    def get(self, key: str):
+        """Return (hit, value)."""
+        if not self.enabled:
+            return False, None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        except Exception as e:
+            logging.warning(f"Cache entry {key} unreadable, recomputing: {e}")
+            return False, None
+        # mtime doubles as last-access time for LRU; another process may have evicted it meanwhile
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return True, value
+
+    def put(self, key: str, value):
+        if not self.enabled:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = f.tell()
+        os.replace(tmp, path)
+        with self._lock:
+            self._puts += 1
+            if self._approx_bytes is not None:
+                self._approx_bytes += size
+            due = (self._approx_bytes is None or self._approx_bytes > self.max_bytes
+                   or self._puts >= EVICT_EVERY)
+        if due:
+            self._evict()
+
+    def get_or_compute(self, key: str, compute):
+        hit, value = self.get(key)
+        if hit:
+            logging.info(f"Cache hit {key}")
+            tracing.add(cache_hits=1)
+            return value
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for p in self.root.glob("*.pkl"):
+                try:
+                    st = p.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+            total = sum(size for _, size, _ in entries)
+            for _, size, p in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                p.unlink(missing_ok=True)
+                total -= size
+                logging.info(f"Cache evicted {p.name}")
+            self._approx_bytes = total
+            self._puts = 0
+
+
+cache = ResultCache(
+    root=os.getenv("CALL_CACHE_DIR", ".cache/stages"),
+    max_bytes=int(os.getenv("CALL_CACHE_MAX_MB", "2048")) * 1024 * 1024,
+    enabled=os.getenv("CALL_CACHE", "on").lower() not in ("0", "off", "false", "no"),
+)
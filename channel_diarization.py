@@ -0,0 +1,79 @@
+"""
+channel_diarization.py  –  speaker turns from the channels of a stereo call.
+
+Dual-channel telephony recordings already separate agent and customer, so
+instead of running pyannote on the downmix each channel gets a simple
+energy VAD:
+
+    * 30 ms frame energy in dB per channel
+    * a frame is speech when it clears the channel's own noise floor by
+      MARGIN_DB and is within DOMINANCE_DB of the loudest channel (line echo
+      and crosstalk leak into the other channel at a much lower level)
+    * gaps shorter than MIN_OFF_SEC are bridged, blips shorter than
+      MIN_ON_SEC dropped
+
+Channel i becomes speaker "SPEAKER_0i" in a pyannote.core.Annotation, the same
+structure align_words_to_speakers consumes for pyannote output.
+"""
+import numpy as np
+
+FRAME_SEC = 0.03
+MARGIN_DB = 12.0        # above the channel's noise floor
+FLOOR_DB = -55.0        # never call anything quieter than this speech
+DOMINANCE_DB = 15.0     # at most this far below the loudest channel
+MIN_ON_SEC = 0.2
+MIN_OFF_SEC = 0.3
+
+
+def frame_db(pcm: np.ndarray, sample_rate: int, frame_sec: float = FRAME_SEC) -> np.ndarray:
+    """Per-frame energy in dBFS of one int16 channel."""
+    frame = max(int(frame_sec * sample_rate), 1)
+    n_frames = len(pcm) // frame
+    x = pcm[:n_frames * frame].reshape(n_frames, frame).astype(np.float32) / 32768.0
+    power = np.einsum("ij,ij->i", x, x) / frame
+    return 10.0 * np.log10(power + 1e-10)
+
+
+def _runs(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(starts, ends) frame indices of the True runs in <mask>."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def _smooth(mask: np.ndarray, min_on: int, min_off: int) -> np.ndarray:
+    out = mask.copy()
+    starts, ends = _runs(~out)
+    for s, e in zip(starts, ends):              # bridge short pauses inside a turn
+        if 0 < s and e < len(out) and e - s < min_off:
+            out[s:e] = True
+    starts, ends = _runs(out)
+    for s, e in zip(starts, ends):              # drop clicks and breaths
+        if e - s < min_on:
+            out[s:e] = False
+    return out
+
+
+def channel_activity(channels: np.ndarray, sample_rate: int,
+                     frame_sec: float = FRAME_SEC) -> np.ndarray:
+    """(n_channels, n_frames) boolean speech activity."""
+    db = np.stack([frame_db(c, sample_rate, frame_sec) for c in channels])
+    floor = np.percentile(db, 10, axis=1, keepdims=True)
+    active = (db > np.maximum(floor + MARGIN_DB, FLOOR_DB)) & \
+             (db >= db.max(axis=0, keepdims=True) - DOMINANCE_DB)
+    min_on = max(int(round(MIN_ON_SEC / frame_sec)), 1)
+    min_off = max(int(round(MIN_OFF_SEC / frame_sec)), 1)
+    return np.stack([_smooth(a, min_on, min_off) for a in active])
+
+
+def channel_turns(channels: np.ndarray, sample_rate: int, uri: str = "memo",
+                  frame_sec: float = FRAME_SEC):
+    """pyannote.core.Annotation with one speaker per channel."""
+    from pyannote.core import Annotation, Segment
+
+    frame = max(int(frame_sec * sample_rate), 1) / sample_rate
+    diar = Annotation(uri=uri)
+    for ch, active in enumerate(channel_activity(channels, sample_rate, frame_sec)):
+        starts, ends = _runs(active)
+        for i, (s, e) in enumerate(zip(starts, ends)):
+            diar[Segment(s * frame, e * frame), f"{ch}_{i}"] = f"SPEAKER_{ch:02d}"
+    return diar
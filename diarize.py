@@ -1,6 +1,5 @@
-import whisperx
-
 def diarize_audio(audio_path, model_size="medium", language="ta", device="cuda"):
+    import whisperx  # heavy; only pay for it when diarizing
     # Load Whisper model
     model = whisperx.load_model(model_size, device=device, language=language)
 
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+fake_services.py  –  local stand-in for the OpenAI endpoints the pipeline uses.
+
+Deterministic, offline, no API key needed:
+
+    python fake_services.py --port 8780
+    export OPENAI_BASE_URL=http://127.0.0.1:8780/v1 OPENAI_API_KEY=fake
+
+Implements
+    POST /v1/chat/completions          canned assessment / echo replies
+    POST /v1/audio/transcriptions      replayed verbose_json (WAV uploads)
+    POST /v1/files                     multipart upload (purpose=batch)
+    GET  /v1/files/<id>/content
+    POST /v1/batches, GET /v1/batches/<id>   batches complete immediately
+    GET  /audio/<name>.wav             recordings, standing in for S3
+
+With --replay DIR, every <name>.wav in DIR that has a <name>.whisper.json
+(verbose_json) and optionally a <name>.diar.json ([[start, end, speaker], ...])
+next to it is a recording.  An uploaded WAV is looked up as a stretch of a
+recording's PCM, so chunked uploads get the matching slice of its words;
+ReplayDiarization does the same for pyannote input in-process.
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+import wave
+from io import BytesIO
+from pathlib import Path
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ---------- recordings ----------
+def load_recordings(replay_dir) -> dict:
+    """{name: {"pcm": bytes, "sample_rate", "whisper": dict, "turns": list or None}}"""
+    recordings = {}
+    for wav_path in sorted(Path(replay_dir).glob("*.wav")):
+        whisper_path = wav_path.with_suffix(".whisper.json")
+        if not whisper_path.exists():
+            continue
+        pcm, sample_rate = wav_pcm(wav_path.read_bytes())
+        diar_path = wav_path.with_suffix(".diar.json")
+        recordings[wav_path.stem] = {
+            "pcm": pcm, "sample_rate": sample_rate,
+            "whisper": json.loads(whisper_path.read_text(encoding="utf-8")),
+            "turns": json.loads(diar_path.read_text(encoding="utf-8")) if diar_path.exists() else None,
+        }
+    return recordings
+
+
+def wav_pcm(data: bytes) -> tuple[bytes, int]:
+    """(16-bit mono PCM bytes, sample rate) of a WAV file."""
+    with wave.open(BytesIO(data)) as wf:
+        if wf.getsampwidth() != 2 or wf.getnchannels() != 1:
+            raise ValueError("replay expects 16-bit mono WAV")
+        return wf.readframes(wf.getnframes()), wf.getframerate()
+
+
+def find_recording(recordings: dict, pcm: bytes, sample_rate: int):
+    """(recording, offset sec) whose PCM contains <pcm>, or (None, 0)."""
+    for rec in recordings.values():
+        if rec["sample_rate"] != sample_rate:
+            continue
+        pos = rec["pcm"].find(pcm)
+        while pos >= 0 and pos % 2:                 # stay on sample boundaries
+            pos = rec["pcm"].find(pcm, pos + 1)
+        if pos >= 0:
+            return rec, pos / 2 / sample_rate
+    return None, 0.0
+
+
+class ReplayDiarization:
+    """Stand-in for the pyannote pipeline: recorded turns for known audio."""
+
+    def __init__(self, recordings: dict):
+        self.recordings = recordings
+
+    def __call__(self, file: dict, **kwargs):
+        import numpy as np
+
+        samples = file["waveform"].numpy()[0]
+        pcm = np.round(samples * 32768.0).astype(np.int16).tobytes()
+        sample_rate = file["sample_rate"]
+        rec, offset = find_recording(self.recordings, pcm, sample_rate)
+        if rec is None or rec["turns"] is None:
+            raise KeyError("no recorded diarization for this audio")
+        return turns_annotation(rec["turns"], offset, offset + len(pcm) / 2 / sample_rate,
+                                uri=file.get("uri"))
+
+
+def turns_annotation(turns: list, start: float = 0.0, end: float = float("inf"), uri=None):
+    """pyannote Annotation of recorded turns within [start, end), re-timed to start."""
+    from pyannote.core import Annotation, Segment
+
+    diar = Annotation(uri=uri)
+    for i, (t0, t1, speaker) in enumerate(turns):
+        if t1 > start and t0 < end:
+            diar[Segment(max(t0, start) - start, min(t1, end) - start), i] = speaker
+    return diar
+
+
+class FakeOpenAI:
+    """State + request handling, independent of the HTTP transport."""
+
+    def __init__(self, replay_dir=None):
+        self.files = {}     # id -> {"meta": {...}, "data": bytes}
+        self.batches = {}
+        self.lock = threading.Lock()
+        self.replay_dir = replay_dir
+        self.recordings = load_recordings(replay_dir) if replay_dir else {}
+
+    # ---------- chat ----------
+    def chat(self, body: dict) -> dict:
+        prompt = body["messages"][-1]["content"]
+        fmt = (body.get("response_format") or {})
+        schema = (fmt.get("json_schema") or {}).get("name")
+        if schema == "agent_assessment":
+            content = json.dumps(self._assessment(prompt))
+        elif fmt.get("type") == "json_object" and '"translations"' in prompt:
+            texts = json.loads(prompt.split("\n\n", 1)[1])
+            content = json.dumps({"translations": [f"[en] {t}" for t in texts]}, ensure_ascii=False)
+        else:
+            content = f"[fake reply to {len(prompt)} chars]"
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        }
+
+    @staticmethod
+    def _assessment(prompt: str) -> dict:
+        # stable pseudo-scores so repeated runs compare equal
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        keys = ("politeness", "clarity", "knowledge", "compliance")
+        out = {k: 50 + digest[i] % 50 for i, k in enumerate(keys)}
+        out["did_well"] = ["Greeted the customer", "Stated the offer", "Stayed calm"]
+        out["improve"] = ["Confirm details", "Explain charges", "Close the call"]
+        return out
+
+    # ---------- audio ----------
+    def transcribe(self, fields: dict):
+        """verbose_json / json / text reply for a multipart transcription request."""
+        _, data = fields["file"]
+        pcm, sample_rate = wav_pcm(data)
+        duration = len(pcm) / 2 / sample_rate
+        rec, offset = find_recording(self.recordings, pcm, sample_rate)
+        if rec is not None:
+            words = [{"word": w["word"], "start": round(w["start"] - offset, 3),
+                      "end": round(w["end"] - offset, 3)}
+                     for w in rec["whisper"]["words"]
+                     if offset <= (w["start"] + w["end"]) / 2 < offset + duration]
+            language = rec["whisper"].get("language", "tamil")
+        else:
+            # unknown audio: a word every half second so downstream stages have work
+            words = [{"word": f"w{i}", "start": i * 0.5, "end": i * 0.5 + 0.4}
+                     for i in range(int(duration / 0.5))]
+            language = "tamil"
+        text = " ".join(w["word"] for w in words)
+        fmt = fields.get("response_format", (None, b"json"))[1].decode()
+        if fmt == "text":
+            return text
+        if fmt != "verbose_json":
+            return {"text": text}
+        return {"task": "transcribe", "language": language, "duration": round(duration, 3),
+                "text": text, "words": words,
+                "segments": [{"id": 0, "seek": 0, "start": 0.0, "end": round(duration, 3),
+                              "text": text, "tokens": [], "temperature": 0.0,
+                              "avg_logprob": -0.2, "compression_ratio": 1.0,
+                              "no_speech_prob": 0.0}]}
+
+    # ---------- files ----------
+    def upload(self, filename: str, purpose: str, data: bytes) -> dict:
+        meta = {"id": f"file-{uuid.uuid4().hex[:12]}", "object": "file", "bytes": len(data),
+                "created_at": int(time.time()), "filename": filename, "purpose": purpose,
+                "status": "processed"}
+        with self.lock:
+            self.files[meta["id"]] = {"meta": meta, "data": data}
+        return meta
+
+    # ---------- batches ----------
+    def create_batch(self, body: dict) -> dict:
+        lines = self.files[body["input_file_id"]]["data"].decode("utf-8").splitlines()
+        out = []
+        for line in filter(None, lines):
+            req = json.loads(line)
+            out.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                "custom_id": req["custom_id"],
+                "response": {"status_code": 200, "request_id": uuid.uuid4().hex,
+                             "body": self.chat(req["body"])},
+                "error": None,
+            }, ensure_ascii=False))
+        result = self.upload("batch_output.jsonl", "batch_output", ("\n".join(out) + "\n").encode("utf-8"))
+        now = int(time.time())
+        batch = {"id": f"batch_{uuid.uuid4().hex[:12]}", "object": "batch",
+                 "endpoint": body["endpoint"], "input_file_id": body["input_file_id"],
+                 "completion_window": body.get("completion_window", "24h"),
+                 "status": "completed", "output_file_id": result["id"], "error_file_id": None,
+                 "created_at": now, "completed_at": now,
+                 "request_counts": {"total": len(out), "completed": len(out), "failed": 0}}
+        with self.lock:
+            self.batches[batch["id"]] = batch
+        return batch
+
+
+def _multipart(headers, body: bytes) -> dict:
+    """{field: (filename, bytes)} from a multipart/form-data body."""
+    msg = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {headers['Content-Type']}\r\n\r\n".encode() + body)
+    return {part.get_param("name", header="content-disposition"):
+            (part.get_filename(), part.get_payload(decode=True))
+            for part in msg.iter_parts()}
+
+
+class Handler(BaseHTTPRequestHandler):
+    state: FakeOpenAI = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status: int, body, content_type: str = "application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        body = self._body()
+        if self.path == "/v1/chat/completions":
+            return self._send(200, self.state.chat(json.loads(body)))
+        if self.path == "/v1/audio/transcriptions":
+            try:
+                reply = self.state.transcribe(_multipart(self.headers, body))
+            except (wave.Error, ValueError, EOFError) as e:
+                return self._send(400, {"error": {"message": f"fake transcription needs 16-bit mono "
+                                                             f"WAV (WHISPER_UPLOAD_CODEC=wav): {e}"}})
+            if isinstance(reply, str):
+                return self._send(200, reply.encode("utf-8"), "text/plain; charset=utf-8")
+            return self._send(200, reply)
+        if self.path == "/v1/files":
+            fields = _multipart(self.headers, body)
+            filename, data = fields["file"]
+            purpose = fields.get("purpose", (None, b"batch"))[1].decode()
+            return self._send(200, self.state.upload(filename, purpose, data))
+        if self.path == "/v1/batches":
+            return self._send(200, self.state.create_batch(json.loads(body)))
+        self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content":
+            f = self.state.files.get(parts[2])
+            if f:
+                return self._send(200, f["data"], "application/octet-stream")
+        if parts[0] == "audio" and len(parts) == 2 and self.state.replay_dir:
+            path = Path(self.state.replay_dir) / Path(parts[1]).name
+            if path.suffix == ".wav" and path.exists():
+                return self._send(200, path.read_bytes(), "audio/wav")
+        if parts[:2] == ["v1", "batches"] and len(parts) == 3 and parts[2] in self.state.batches:
+            return self._send(200, self.state.batches[parts[2]])
+        self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8780, replay_dir=None) -> ThreadingHTTPServer:
+    Handler.state = FakeOpenAI(replay_dir)
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Local stand-in for OpenAI endpoints.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8780)
+    ap.add_argument("--replay", help="directory of recordings to replay and serve")
+    args = ap.parse_args()
+    server = make_server(args.host, args.port, args.replay)
+    print(f"Fake OpenAI on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,155 @@
+"""
+fast_diarization.py  –  two-speaker fast mode for the pyannote 3.1 pipeline.
+
+Support calls have exactly one agent and one customer, so the fast mode fixes
+num_speakers=2 (no cluster-count search) and sets the knobs that dominate CPU
+time explicitly:
+
+    * segmentation step  – fraction of the 10 s window between chunks
+      (pipeline default 0.1, i.e. 90 % overlap and ~10 chunks per second of audio)
+    * embedding batch size and torch intra-op threads (set only while the
+      pipeline runs; DIAR_FAST_THREADS=0 splits the cores between the
+      DIAR_WORKERS diarization processes batch.py starts)
+    * embedding stride   – embed only every Nth chunk; the skipped chunks reuse
+      the embeddings of the nearest embedded chunk, with local speakers matched
+      by agreement of their activity over the frames both chunks share
+
+The mode is configured with DIAR_MODE=fast and the DIAR_FAST_* variables, and
+benchmark.py diarize reports real-time factor and DER against the full mode.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from itertools import permutations
+
+import numpy as np
+
+FAST_PARAMS = {
+    "num_speakers": 2,
+    "segmentation_step": float(os.getenv("DIAR_FAST_STEP", "0.5")),
+    "embedding_batch_size": int(os.getenv("DIAR_FAST_EMBED_BATCH", "32")),
+    "segmentation_batch_size": int(os.getenv("DIAR_FAST_SEG_BATCH", "32")),
+    "torch_threads": int(os.getenv("DIAR_FAST_THREADS", "0")),     # 0: default_threads()
+    "embedding_stride": int(os.getenv("DIAR_FAST_EMBED_STRIDE", "1")),
+}
+
+
+def default_threads() -> int:
+    """Cores per diarization process: batch.py runs DIAR_WORKERS of them side by side."""
+    return max(1, (os.cpu_count() or 1) // max(1, int(os.getenv("DIAR_WORKERS", "1"))))
+
+
+_threads_lock = threading.Lock()
+_threads_users = 0
+_threads_saved = None
+
+
+@contextmanager
+def intra_op_threads(n: int):
+    """
+    torch's intra-op thread count is process-wide: set it to <n> while the
+    block runs and restore it once the last overlapping block has left.
+    """
+    import torch
+
+    global _threads_users, _threads_saved
+    with _threads_lock:
+        if _threads_users == 0:
+            _threads_saved = torch.get_num_threads()
+        _threads_users += 1
+        torch.set_num_threads(n)
+    try:
+        yield
+    finally:
+        with _threads_lock:
+            _threads_users -= 1
+            if _threads_users == 0:
+                torch.set_num_threads(_threads_saved)
+
+
+def scope_threads(pipeline, n: int):
+    """Run <pipeline> (a pyannote Pipeline) with <n> torch threads, in place."""
+    apply = pipeline.apply
+
+    def scoped(*args, **kwargs):
+        with intra_op_threads(n):
+            return apply(*args, **kwargs)
+
+    pipeline.apply = scoped
+    return pipeline
+
+
+def configure(pipeline, segmentation_step: float, embedding_batch_size: int,
+              segmentation_batch_size: int, torch_threads: int, embedding_stride: int = 1,
+              **_):
+    """Apply the fast-mode settings to a loaded SpeakerDiarization pipeline in place."""
+    scope_threads(pipeline, torch_threads or default_threads())
+    pipeline.segmentation_step = segmentation_step
+    pipeline._segmentation.step = segmentation_step * pipeline._segmentation.duration
+    pipeline._segmentation.batch_size = segmentation_batch_size
+    pipeline.embedding_batch_size = embedding_batch_size
+    if embedding_stride > 1:
+        full = pipeline.get_embeddings
+
+        def strided(file, binary_segmentations, exclude_overlap=False, hook=None):
+            return strided_embeddings(full, file, binary_segmentations, embedding_stride,
+                                      exclude_overlap=exclude_overlap, hook=hook)
+
+        pipeline.get_embeddings = strided
+    return pipeline
+
+
+def strided_embeddings(get_embeddings, file, binary_segmentations, stride: int, **kwargs):
+    """
+    (num_chunks, num_speakers, dim) embeddings computed on every <stride>-th chunk only.
+    """
+    from pyannote.core import SlidingWindow, SlidingWindowFeature
+
+    data = binary_segmentations.data                     # (chunks, frames, speakers)
+    window = binary_segmentations.sliding_window
+    num_chunks, num_frames, num_speakers = data.shape
+
+    def embed(chunks: np.ndarray, step: int) -> dict:
+        # get_embeddings crops audio from the sliding window, so a strided subset is
+        # simply a feature with a <step>-times longer hop starting at its first chunk
+        sub = SlidingWindowFeature(data[chunks], SlidingWindow(
+            start=window[int(chunks[0])].start, duration=window.duration,
+            step=window.step * step))
+        return dict(zip(chunks.tolist(), get_embeddings(file, sub, **kwargs)))
+
+    computed = np.arange(0, num_chunks, stride)
+    sub_embeddings = embed(computed, stride)
+    if computed[-1] != num_chunks - 1:                   # keep the tail of the call covered
+        sub_embeddings.update(embed(np.array([num_chunks - 1]), 1))
+        computed = np.append(computed, num_chunks - 1)
+
+    dim = next(iter(sub_embeddings.values())).shape[-1]
+    embeddings = np.empty((num_chunks, num_speakers, dim), dtype=np.float32)
+    frames_per_step = window.step * num_frames / window.duration
+    for c in range(num_chunks):
+        if c in sub_embeddings:
+            embeddings[c] = sub_embeddings[c]
+            continue
+        src = int(computed[np.argmin(np.abs(computed - c))])
+        perm = match_speakers(data[c], data[src], round((c - src) * frames_per_step))
+        embeddings[c] = sub_embeddings[src][list(perm)]
+    return embeddings
+
+
+def match_speakers(target: np.ndarray, source: np.ndarray, shift: int) -> tuple:
+    """
+    Permutation p such that local speaker s of <target> is speaker p[s] of <source>.
+    <shift>: frames by which <target> starts after <source> (negative = before).
+    """
+    num_frames, num_speakers = target.shape
+    identity = tuple(range(num_speakers))
+    if abs(shift) >= num_frames:
+        return identity
+    if shift >= 0:
+        t, s = target[:num_frames - shift], source[shift:]
+    else:
+        t, s = target[-shift:], source[:num_frames + shift]
+    # co-activity between every target / source speaker pair over the shared frames
+    overlap = t.T.astype(np.float32) @ s.astype(np.float32)
+    return max(permutations(range(num_speakers)),
+               key=lambda p: (overlap[identity, p].sum(), p == identity))
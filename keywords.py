@@ -0,0 +1,175 @@
+"""
+keywords.py  –  compiled multi-pattern keyword matcher for transcripts.
+
+    KEYWORDS.categories("Bajaj Finance-ல இருந்து பேசறேன்")   # {"company"}
+    KEYWORDS.categories_many(texts)                          # one pass over a batch
+
+All lexicon terms are compiled into one trie-shaped regex, so a segment is
+scanned once (in C) for every category instead of once per term.  Text is case-folded and
+curly apostrophes are straightened before matching.
+
+Word boundaries: a hit must not start or end inside a word ("uh" does not
+match "much").  Tamil combining vowel signs and the virama count as word
+characters, so "பஜாஜ்" does not match in the middle of another word.  Tamil is
+agglutinative ("பஜாஜ்ல", "கடனுக்கு"), so terms ending in Tamil script may be
+followed by any suffix; English terms may take a common inflection
+("loans", "applying", "approved": -s, -es, -d, -ed, -ing) and must then end
+on a boundary.
+
+KEYWORDS_FILE (JSON, {"category": ["term", ...]}) adds terms to the built-in
+lexicons, or replaces a category listed with "replace": true, e.g.
+    {"company": ["acme"], "hesitation": {"terms": ["er"], "replace": true}}
+"""
+import json
+import os
+import re
+from bisect import bisect_right
+from collections import Counter
+
+LEXICONS = {
+    # company mentions that mark the agent (analyse_staff.tag_staff_Speaker)
+    "company": ["பஜாஜ்", "bajaj", "பஜார்", "finance", "பைனான்ஸ்"],
+    "loan": ["loan", "interest", "repayment", "approval", "approve", "emi",
+             "லோன்", "கடன்", "வட்டி", "தவணை"],
+    "eligibility": ["apply", "applied", "applies", "eligible", "அப்ளை"],
+    "closing": ["shall i proceed", "can i help"],
+    "hesitation": ["uh", "hmm", "not sure", "don't know", "தெரியல", "தெரியாது"],
+}
+KEYWORDS_FILE = os.getenv("KEYWORDS_FILE")
+
+_NORMALIZE = str.maketrans({"\u2019": "'", "\u2018": "'", "`": "'"})
+
+
+def normalize(text: str) -> str:
+    return text.casefold().translate(_NORMALIZE)
+
+
+# word characters for boundaries; re's \w misses Tamil vowel signs and the virama
+_WORD = r"[\w\u0300-\u036f\u0b80-\u0bff]"
+_VIRAMA = "\u0bcd"
+_is_word = re.compile(_WORD).match
+# inflections an English term may take before its closing boundary
+_SUFFIX = "(?:s|es|d|ed|ing)?"
+_closing = re.compile(f"{_SUFFIX}(?!{_WORD})").match
+
+
+def _is_tamil(ch: str) -> bool:
+    return "\u0b80" <= ch <= "\u0bff"
+
+
+class KeywordMatcher:
+    def __init__(self, lexicons: dict):
+        self.lexicons = {cat: list(terms) for cat, terms in lexicons.items()}
+        # term -> categories; a term may sit in several lexicons
+        self.terms = {}
+        for cat, terms in self.lexicons.items():
+            for term in terms:
+                term = " ".join(normalize(term).split())
+                if term:
+                    self.terms.setdefault(term, set()).add(cat)
+        self._build()
+
+    def _build(self):
+        """
+        Compile all terms into one regex shaped like their trie, so each text
+        position costs one character-class test unless a term starts there.
+        """
+        trie, keys = {}, []
+        for term in self.terms:
+            open_end = _is_tamil(term[-1])
+            # "கடன்" + suffix drops the virama ("கடனுக்கு"): match the stem
+            pattern = term.rstrip(_VIRAMA) if open_end else term
+            node = trie
+            for ch in pattern:
+                node = node.setdefault(ch, {})
+            node.setdefault("", []).append((f"t{len(keys)}", open_end))
+            keys.append((term, len(pattern), open_end))
+        self._keys = {f"t{i}": k for i, k in enumerate(keys)}
+
+        def compile_node(node) -> str:
+            alts = [re.escape(ch) + compile_node(child)
+                    for ch, child in sorted(node.items()) if ch]
+            # terminals after the children: the longest term wins, shorter ones on backtrack;
+            # the empty group marks where the hit ends
+            alts += [f"(?P<{key}>)" if open_end else f"{_SUFFIX}(?!{_WORD})(?P<{key}>)"
+                     for key, open_end in node.get("", [])]
+            return alts[0] if len(alts) == 1 else f"(?:{'|'.join(alts)})"
+
+        self._regex = re.compile(f"(?<!{_WORD})(?={compile_node(trie)})") if trie else None
+
+        # a hit on "can i help" may also be a hit on a term that is its prefix ("can")
+        self._shorter = {
+            key: [k for k, (t, n, o) in self._keys.items()
+                  if n < length and term.startswith(t.rstrip(_VIRAMA) if o else t)]
+            for key, (term, length, _) in self._keys.items()
+        }
+
+    def _scan(self, text: str):
+        """
+        Yield (start, end, term) for every boundary-respecting hit in normalized
+        <text>; an English hit's span includes its inflection.
+        """
+        if self._regex is None:
+            return
+        for m in self._regex.finditer(text):
+            key = m.lastgroup
+            start = m.start()
+            yield start, m.start(key), self._keys[key][0]
+            for k in self._shorter[key]:
+                t, n, open_end = self._keys[k]
+                if open_end:
+                    yield start, start + n, t
+                    continue
+                closing = _closing(text, start + n)
+                if closing:
+                    yield start, closing.end(), t
+
+    def find(self, text: str) -> list:
+        """[(start, end, term, categories)] with offsets into the normalized text."""
+        return [(s, e, term, self.terms[term]) for s, e, term in self._scan(normalize(text))]
+
+    def categories(self, text: str) -> set:
+        """Every category with at least one hit in <text>."""
+        hits = set()
+        for _, _, term in self._scan(normalize(text)):
+            hits |= self.terms[term]
+        return hits
+
+    def counts(self, text: str) -> Counter:
+        """Hits per category in <text>."""
+        c = Counter()
+        for _, _, term in self._scan(normalize(text)):
+            c.update(self.terms[term])
+        return c
+
+    def categories_many(self, texts) -> list:
+        """categories() for many texts (e.g. the segments of many calls) in one scan."""
+        texts = [normalize(t) for t in texts]
+        # "\n" is a word boundary and in no term, so hits never span two texts
+        starts, pos = [], 0
+        for t in texts:
+            starts.append(pos)
+            pos += len(t) + 1
+        hits = [set() for _ in texts]
+        for s, _, term in self._scan("\n".join(texts)):
+            hits[bisect_right(starts, s) - 1] |= self.terms[term]
+        return hits
+
+
+def load_lexicons(path: str = None) -> dict:
+    """Built-in LEXICONS merged with the JSON file at <path> (if any)."""
+    lexicons = {cat: list(terms) for cat, terms in LEXICONS.items()}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for cat, spec in json.load(f).items():
+                if isinstance(spec, dict):
+                    terms = spec.get("terms", [])
+                    if spec.get("replace"):
+                        lexicons[cat] = []
+                else:
+                    terms = spec
+                lexicons.setdefault(cat, []).extend(terms)
+    return lexicons
+
+
+KEYWORDS = KeywordMatcher(load_lexicons(KEYWORDS_FILE))
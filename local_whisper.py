@@ -0,0 +1,119 @@
+"""
+local_whisper.py  –  offline CPU transcription backend (faster-whisper / CTranslate2).
+
+Audio is cut into <=30 s windows at pauses, windows are pushed through the
+encoder in batches, and the same encoder output is decoded for every requested
+task, so "transcribe" + "translate" cost one encoder pass instead of two.
+Weights are int8-quantized by default and the thread count is configurable.
+
+The "transcribe" result has the same shape as the OpenAI verbose_json path
+(.text and .words with .word/.start/.end), so it can stand in for whisper_json:
+
+    backend = models.get("faster-whisper:small")
+    out = backend.transcribe(audio, language="ta", tasks=("transcribe", "translate"))
+    out["transcribe"].words, out["translate"].text
+"""
+import logging
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from audio import CallAudio, plan_chunks
+
+WINDOW_SEC = 30.0   # Whisper's native input length
+
+
+class LocalWhisper:
+    def __init__(self, size: str = "small", compute_type: str = "int8",
+                 cpu_threads: int = 0, batch_size: int = 8, beam_size: int = 5):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(size, device="cpu", compute_type=compute_type,
+                                  cpu_threads=cpu_threads)
+        self.size = size
+        self.compute_type = compute_type
+        self.batch_size = batch_size
+        self.beam_size = beam_size
+
+    def transcribe(self, audio: CallAudio, language: str = "ta",
+                   tasks=("transcribe",), initial_prompt: str = None) -> dict:
+        """
+        Return {task: result}.  "transcribe" carries word timestamps; every task
+        carries .text and .segments ([{start, end, text}] per window).
+        """
+        from faster_whisper.audio import pad_or_trim
+        from faster_whisper.tokenizer import Tokenizer
+        from faster_whisper.transcribe import get_suppressed_tokens
+
+        t0 = time.time()
+        sr = audio.sample_rate
+        bounds = plan_chunks(audio.pcm, sr, WINDOW_SEC, search_sec=5.0)
+        tokenizers = {
+            task: Tokenizer(self.model.hf_tokenizer, self.model.model.is_multilingual,
+                            task=task, language=language)
+            for task in tasks
+        }
+        segments = {task: [] for task in tasks}
+        words = []
+
+        for b0 in range(0, len(bounds), self.batch_size):
+            batch = bounds[b0:b0 + self.batch_size]
+            feats = np.stack([
+                pad_or_trim(self.model.feature_extractor(audio.samples[s:e])[..., :-1])
+                for s, e in batch
+            ])
+            encoder_output = self.model.encode(feats)   # shared by every task below
+
+            for task, tok in tokenizers.items():
+                previous = tok.encode(" " + initial_prompt.strip()) if initial_prompt else []
+                prompt = self.model.get_prompt(tok, previous, without_timestamps=True)
+                results = self.model.model.generate(
+                    encoder_output,
+                    [prompt] * len(batch),
+                    beam_size=self.beam_size,
+                    max_length=self.model.max_length,
+                    suppress_blank=True,
+                    suppress_tokens=get_suppressed_tokens(tok, [-1]),
+                )
+                tokens = [[t for t in r.sequences_ids[0] if t < tok.eot] for r in results]
+                for (s, e), toks in zip(batch, tokens):
+                    segments[task].append(SimpleNamespace(
+                        start=s / sr, end=e / sr, text=tok.decode(toks).strip()))
+                if task == "transcribe":
+                    words.extend(self._words(tok, tokens, encoder_output, batch, sr))
+
+        logging.info(f"Local whisper {self.size}/{self.compute_type}: {len(bounds)} windows, "
+                     f"tasks={list(tasks)}, {round(time.time()-t0,1)} s for {audio.duration:.0f} s audio")
+        out = {}
+        for task in tasks:
+            text = " ".join(seg.text for seg in segments[task] if seg.text)
+            out[task] = SimpleNamespace(text=text, segments=segments[task],
+                                        language=language, duration=audio.duration)
+        if "transcribe" in out:
+            out["transcribe"].words = words
+        return out
+
+    def _words(self, tok, tokens: list, encoder_output, batch: list, sr: int) -> list:
+        """Word timestamps from cross-attention alignment, shifted to call time."""
+        keep = [i for i, t in enumerate(tokens) if t]
+        if not keep:
+            return []
+        if len(keep) < len(tokens):
+            # the aligner can't take empty windows; re-wrap only the non-empty rows
+            import ctranslate2
+            encoder_output = ctranslate2.StorageView.from_array(np.array(encoder_output)[keep])
+        num_frames = [round((batch[i][1] - batch[i][0]) / sr * self.model.frames_per_second)
+                      for i in keep]
+        alignments = self.model.find_alignment(tok, [tokens[i] for i in keep],
+                                               encoder_output, num_frames)
+        words = []
+        for i, aligned in zip(keep, alignments):
+            offset = batch[i][0] / sr
+            words.extend(
+                SimpleNamespace(word=w["word"], start=round(offset + float(w["start"]), 3),
+                                end=round(offset + float(w["end"]), 3))
+                for w in aligned
+            )
+        return words
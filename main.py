@@ -1,16 +1,23 @@
 import os
-import requests
+import api_client
 import logging
-import whisper
-from utils import reduce_noise, normalize_audio, chunk_audio
+import models
+from audio import CallAudio
+from utils import PreprocessChain
 from diarize import diarize_audio
 from analyze import summarize_performance
 
 # Setup logging
 logging.basicConfig(filename="logs/transcription.log", level=logging.INFO)
 
-# Load Whisper model (start with "tiny", upgrade to "medium"/"large" later)
-model = whisper.load_model("base")  # Change to "medium" or "large" for better accuracy
+# Whisper model (start with "tiny", upgrade to "medium"/"large" later); loaded on first use
+WHISPER_SIZE = "base"  # Change to "medium" or "large" for better accuracy
+# "faster-whisper": batched int8 CPU backend, one encoder pass for both tasks.
+# "openai-whisper": the original per-chunk model.transcribe loop.
+LOCAL_BACKEND = os.getenv("LOCAL_BACKEND", "faster-whisper")
+
+# resample to 16 kHz, denoise, peak-normalize and cut 60 s chunks in one pass
+PREPROCESS = PreprocessChain(chunk_sec=60)
 
 # Folder setup
 AUDIO_DIR = "audio"
@@ -21,10 +28,9 @@ os.makedirs(CHUNK_DIR, exist_ok=True)
 def download_audio_from_s3(url, local_path):
     """Download audio file from public S3 URL"""
     try:
-        response = requests.get(url)
-        response.raise_for_status()
+        data = api_client.download(url)   # pooled session, retries, hedging
         with open(local_path, "wb") as f:
-            f.write(response.content)
+            f.write(data)
         return True
     except Exception as e:
         logging.error(f"Failed to download {url}: {e}")
@@ -32,12 +38,23 @@ def download_audio_from_s3(url, local_path):
 
 def transcribe_chunks(chunk_paths, translate=False):
     """Transcribe each chunk and combine results"""
+    model = models.get(f"whisper:{WHISPER_SIZE}")
     full_text = ""
     for path in chunk_paths:
         result = model.transcribe(path, task="translate" if translate else "transcribe", language="ta")
         full_text += result["text"].strip() + "\n"
     return full_text.strip()
 
+def transcribe_both(audio_path):
+    """(Tamil transcript, English translation) from one batched encoder pass."""
+    with open(audio_path, "rb") as f:
+        audio = CallAudio.from_bytes(f)
+    out = models.get(f"faster-whisper:{WHISPER_SIZE}").transcribe(
+        audio, language="ta", tasks=("transcribe", "translate"))
+    tamil = "\n".join(seg.text for seg in out["transcribe"].segments if seg.text)
+    english = "\n".join(seg.text for seg in out["translate"].segments if seg.text)
+    return tamil, english
+
 def process_pipeline(s3_urls):
     """Main pipeline for audio processing and analysis"""
     for idx, url in enumerate(s3_urls):
@@ -47,18 +64,17 @@ def process_pipeline(s3_urls):
             if not download_audio_from_s3(url, raw_path):
                 continue
 
-            # Preprocess audio
-            cleaned = raw_path.replace(".wav", "_clean.wav")
+            # Preprocess audio in memory; only the normalized call (and its chunks) hit disk
             normalized = raw_path.replace(".wav", "_norm.wav")
-            reduce_noise(raw_path, cleaned)
-            normalize_audio(cleaned, normalized)
-
-            # Chunk audio
-            chunk_paths = chunk_audio(normalized, os.path.join(CHUNK_DIR, f"call_{idx}"))
+            chunk_dir = None if LOCAL_BACKEND == "faster-whisper" else os.path.join(CHUNK_DIR, f"call_{idx}")
+            _, chunk_paths = PREPROCESS.to_files(raw_path, normalized, chunk_dir)
 
             # Transcribe
-            tamil_text = transcribe_chunks(chunk_paths, translate=False)
-            english_text = transcribe_chunks(chunk_paths, translate=True)
+            if LOCAL_BACKEND == "faster-whisper":
+                tamil_text, english_text = transcribe_both(normalized)
+            else:
+                tamil_text = transcribe_chunks(chunk_paths, translate=False)
+                english_text = transcribe_chunks(chunk_paths, translate=True)
 
             print(f"\n📞 Tamil Transcript:\n{tamil_text}")
             print(f"\n🌍 English Translation:\n{english_text}")
@@ -1,7 +1,6 @@
 import os
-import requests
+import api_client
 import logging
-from openai import OpenAI
 
 
 from analyze import summarize_performance  # Optional: if you want to score staff
@@ -10,8 +9,7 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-# Set your OpenAI API key
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# OpenAI requests (reads OPENAI_API_KEY) go through the shared api_client
 
 # Setup
 logging.basicConfig(filename="logs/transcription_openai.log", level=logging.INFO)
@@ -20,10 +18,9 @@ os.makedirs(AUDIO_DIR, exist_ok=True)
 
 def download_audio_from_s3(url, local_path):
     try:
-        response = requests.get(url)
-        response.raise_for_status()
+        data = api_client.download(url)   # pooled session, retries, hedging
         with open(local_path, "wb") as f:
-            f.write(response.content)
+            f.write(data)
         return True
     except Exception as e:
         logging.error(f"Failed to download {url}: {e}")
@@ -35,22 +32,12 @@ def convert_to_wav(input_path, output_path):
     audio.export(output_path, format="wav")
 
 def transcribe_openai(audio_path, translate=False):
+    # shared async client: rate limits, retries and tracing; bytes, so a retry can resend them
     with open(audio_path, "rb") as f:
-        if translate:
-            response = client.audio.translations.create(
-                model="whisper-1",
-                file=f,
-                response_format="text",
-                prompt="Translate this Tamil audio to English."
-            )
-        else:
-            response = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=f,
-                response_format="text",
-                prompt="Transcribe this Tamil audio."
-            )
-    return response
+        upload = (os.path.basename(audio_path), f.read())
+    prompt = "Translate this Tamil audio to English." if translate else "Transcribe this Tamil audio."
+    return api_client.transcribe(translate=translate, model="whisper-1", file=upload,
+                                 response_format="text", prompt=prompt)
 
 
 def process_pipeline(s3_urls):
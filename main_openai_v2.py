@@ -6,68 +6,86 @@ Same OpenAI API, zero disk I/O, parallel requests.
 import io
 import os
 import logging
-import requests
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from pydub import AudioSegment
 from dotenv import load_dotenv
-from openai import OpenAI
+import api_client
+from audio import CallAudio
+from translate import translate_segments
 
 # ---------- config ----------
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 logging.basicConfig(
     filename="logs/transcription_openai.log",
     level=logging.INFO,
     format="%(asctime)s %(message)s",
 )
+# "text": upload once, translate the Tamil segments as text (default)
+# "audio": upload twice, second request prompted to translate (old behaviour)
+TRANSLATE_MODE = os.getenv("TRANSLATE_MODE", "text")
 # ----------------------------
 
-def fetch_wav_bytes(url: str) -> io.BytesIO:
-    """Return 16 kHz mono WAV buffer straight from S3."""
+def fetch_upload(url: str) -> tuple[str, bytes]:
+    """Return (filename, bytes) of 16 kHz mono audio, compressed for upload (see WHISPER_UPLOAD_CODEC)."""
     print(f"[{time.strftime('%H:%M:%S')}] ⬇️  Downloading audio …")
-    resp = requests.get(url.strip(), timeout=60)
-    resp.raise_for_status()
-    raw = io.BytesIO(resp.content)
-    print(f"[{time.strftime('%H:%M:%S')}] ⚙️  Converting to 16 kHz mono WAV …")
-    audio = AudioSegment.from_file(raw).set_channels(1).set_frame_rate(16000)
-    wav = io.BytesIO()
-    audio.export(wav, format="wav")
-    wav.seek(0)
-    print(f"[{time.strftime('%H:%M:%S')}] ✅ Conversion done")
-    return wav
+    raw = io.BytesIO(api_client.download(url.strip()))
+    print(f"[{time.strftime('%H:%M:%S')}] ⚙️  Converting to 16 kHz mono …")
+    upload = CallAudio.from_bytes(raw).upload_file()
+    print(f"[{time.strftime('%H:%M:%S')}] ✅ Conversion done ({upload[0]}, {len(upload[1])/1e6:.1f} MB)")
+    return upload
 
-def _whisper_api(wav_bytes: io.BytesIO, *, translate: bool) -> str:
+def _whisper_api(upload: tuple[str, bytes], *, translate: bool) -> str:
     """Single API call; reusable for both tasks."""
-    wav_bytes.seek(0)
     task = "translation" if translate else "transcription"
     print(f"[{time.strftime('%H:%M:%S')}] 🚀 Starting Whisper {task} …")
     kwargs = dict(
         model="whisper-1",
-        file=("audio.wav", wav_bytes.read()),
+        file=upload,
         response_format="text",
     )
     if translate:  # English translation
         kwargs["prompt"] = "Translate this Tamil audio to English."
 
-    result = client.audio.transcriptions.create(**kwargs)  # same endpoint
+    result = api_client.transcribe(**kwargs)  # same endpoint
     print(f"[{time.strftime('%H:%M:%S')}] ✔️ Whisper {task} finished")
     return result
 
+def transcribe_segments(upload: tuple[str, bytes], language: str = "ta"):
+    """Single upload; verbose_json keeps per-segment timestamps for translation."""
+    print(f"[{time.strftime('%H:%M:%S')}] 🚀 Starting Whisper transcription …")
+    result = api_client.transcribe(
+        model="whisper-1",
+        file=upload,
+        response_format="verbose_json",
+        language=language,
+    )
+    print(f"[{time.strftime('%H:%M:%S')}] ✔️ Whisper transcription finished")
+    return result
+
 def process_one_call(idx: int, url: str):
-    """Download once, run both API calls in parallel."""
+    """Download once; transcribe once and translate the text (or two audio requests in "audio" mode)."""
     try:
         print(f"\n===== Call {idx} =====")
-        wav = fetch_wav_bytes(url)
-
-        with ThreadPoolExecutor(max_workers=2) as pool:
-            fut_tamil = pool.submit(_whisper_api, wav, translate=False)
-            fut_eng   = pool.submit(_whisper_api, wav, translate=True)
+        upload = fetch_upload(url)
 
-            tamil, english = fut_tamil.result(), fut_eng.result()
+        if TRANSLATE_MODE == "audio":
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                fut_tamil = pool.submit(_whisper_api, upload, translate=False)
+                fut_eng   = pool.submit(_whisper_api, upload, translate=True)
 
-        print(f"\n📞 Tamil Transcript:\n{tamil}")
-        print(f"\n🌍 English Translation:\n{english}")
+                tamil, english = fut_tamil.result(), fut_eng.result()
+            print(f"\n📞 Tamil Transcript:\n{tamil}")
+            print(f"\n🌍 English Translation:\n{english}")
+        else:
+            result = transcribe_segments(upload)
+            print(f"[{time.strftime('%H:%M:%S')}] 🌍 Translating {len(result.segments)} segments …")
+            rows = translate_segments(result.segments)
+            tamil = result.text
+            english = "\n".join(r["translation"] for r in rows)
+            print(f"\n📞 Tamil Transcript:\n{tamil}")
+            print("\n🌍 English Translation:")
+            for r in rows:
+                print(f"{r['start']:>6.1f}s  {r['translation']}")
         logging.info(f"✅ Call {idx} done")
         return tamil, english
 
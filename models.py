@@ -0,0 +1,190 @@
+"""
+models.py  –  lazy, process-wide registry for heavy clients and models.
+
+Nothing heavy (torch, pyannote, whisper, openai) is imported until a model is
+first requested, and each model is loaded once per process:
+
+    pipeline = models.get("diarization")          # or "diarization-fast" / "-enrolled"
+                                                  # (PyTorch or ONNX Runtime: DIAR_BACKEND)
+    whisper_base = models.get("whisper:base")     # "<backend>:<arg>"
+
+Startup cost per backend can be measured in clean interpreters with
+
+    python models.py --profile-startup [backend ...]
+"""
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DIAR_PIPELINE = "pyannote/speaker-diarization-3.1"
+# the embedding model inside DIAR_PIPELINE, so enrolled voices compare with its embeddings
+SPEAKER_EMBEDDING = "pyannote/wespeaker-voxceleb-resnet34-LM"
+# "torch" (pyannote as shipped) or "onnx" (int8 ONNX Runtime, see onnx_diarization.py)
+DIAR_BACKEND = os.getenv("DIAR_BACKEND", "torch").lower()
+
+_loaders = {}
+_instances = {}
+_load_seconds = {}
+_lock = threading.Lock()
+
+
+def register(backend: str):
+    """Decorator: register a loader.  Loaders for "name:arg" keys take <arg>."""
+    def deco(fn):
+        _loaders[backend] = fn
+        return fn
+    return deco
+
+
+def get(name: str):
+    """Return the model registered under <name>, loading it on first use."""
+    if name in _instances:
+        return _instances[name]
+    with _lock:
+        if name not in _instances:
+            backend, _, arg = name.partition(":")
+            if backend not in _loaders:
+                raise KeyError(f"No model loader registered for {backend!r}")
+            t0 = time.perf_counter()
+            _instances[name] = _loaders[backend](arg) if arg else _loaders[backend]()
+            _load_seconds[name] = round(time.perf_counter() - t0, 3)
+            logging.info(f"Loaded {name} in {_load_seconds[name]} s")
+    return _instances[name]
+
+
+def loaded() -> dict:
+    """{name: load seconds} for every model loaded in this process."""
+    return dict(_load_seconds)
+
+
+# ---------- loaders ----------
+@register("openai")
+def _openai():
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+def _pyannote_pipeline():
+    from pyannote.audio import Pipeline
+    return Pipeline.from_pretrained(
+        DIAR_PIPELINE,
+        use_auth_token=os.getenv("HF_TOKEN")  # hugging-face token once
+    )
+
+
+@register("diarization")
+def _diarization():
+    pipeline = _pyannote_pipeline()
+    if DIAR_BACKEND == "onnx":
+        import onnx_diarization
+        onnx_diarization.configure(pipeline, **onnx_diarization.ONNX_PARAMS)
+    return pipeline
+
+
+@register("diarization-fast")
+def _diarization_fast():
+    # a separate instance: fast-mode settings must not leak into the full pipeline
+    import fast_diarization
+    return fast_diarization.configure(_diarization(), **fast_diarization.FAST_PARAMS)
+
+
+@register("diarization-enrolled")
+def _diarization_enrolled():
+    # own instance: two-class assignment against an enrolled agent (voice_bank.py)
+    import voice_bank
+    return voice_bank.configure_enrolled(_diarization())
+
+
+@register("speaker-embedding")
+def _speaker_embedding():
+    from pyannote.audio.pipelines.speaker_verification import PretrainedSpeakerEmbedding
+    embedding = PretrainedSpeakerEmbedding(SPEAKER_EMBEDDING, use_auth_token=os.getenv("HF_TOKEN"))
+    if DIAR_BACKEND == "onnx":
+        # same backend as the pipeline, so bank vectors compare with its embeddings
+        import onnx_diarization
+        p = onnx_diarization.ONNX_PARAMS
+        onnx_diarization.configure_embedding(embedding, onnx_diarization.model_name(SPEAKER_EMBEDDING),
+                                             p["quantize"], p["threads"])
+    return embedding
+
+
+@register("whisper")
+def _whisper(size: str = "base"):
+    import whisper
+    return whisper.load_model(size)
+
+
+@register("faster-whisper")
+def _faster_whisper(size: str = "small"):
+    from local_whisper import LocalWhisper
+    return LocalWhisper(
+        size,
+        compute_type=os.getenv("LOCAL_WHISPER_COMPUTE", "int8"),
+        cpu_threads=int(os.getenv("LOCAL_WHISPER_THREADS", "0")),   # 0 = all cores
+        batch_size=int(os.getenv("LOCAL_WHISPER_BATCH", "8")),
+    )
+
+
+# ---------- startup profiling ----------
+# what each backend needs imported before it can load
+BACKEND_IMPORTS = {
+    "openai": ["openai"],
+    "diarization": ["torch", "torchaudio", "pyannote.audio"]
+                   + (["onnxruntime"] if DIAR_BACKEND == "onnx" else []),
+    "whisper:base": ["torch", "whisper"],
+    "faster-whisper:small": ["ctranslate2", "faster_whisper"],
+}
+
+
+def _measure(name: str) -> dict:
+    import importlib
+    timings = {}
+    for mod in BACKEND_IMPORTS.get(name, []):
+        t0 = time.perf_counter()
+        importlib.import_module(mod)
+        timings[f"import {mod}"] = round(time.perf_counter() - t0, 3)
+    t0 = time.perf_counter()
+    get(name)
+    timings["load"] = round(time.perf_counter() - t0, 3)
+    return timings
+
+
+def profile_startup(names=None) -> dict:
+    """Import + load cost per backend, each measured in a fresh interpreter."""
+    report = {}
+    for name in names or BACKEND_IMPORTS:
+        t0 = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, __file__, "--_measure", name],
+            capture_output=True, text=True,
+        )
+        wall = round(time.perf_counter() - t0, 3)
+        if proc.returncode != 0:
+            report[name] = {"error": proc.stderr.strip().splitlines()[-1:], "wall": wall}
+        else:
+            report[name] = {**json.loads(proc.stdout.strip().splitlines()[-1]), "wall": wall}
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Model registry utilities.")
+    ap.add_argument("--profile-startup", nargs="*", metavar="BACKEND",
+                    help="time imports and model load per backend (default: all)")
+    ap.add_argument("--_measure", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args._measure:
+        print(json.dumps(_measure(args._measure)))
+    elif args.profile_startup is not None:
+        print(json.dumps(profile_startup(args.profile_startup), indent=2))
+    else:
+        ap.print_help()
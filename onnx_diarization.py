@@ -0,0 +1,192 @@
+"""
+onnx_diarization.py  –  ONNX Runtime backend for the pyannote 3.1 pipeline.
+
+Our hosts have no GPU, and most of a diarization run is the two networks
+inside the pipeline running eagerly in PyTorch on CPU:
+
+    * segmentation  – PyanNet (SincNet + LSTM) over sliding 10 s windows
+    * embedding     – WeSpeaker ResNet34 over every (window, local speaker)
+
+DIAR_BACKEND=onnx exports both once to ONNX (under DIAR_ONNX_DIR), quantizes
+the weights to int8 (DIAR_ONNX_QUANTIZE=int8, the default; "off" keeps fp32),
+and swaps each network's forward for an ONNX Runtime session with
+DIAR_ONNX_THREADS intra-op threads (0, the default: the cores divided by the
+DIAR_WORKERS diarization processes batch.py runs).  Everything else – windowing, batching,
+powerset decoding, fbank features, clustering, the Annotation it returns – is
+still pyannote's, so every diarization mode (full, fast, enrolled) runs on
+either backend unchanged.
+
+    python benchmark.py diarize-onnx call1.wav      # RTF and DER vs PyTorch
+"""
+import logging
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+ONNX_DIR = os.getenv("DIAR_ONNX_DIR", ".cache/onnx")
+ONNX_OPSET = 17
+ONNX_PARAMS = {
+    "quantize": os.getenv("DIAR_ONNX_QUANTIZE", "int8").lower(),    # "int8" or "off"
+    "threads": int(os.getenv("DIAR_ONNX_THREADS", "0")),       # 0: fast_diarization.default_threads()
+    "segmentation_batch_size": int(os.getenv("DIAR_ONNX_SEG_BATCH", "32")),
+    "embedding_batch_size": int(os.getenv("DIAR_ONNX_EMBED_BATCH", "32")),
+}
+
+
+def cache_params() -> dict:
+    """What distinguishes this backend's output in diarization cache keys."""
+    return {"backend": "onnx", "quantize": ONNX_PARAMS["quantize"]}
+
+
+def model_name(name) -> str:
+    """File-name-safe form of a model id ("pyannote/segmentation-3.0")."""
+    return re.sub(r"[^\w.-]+", "_", str(name)).strip("_") or "model"
+
+
+# ---------- export ----------
+def export_segmentation(model, path: str):
+    """PyanNet: waveforms (batch, 1, samples) -> per-frame (powerset) scores."""
+    import torch
+
+    model.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            model, (model.example_input_array,), path, opset_version=ONNX_OPSET,
+            input_names=["waveforms"], output_names=["scores"],
+            dynamic_axes={"waveforms": {0: "batch", 2: "samples"},
+                          "scores": {0: "batch", 1: "frames"}},
+            dynamo=False,
+        )
+
+
+def export_embedding(model, path: str):
+    """
+    WeSpeaker ResNet: fbank (batch, frames, bins) and frame weights -> embeddings.
+    The fbank front end stays in torch (kaldi fbank does not export).
+    """
+    import torch
+
+    class Head(torch.nn.Module):
+        def __init__(self, resnet):
+            super().__init__()
+            self.resnet = resnet
+
+        def forward(self, fbank, weights):
+            out = self.resnet(fbank, weights=weights)
+            return out[-1] if isinstance(out, tuple) else out
+
+    model.eval()
+    with torch.no_grad():
+        fbank = model.compute_fbank(torch.randn(2, 1, 3 * 16_000))
+        weights = torch.ones(fbank.shape[:2])
+        torch.onnx.export(
+            Head(model.resnet).eval(), (fbank, weights), path, opset_version=ONNX_OPSET,
+            input_names=["fbank", "weights"], output_names=["embeddings"],
+            dynamic_axes={"fbank": {0: "batch", 1: "frames"}, "weights": {0: "batch", 1: "mask_frames"},
+                          "embeddings": {0: "batch"}},
+            dynamo=False,
+        )
+
+
+def model_file(name: str, model, export, quantize: str) -> str:
+    """
+    Path of <name>'s ONNX file, exporting (and quantizing) on first use.
+    Files are written under a temporary name and renamed, so concurrent
+    workers never load a half-written model.
+    """
+    out_dir = Path(ONNX_DIR)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    fp32 = out_dir / f"{name}.onnx"
+    if not fp32.exists():
+        logging.info(f"Exporting {name} to ONNX")
+        tmp = out_dir / f"{name}.{os.getpid()}.tmp.onnx"
+        export(model, str(tmp))
+        os.replace(tmp, fp32)
+    if quantize != "int8":
+        return str(fp32)
+    int8 = out_dir / f"{name}.int8.onnx"
+    if not int8.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logging.info(f"Quantizing {name} to int8")
+        tmp = out_dir / f"{name}.int8.{os.getpid()}.tmp.onnx"
+        # dynamic quantization: int8 weights, activations quantized per batch at run time,
+        # so no calibration set is needed
+        quantize_dynamic(str(fp32), str(tmp), weight_type=QuantType.QInt8)
+        os.replace(tmp, int8)
+    return str(int8)
+
+
+def session(path: str, threads: int):
+    import onnxruntime as ort
+
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = threads
+    opts.inter_op_num_threads = 1
+    opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+
+
+# ---------- patching ----------
+def configure_segmentation(inference, name: str, quantize: str, threads: int, batch_size: int):
+    """Run a pyannote Inference's model through ONNX Runtime, in place."""
+    import torch
+
+    model = inference.model
+    sess = session(model_file(name, model, export_segmentation, quantize), threads)
+
+    def forward(waveforms, *_, **__):
+        scores = sess.run(None, {"waveforms": waveforms.cpu().numpy().astype(np.float32)})[0]
+        return torch.from_numpy(scores)
+
+    model.forward = forward
+    inference.batch_size = batch_size
+    return inference
+
+
+def configure_embedding(embedding, name: str, quantize: str, threads: int):
+    """
+    Run a PyannoteAudioPretrainedSpeakerEmbedding (the pipeline's, or the voice
+    bank's "speaker-embedding") through ONNX Runtime, in place.
+    """
+    import torch
+    from fast_diarization import default_threads
+
+    threads = threads or default_threads()
+    model = embedding.model_
+    sess = session(model_file(name, model, export_embedding, quantize), threads)
+
+    def forward(waveforms, weights=None):
+        with torch.inference_mode():
+            fbank = model.compute_fbank(waveforms.cpu())
+        if weights is None:
+            weights = torch.ones(fbank.shape[:2])
+        out = sess.run(None, {"fbank": fbank.numpy().astype(np.float32),
+                              "weights": weights.cpu().numpy().astype(np.float32)})[0]
+        return torch.from_numpy(out)
+
+    model.forward = forward
+    return embedding
+
+
+def configure(pipeline, quantize: str, threads: int, segmentation_batch_size: int,
+              embedding_batch_size: int, **_):
+    """Move a loaded SpeakerDiarization pipeline's networks to ONNX Runtime, in place."""
+    from fast_diarization import default_threads, scope_threads
+
+    threads = threads or default_threads()
+    # fbank, powerset decoding and aggregation still run in torch; the two runtimes
+    # take turns, so they share the same cores rather than splitting them
+    scope_threads(pipeline, threads)
+    suffix = "" if quantize != "int8" else " (int8)"
+    logging.info(f"Diarization on ONNX Runtime{suffix}, {threads} threads")
+    configure_segmentation(pipeline._segmentation,
+                           model_name(getattr(pipeline, "segmentation_model", "segmentation")),
+                           quantize, threads, segmentation_batch_size)
+    configure_embedding(pipeline._embedding, model_name(getattr(pipeline, "embedding", "embedding")),
+                        quantize, threads)
+    pipeline.embedding_batch_size = embedding_batch_size
+    return pipeline
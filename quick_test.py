@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
-import io, os, time, requests, logging
+import io, os, time, logging
 from concurrent.futures import ThreadPoolExecutor
-from pydub import AudioSegment
 from dotenv import load_dotenv
-from openai import OpenAI
+import api_client
+from audio import CallAudio
+from translate import translate_segments
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 URL = "https://ai-elroi-bucket.s3.ap-south-1.amazonaws.com/call_audio/call__audio_bajaj_2_trimmed.wav"
 
@@ -15,34 +15,37 @@ def ts(msg):
 
 def fetch_convert():
     ts("⬇️  Downloading …")
-    resp = requests.get(URL, timeout=30)
-    resp.raise_for_status()
-    raw = io.BytesIO(resp.content)
-    ts("⚙️  Converting to 16 kHz mono WAV …")
-    audio = AudioSegment.from_file(raw).set_channels(1).set_frame_rate(16000)
-    wav = io.BytesIO()
-    audio.export(wav, format="wav")
-    wav.seek(0)
-    ts("✅ Conversion done")
-    return wav
+    raw = io.BytesIO(api_client.download(URL))
+    ts("⚙️  Converting to 16 kHz mono …")
+    upload = CallAudio.from_bytes(raw).upload_file()   # FLAC/Opus per WHISPER_UPLOAD_CODEC
+    ts(f"✅ Conversion done ({upload[0]}, {len(upload[1])/1e6:.1f} MB)")
+    return upload
 
-def whisper(wav: io.BytesIO, *, translate: bool) -> str:
+def whisper(upload: tuple, *, translate: bool) -> str:
     task = "translation" if translate else "transcription"
     ts(f"🚀 Whisper {task} start …")
-    wav.seek(0)
-    kwargs = dict(model="whisper-1", file=("audio.wav", wav.read()), response_format="text")
+    kwargs = dict(model="whisper-1", file=upload, response_format="text")
     if translate:
         kwargs["prompt"] = "Translate this Tamil audio to English."
-    text = client.audio.transcriptions.create(**kwargs)
+    text = api_client.transcribe(**kwargs)
     ts(f"✔️ Whisper {task} finished")
     return text
 
 def main():
-    wav = fetch_convert()
-    with ThreadPoolExecutor(max_workers=2) as pool:
-        fut_tamil = pool.submit(whisper, wav, translate=False)
-        fut_eng   = pool.submit(whisper, wav, translate=True)
-    tamil, eng = fut_tamil.result(), fut_eng.result()
+    upload = fetch_convert()
+    if os.getenv("TRANSLATE_MODE", "text") == "audio":
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            fut_tamil = pool.submit(whisper, upload, translate=False)
+            fut_eng   = pool.submit(whisper, upload, translate=True)
+        tamil, eng = fut_tamil.result(), fut_eng.result()
+    else:
+        ts("🚀 Whisper transcription start …")
+        result = api_client.transcribe(
+            model="whisper-1", file=upload, response_format="verbose_json", language="ta")
+        ts("🌍 Translating segments …")
+        rows = translate_segments(result.segments)
+        tamil = result.text
+        eng = "\n".join(f"{r['start']:>6.1f}s  {r['translation']}" for r in rows)
     ts("===== RESULTS =====")
     print("\n📞 Tamil:\n", tamil)
     print("\n🌍 English:\n", eng)
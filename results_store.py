@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+results_store.py  –  local SQLite store for call results and staff trends.
+
+    store = ResultsStore("results.db")
+    store.add_many(results)                 # one transaction per batch
+    store.trend("agent_17", window_days=30) # rolling per-agent scores, from daily rows
+
+Tables
+    calls        one row per call: staff_score, breakdown, duration, word count;
+                 indexed by call_id (primary key), (staff, call_date) and call_date
+    segments     one row per conversation segment, keyed (call_id, idx)
+    agent_daily  per (staff, day) sums kept up to date on every write, so trend
+                 and leaderboard queries read a few rows per agent instead of
+                 scanning calls
+
+A result may carry "staff_id" and "call_date" (YYYY-MM-DD); otherwise staff is
+"unknown" and the date is the day it was stored.  Calls without a staff_score
+(skipped by the scoring cascade) are stored but left out of agent_daily.  Calls
+the cascade's local tier scored have a staff_score but no breakdown, so the
+per-dimension averages divide by breakdown_calls rather than calls.  Writing a call_id again
+replaces the call and moves its contribution in agent_daily accordingly.
+
+    python results_store.py import results.jsonl --db results.db
+    python results_store.py trend agent_17 --window 30 --db results.db
+    python results_store.py agents --since 2025-10-01 --db results.db
+"""
+import json
+import sqlite3
+import threading
+from datetime import date, datetime
+from pathlib import Path
+
+from assessment import SCORE_KEYS
+
+DEFAULT_DB = "results.db"
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS calls (
+    call_id          TEXT PRIMARY KEY,
+    staff            TEXT NOT NULL,
+    call_date        TEXT NOT NULL,
+    analysed_at      TEXT NOT NULL,
+    staff_label      TEXT,
+    staff_score      REAL,
+    {", ".join(f"{k} REAL" for k in SCORE_KEYS)},
+    route            TEXT,
+    breakdown        TEXT,
+    summary          TEXT,
+    duration_sec     REAL,
+    agent_word_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS calls_staff_date ON calls (staff, call_date);
+CREATE INDEX IF NOT EXISTS calls_date ON calls (call_date);
+
+CREATE TABLE IF NOT EXISTS segments (
+    call_id  TEXT NOT NULL,
+    idx      INTEGER NOT NULL,
+    speaker  TEXT,
+    is_staff INTEGER,
+    start    REAL,
+    "end"    REAL,
+    text     TEXT,
+    PRIMARY KEY (call_id, idx)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS agent_daily (
+    staff          TEXT NOT NULL,
+    day            TEXT NOT NULL,
+    calls          INTEGER NOT NULL,
+    breakdown_calls INTEGER NOT NULL DEFAULT 0,
+    score_sum      REAL NOT NULL,
+    score_sq_sum   REAL NOT NULL,
+    {", ".join(f"{k}_sum REAL NOT NULL" for k in SCORE_KEYS)},
+    duration_sum   REAL NOT NULL,
+    words_sum      INTEGER NOT NULL,
+    PRIMARY KEY (staff, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS agent_daily_day ON agent_daily (day);
+"""
+
+_AGG_COLS = ["calls", "breakdown_calls", "score_sum", "score_sq_sum", *(f"{k}_sum" for k in SCORE_KEYS),
+             "duration_sum", "words_sum"]
+
+
+class ResultsStore:
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        self._migrate()
+        self._lock = threading.Lock()
+
+    def _migrate(self):
+        cols = {r["name"] for r in self.db.execute("PRAGMA table_info(agent_daily)")}
+        if "breakdown_calls" not in cols:
+            # stores from before the local tier: every scored call had a breakdown
+            with self.db:
+                self.db.execute("ALTER TABLE agent_daily "
+                                "ADD COLUMN breakdown_calls INTEGER NOT NULL DEFAULT 0")
+                self.db.execute("UPDATE agent_daily SET breakdown_calls = calls")
+
+    def close(self):
+        self.db.close()
+
+    # ---------- writes ----------
+    def add_many(self, results) -> int:
+        """Store call results (and their "segments", if present) in one transaction."""
+        rows, segs = {}, {}
+        now = datetime.now().isoformat(timespec="seconds")
+        for r in results:
+            if "error" in r:
+                continue
+            breakdown = r.get("breakdown") or {}
+            row = {
+                "call_id": r["call_id"],
+                "staff": r.get("staff_id") or "unknown",
+                "call_date": r.get("call_date") or date.today().isoformat(),
+                "analysed_at": now,
+                "staff_label": r.get("staff_label"),
+                "staff_score": r.get("staff_score"),
+                **{k: breakdown.get(k) for k in SCORE_KEYS},
+                "route": (r.get("route") or {}).get("tier"),
+                "breakdown": json.dumps(breakdown, ensure_ascii=False),
+                "summary": r.get("summary"),
+                "duration_sec": r.get("duration_sec"),
+                "agent_word_count": r.get("agent_word_count"),
+            }
+            # the same call twice in one batch: the last one wins, like sequential writes
+            rows[r["call_id"]] = row
+            segs[r["call_id"]] = [
+                (r["call_id"], i, s["speaker"], int(s["speaker"] == r.get("staff_label")),
+                 s["start"], s["end"], s["text"])
+                for i, s in enumerate(r.get("segments") or [])
+            ]
+        if not rows:
+            return 0
+
+        ids = list(rows)
+        rows = list(rows.values())
+        segs = [seg for call_segs in segs.values() for seg in call_segs]
+        cols = list(rows[0])
+        with self._lock, self.db:
+            # calls being re-analysed: take their old contribution out of agent_daily first
+            old = []
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                old += self.db.execute(
+                    f"SELECT * FROM calls WHERE call_id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+            self._aggregate([dict(o) for o in old], sign=-1)
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO calls ({','.join(cols)}) "
+                f"VALUES ({','.join(':' + c for c in cols)})", rows)
+            self.db.executemany("DELETE FROM segments WHERE call_id = ?", [(i,) for i in ids])
+            self.db.executemany("INSERT INTO segments VALUES (?, ?, ?, ?, ?, ?, ?)", segs)
+            self._aggregate(rows, sign=1)
+        return len(rows)
+
+    def _aggregate(self, rows: list, sign: int):
+        """Fold <rows> into agent_daily (sign=-1 removes them)."""
+        daily = {}
+        for r in rows:
+            if r["staff_score"] is None:    # skipped by the scoring cascade
+                continue
+            acc = daily.setdefault((r["staff"], r["call_date"]), dict.fromkeys(_AGG_COLS, 0))
+            score = r["staff_score"]
+            acc["calls"] += 1
+            acc["breakdown_calls"] += any(r[k] is not None for k in SCORE_KEYS)
+            acc["score_sum"] += score
+            acc["score_sq_sum"] += score * score
+            for k in SCORE_KEYS:
+                acc[f"{k}_sum"] += r[k] or 0
+            acc["duration_sum"] += r["duration_sec"] or 0
+            acc["words_sum"] += r["agent_word_count"] or 0
+        if not daily:
+            return
+        self.db.executemany(
+            f"INSERT INTO agent_daily (staff, day, {', '.join(_AGG_COLS)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(_AGG_COLS))}) "
+            f"ON CONFLICT (staff, day) DO UPDATE SET "
+            + ", ".join(f"{c} = {c} + excluded.{c}" for c in _AGG_COLS),
+            [(staff, day, *(sign * acc[c] for c in _AGG_COLS)) for (staff, day), acc in daily.items()],
+        )
+        if sign < 0:
+            self.db.execute("DELETE FROM agent_daily WHERE calls <= 0")
+
+    # ---------- reads ----------
+    def call(self, call_id: str) -> dict:
+        row = self.db.execute("SELECT * FROM calls WHERE call_id = ?", (call_id,)).fetchone()
+        if row is None:
+            return None
+        out = dict(row)
+        out["breakdown"] = json.loads(out["breakdown"] or "{}")
+        out["segments"] = [dict(s) for s in self.db.execute(
+            "SELECT speaker, is_staff, start, \"end\", text FROM segments WHERE call_id = ? ORDER BY idx",
+            (call_id,))]
+        return out
+
+    def trend(self, staff: str, window_days: int = 30, since: str = None, until: str = None) -> list:
+        """
+        Per-day rows for <staff> with the day's average and the rolling
+        <window_days>-day average score, breakdown and call count.
+        """
+        since = since or "0000-00-00"
+        until = until or "9999-99-99"
+        rolling = ", ".join(
+            f"ROUND(SUM({k}_sum) OVER w / NULLIF(SUM(breakdown_calls) OVER w, 0), 2) AS {k}_rolling"
+            for k in SCORE_KEYS)
+        rows = self.db.execute(
+            f"""
+            SELECT * FROM (
+                SELECT day, calls,
+                       ROUND(score_sum / calls, 2) AS avg_score,
+                       SUM(calls) OVER w AS calls_rolling,
+                       ROUND(SUM(score_sum) OVER w / SUM(calls) OVER w, 2) AS avg_score_rolling,
+                       {rolling},
+                       ROUND(SUM(duration_sum) OVER w / SUM(calls) OVER w, 1) AS avg_duration_rolling
+                FROM agent_daily WHERE staff = ? AND day <= ?
+                WINDOW w AS (ORDER BY julianday(day) RANGE BETWEEN ? PRECEDING AND CURRENT ROW)
+            ) WHERE day >= ? ORDER BY day
+            """,
+            (staff, until, window_days - 1, since),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def agents(self, since: str = None, until: str = None) -> list:
+        """Per-agent totals over a date range, best average first."""
+        rows = self.db.execute(
+            """
+            SELECT staff, SUM(calls) AS calls,
+                   ROUND(SUM(score_sum) / SUM(calls), 2) AS avg_score,
+                   ROUND(SQRT(MAX(SUM(score_sq_sum) / SUM(calls)
+                                  - (SUM(score_sum) / SUM(calls)) * (SUM(score_sum) / SUM(calls)), 0)), 2)
+                       AS score_stddev,
+                   ROUND(SUM(duration_sum) / SUM(calls), 1) AS avg_duration_sec,
+                   MIN(day) AS first_day, MAX(day) AS last_day
+            FROM agent_daily WHERE day BETWEEN ? AND ?
+            GROUP BY staff ORDER BY avg_score DESC
+            """,
+            (since or "0000-00-00", until or "9999-99-99"),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Call results store.")
+    ap.add_argument("--db", default=DEFAULT_DB)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("import", help="bulk-load JSON-lines results")
+    p.add_argument("files", nargs="+")
+    p = sub.add_parser("trend", help="rolling scores for one agent")
+    p.add_argument("staff")
+    p.add_argument("--window", type=int, default=30, help="rolling window in days")
+    p.add_argument("--since")
+    p.add_argument("--until")
+    p = sub.add_parser("agents", help="per-agent totals, best first")
+    p.add_argument("--since")
+    p.add_argument("--until")
+    args = ap.parse_args()
+
+    store = ResultsStore(args.db)
+    if args.cmd == "import":
+        n, batch = 0, []
+        for path in args.files:
+            with open(path, encoding="utf-8") as f:
+                for line in filter(str.strip, f):
+                    batch.append(json.loads(line))
+                    if len(batch) == 5000:
+                        n, batch = n + store.add_many(batch), []
+        n += store.add_many(batch)
+        print(f"Stored {n} calls in {Path(args.db).resolve()}")
+    elif args.cmd == "trend":
+        print(json.dumps(store.trend(args.staff, args.window, args.since, args.until), indent=2))
+    else:
+        print(json.dumps(store.agents(args.since, args.until), indent=2))
+    store.close()
@@ -0,0 +1,58 @@
+"""
+stage_graph.py  –  tiny dependency-graph executor.
+
+A graph is a dict  name -> (fn, [dependency names]).  Each stage is started as
+soon as all of its dependencies have finished, and receives their results as
+positional arguments in the order listed.  Independent stages run in parallel
+threads, so e.g. Whisper (network) and pyannote (CPU) overlap.
+"""
+import contextvars
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def run_graph(stages: dict, done: dict = None, max_workers: int = None) -> dict:
+    """
+    Execute <stages> and return {name: result} for every stage.
+    <done> holds results that are already known (those stages are skipped).
+    The first stage that raises is re-raised at once: stages waiting on
+    dependencies are never started, and ones already running (threads cannot
+    be interrupted) finish in the background with their results discarded.
+    """
+    results = dict(done or {})
+    pending = {name: spec for name, spec in stages.items() if name not in results}
+    for name, (_, deps) in pending.items():
+        missing = [d for d in deps if d not in stages and d not in results]
+        if missing:
+            raise ValueError(f"Stage {name!r} depends on unknown stage(s) {missing}")
+
+    running = {}
+    pool = ThreadPoolExecutor(max_workers=max_workers or max(len(pending), 1))
+    try:
+        while pending or running:
+            for name in [n for n, (_, deps) in pending.items() if all(d in results for d in deps)]:
+                fn, deps = pending.pop(name)
+                # each stage runs in a copy of the caller's context (e.g. its call trace)
+                ctx = contextvars.copy_context()
+                running[pool.submit(ctx.run, _timed, name, fn, [results[d] for d in deps])] = name
+            if not running:
+                raise ValueError(f"Dependency cycle between stages {sorted(pending)}")
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                name = running.pop(fut)
+                results[name] = fut.result()
+    except BaseException:
+        # don't block on stages still running; drop any not yet picked up by a thread
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return results
+
+
+def _timed(name: str, fn, args: list):
+    t0 = time.time()
+    out = fn(*args)
+    logging.info(f"Stage {name} done in {round(time.time()-t0,1)} s")
+    return out
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+streaming.py  –  incremental analysis of a call while it is still going on.
+
+Audio arrives as raw 16-bit PCM, either from a file that is still being
+written (WAV or headerless .pcm) or from a local socket:
+
+    python streaming.py --file live_call.wav
+    python streaming.py --socket /tmp/call.sock          # or --socket 127.0.0.1:9000
+
+Every WINDOW_SEC of new audio is cut at a pause, transcribed and diarized on
+its own (diarization sees CONTEXT_SEC of already-committed audio as well, so
+its local speaker labels can be mapped onto the call's global ones), and the
+aligned words extend the build_segments() output.  Staff keyword flags are
+reported as soon as their word is committed, and a provisional score is
+refreshed in the background every SCORE_EVERY_SEC of audio.  When the stream
+ends only the last partial window and the final score remain.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+from analyse_staff import (align_word_table, build_segments,
+                           diarize, scoring_stages, segments_view, whisper_json)
+from audio import AUDIO_SAMPLE_RATE, CallAudio, distinct_channels, plan_chunks
+from keywords import KEYWORDS
+from stage_graph import run_graph
+from word_table import WordTable
+
+WINDOW_SEC = float(os.getenv("STREAM_WINDOW_SEC", "30"))
+CONTEXT_SEC = float(os.getenv("STREAM_CONTEXT_SEC", "15"))
+SCORE_EVERY_SEC = float(os.getenv("STREAM_SCORE_EVERY_SEC", "60"))
+MAX_SPEAKERS = int(os.getenv("STREAM_MAX_SPEAKERS", "2"))    # agent + customer
+MIN_FINAL_SEC = 0.5
+
+
+class StreamingAnalyzer:
+    """
+    feed() raw PCM as it arrives; windows are processed on a worker thread and
+    <on_update> receives a dict per committed window:
+        {"call_id", "audio_sec", "committed_sec", "new_segments", "open_segment",
+         "flags", "provisional", "final"}
+    finish() flushes the last window and returns the call_result() dict.
+    """
+
+    def __init__(self, call_id: str, sample_rate: int = AUDIO_SAMPLE_RATE, channels: int = 1,
+                 on_update=None, window_sec: float = WINDOW_SEC,
+                 context_sec: float = CONTEXT_SEC, score_every_sec: float = SCORE_EVERY_SEC,
+                 max_speakers: int = MAX_SPEAKERS):
+        self.call_id = call_id
+        self.sample_rate = sample_rate
+        self.n_channels = channels
+        self.on_update = on_update or (lambda update: None)
+        self.window = int(window_sec * sample_rate)
+        self.context = int(context_sec * sample_rate)
+        self.score_every = int(score_every_sec * sample_rate)
+        self.max_speakers = max_speakers
+
+        self._buf = np.zeros((channels, 1 << 20), dtype=np.int16)
+        self._n = 0                     # samples received
+        self._pending = b""             # partial frame left over from the last feed()
+        self._committed = 0             # samples already transcribed and diarized
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.words = WordTable.from_columns([], [], [], [], [])     # aligned words, absolute times
+        self.turns = []                 # (start, end, global label)
+        self._labels = 0
+        self._frozen = []               # segments whose speaker run has ended
+        self._frozen_upto = 0           # index into self.words of the open run
+        self.flags = []
+        self.provisional = None
+        self._scored_at = 0
+        self._scorer = ThreadPoolExecutor(max_workers=1)
+        self._scoring = None
+        self._error = None
+        self._worker = threading.Thread(target=self._run, name=f"stream-{call_id}", daemon=True)
+        self._worker.start()
+
+    # ---------- input ----------
+    def feed(self, data: bytes):
+        """Append interleaved s16le frames (any length; partial frames are kept)."""
+        frame_bytes = 2 * self.n_channels
+        data = self._pending + data
+        usable = len(data) - len(data) % frame_bytes
+        self._pending = data[usable:]
+        if not usable:
+            return
+        frames = np.frombuffer(data[:usable], dtype=np.int16).reshape(-1, self.n_channels).T
+        with self._cond:
+            need = self._n + frames.shape[1]
+            if need > self._buf.shape[1]:
+                grown = np.zeros((self.n_channels, max(need, 2 * self._buf.shape[1])), dtype=np.int16)
+                grown[:, :self._n] = self._buf[:, :self._n]
+                self._buf = grown
+            self._buf[:, self._n:need] = frames
+            self._n = need
+            self._cond.notify()
+
+    def finish(self) -> dict:
+        """End of stream: process what is left and return the final result."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._worker.join()
+        if self._error:
+            raise self._error
+        if self._scoring:
+            self._scoring.cancel()
+        self._scorer.shutdown(wait=False)
+        view = segments_view(self.words.segments(min_sec=1.0))
+        # no voice stage: windows are diarized separately, so there is no call-wide diar to embed
+        result = run_graph(scoring_stages(self.call_id, voices=False), done={"view": view})["result"]
+        self.on_update(self._update([], final=True, result=result))
+        return result
+
+    # ---------- state ----------
+    @property
+    def segments(self) -> list[dict]:
+        """build_segments() over every committed word so far."""
+        return self._frozen + build_segments(self.words[self._frozen_upto:], min_sec=1.0)
+
+    def audio(self, start: int, end: int) -> CallAudio:
+        # views: samples below self._n are never written again
+        chans = self._buf[:, start:end]
+        if self.n_channels == 1:
+            return CallAudio(chans[0], self.sample_rate)
+        mono = chans.mean(axis=0).astype(np.int16)
+        return CallAudio(mono, self.sample_rate, chans if distinct_channels(chans) else None)
+
+    # ---------- worker ----------
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._closed and self._n - self._committed < self.window:
+                        self._cond.wait()
+                    n, closed = self._n, self._closed
+                if n - self._committed >= self.window:
+                    self._process(self._cut(n))
+                elif closed:
+                    if n - self._committed >= MIN_FINAL_SEC * self.sample_rate:
+                        self._process(n)
+                    return
+        except Exception as e:
+            logging.exception(f"Streaming analysis of {self.call_id} failed")
+            self._error = e
+
+    def _cut(self, n: int) -> int:
+        """End of the next window: the quietest point in its last few seconds."""
+        mono = self.audio(self._committed, n).pcm
+        (_, end), *_ = plan_chunks(mono, self.sample_rate, self.window / self.sample_rate,
+                                   search_sec=5.0)
+        return self._committed + end
+
+    def _process(self, end: int):
+        start, sr = self._committed, self.sample_rate
+        ctx = max(0, start - self.context)
+        t0 = time.perf_counter()
+        transcript = whisper_json(self.audio(start, end), language="ta")
+        local = diarize(self.audio(ctx, end))
+        window_turns = self._global_turns(local, ctx / sr, start / sr, end / sr)
+
+        offset = start / sr
+        words = SimpleNamespace(words=[
+            SimpleNamespace(word=w.word, start=w.start + offset, end=w.end + offset)
+            for w in transcript.words
+        ])
+        new_words = align_word_table(words, _annotation(window_turns))
+        self.words = WordTable.concat([self.words, new_words])
+        self.turns.extend(window_turns)
+        self._committed = end
+
+        speakers = [new_words.labels[c] for c in new_words.speaker.tolist()]
+        new_flags = [
+            {"keyword": term, "speaker": speaker, "start": start}
+            for word, speaker, start in zip(new_words.words(), speakers, new_words.start.tolist())
+            for _, _, term, cats in KEYWORDS.find(word) if "company" in cats
+        ]
+        self.flags.extend(new_flags)
+        new_segments = self._extend_segments()
+        logging.info(f"Stream {self.call_id}: window {offset:.1f}-{end / sr:.1f} s "
+                     f"processed in {time.perf_counter() - t0:.1f} s")
+
+        if end - self._scored_at >= self.score_every and not self._closed:
+            self._score_provisional(end)
+        self.on_update(self._update(new_segments, new_flags))
+
+    def _global_turns(self, local, ctx_sec: float, start_sec: float, end_sec: float) -> list:
+        """
+        Window turns with local labels mapped onto the call's global labels by
+        overlap with already-committed turns in the context.
+        """
+        local_turns = [(seg.start + ctx_sec, seg.end + ctx_sec, label)
+                       for seg, _, label in local.itertracks(yield_label=True)]
+        overlap = {}
+        for s, e, label in local_turns:
+            for gs, ge, glabel in self.turns:
+                if ge <= ctx_sec or gs >= start_sec:
+                    continue
+                shared = min(e, ge, start_sec) - max(s, gs, ctx_sec)
+                if shared > 0:
+                    overlap[label, glabel] = overlap.get((label, glabel), 0.0) + shared
+        mapping = {}
+        for (label, glabel), _ in sorted(overlap.items(), key=lambda kv: -kv[1]):
+            if label not in mapping and glabel not in mapping.values():
+                mapping[label] = glabel
+        # a speaker silent during the context: reuse the most recently heard free
+        # label once the call already has max_speakers, otherwise open a new one
+        recent = [g for *_, g in sorted(self.turns, key=lambda t: -t[1])]
+        out = []
+        for s, e, label in local_turns:
+            if label not in mapping:
+                free = [g for g in dict.fromkeys(recent) if g not in mapping.values()]
+                if self._labels >= self.max_speakers and free:
+                    mapping[label] = free[0]
+                else:
+                    mapping[label] = f"SPEAKER_{self._labels:02d}"
+                    self._labels += 1
+            s, e = max(s, start_sec), min(e, end_sec)
+            if e > s:
+                out.append((s, e, mapping[label]))
+        return out
+
+    def _extend_segments(self) -> list[dict]:
+        """Freeze every speaker run that has ended; returns the newly frozen segments."""
+        open_words = self.words.speaker[self._frozen_upto:]
+        changes = np.flatnonzero(open_words != open_words[-1]) if len(open_words) else []
+        if not len(changes):
+            return []
+        run_start = self._frozen_upto + int(changes[-1]) + 1
+        # runs end where the speaker changes, so build_segments over complete runs
+        # gives exactly what it would give over the whole call
+        new = build_segments(self.words[self._frozen_upto:run_start], min_sec=1.0)
+        self._frozen.extend(new)
+        self._frozen_upto = run_start
+        return new
+
+    def _score_provisional(self, end: int):
+        if self._scoring and not self._scoring.done():
+            return                      # previous provisional score still running
+        segments = self.words.segments(min_sec=1.0)
+        if not len(segments):
+            return
+        self._scored_at = end
+        view = segments_view(segments)
+
+        def score():
+            result = run_graph(scoring_stages(self.call_id, voices=False), done={"view": view})["result"]
+            self.provisional = {**result, "as_of_sec": round(end / self.sample_rate, 1)}
+            return self.provisional
+
+        self._scoring = self._scorer.submit(score)
+
+    def _update(self, new_segments: list, flags: list = (), final: bool = False,
+                result: dict = None) -> dict:
+        open_run = build_segments(self.words[self._frozen_upto:], min_sec=1.0)
+        return {
+            "call_id": self.call_id,
+            "audio_sec": round(self._n / self.sample_rate, 1),
+            "committed_sec": round(self._committed / self.sample_rate, 1),
+            "new_segments": new_segments,
+            "open_segment": open_run[-1] if open_run else None,
+            "flags": list(flags),
+            "provisional": result if final else self.provisional,
+            "final": final,
+        }
+
+
+def _annotation(turns: list):
+    from pyannote.core import Annotation, Segment
+
+    diar = Annotation(uri="stream")
+    for i, (s, e, label) in enumerate(turns):
+        diar[Segment(s, e), i] = label
+    return diar
+
+
+# ---------- sources ----------
+def _wav_header(f) -> tuple:
+    """(data offset, sample_rate, channels) of a WAV that may still be growing."""
+    head = f.read(12)
+    if head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        raise ValueError("not a WAV file")
+    sample_rate = channels = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise ValueError("WAV header incomplete")
+        cid, size = chunk[:4], int.from_bytes(chunk[4:], "little")
+        if cid == b"data":
+            return f.tell(), sample_rate, channels
+        body = f.read(size + size % 2)
+        if cid == b"fmt ":
+            channels = int.from_bytes(body[2:4], "little")
+            sample_rate = int.from_bytes(body[4:8], "little")
+
+
+def file_frames(path: str, poll_sec: float = 0.5, idle_sec: float = 10.0,
+                block: int = 1 << 16):
+    """
+    Yield byte blocks appended to <path> until it stops growing for <idle_sec>.
+    The first item is (sample_rate, channels) from the WAV header, or None for
+    headerless PCM.
+    """
+    with open(path, "rb") as f:
+        fmt = None
+        if path.lower().endswith(".wav"):
+            offset, sr, ch = _wav_header(f)
+            f.seek(offset)
+            fmt = (sr, ch)
+        yield fmt
+        idle = 0.0
+        while idle < idle_sec:
+            data = f.read(block)
+            if data:
+                idle = 0.0
+                yield data
+            else:
+                time.sleep(poll_sec)
+                idle += poll_sec
+
+
+def socket_frames(address: str, block: int = 1 << 16):
+    """Accept one connection on a unix socket path or host:port and yield its bytes."""
+    if ":" in address:
+        host, port = address.rsplit(":", 1)
+        server = socket.create_server((host, int(port)))
+    else:
+        if os.path.exists(address):
+            os.unlink(address)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(address)
+        server.listen(1)
+    with server:
+        conn, _ = server.accept()
+        with conn:
+            while data := conn.recv(block):
+                yield data
+
+
+def analyse_stream(call_id: str, frames, sample_rate: int = AUDIO_SAMPLE_RATE,
+                   channels: int = 1, on_update=None) -> dict:
+    analyzer = StreamingAnalyzer(call_id, sample_rate, channels, on_update)
+    for data in frames:
+        analyzer.feed(data)
+    return analyzer.finish()
+
+
+if __name__ == "__main__":
+    import argparse
+    from pathlib import Path
+
+    ap = argparse.ArgumentParser(description="Analyse a call while it is being recorded.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--file", help="growing WAV or raw s16le .pcm file")
+    src.add_argument("--socket", help="unix socket path or host:port to receive raw s16le PCM")
+    ap.add_argument("--channels", type=int, default=1, help="channels of raw PCM input")
+    ap.add_argument("--call-id", help="defaults to the file name / 'live'")
+    args = ap.parse_args()
+
+    def show(update):
+        print(json.dumps(update, ensure_ascii=False), flush=True)
+
+    channels = args.channels
+    if args.file:
+        frames = file_frames(args.file)
+        fmt = next(frames)
+        if fmt:
+            if fmt[0] != AUDIO_SAMPLE_RATE:
+                raise SystemExit(f"expected {AUDIO_SAMPLE_RATE} Hz audio, got {fmt[0]} Hz")
+            channels = fmt[1]
+        call_id = args.call_id or Path(args.file).stem
+    else:
+        frames = socket_frames(args.socket)
+        call_id = args.call_id or "live"
+    analyse_stream(call_id, frames, AUDIO_SAMPLE_RATE, channels, show)
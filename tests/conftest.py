@@ -0,0 +1,10 @@
+import logging
+import sys
+from pathlib import Path
+
+# the modules live flat at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# analyse_staff sends logging to the tracked logs/staff_score.log on import
+# (logging.basicConfig); a root handler installed first turns that into a no-op
+logging.getLogger().addHandler(logging.NullHandler())
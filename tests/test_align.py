@@ -0,0 +1,55 @@
+import numpy as np
+
+from analyse_staff import assign_speakers
+
+
+def _assign(mids, turns):
+    """turns: (start, end, code), sorted by start."""
+    starts, ends, codes = (np.array(col, dtype=float if i < 2 else np.int64)
+                           for i, col in enumerate(zip(*turns)))
+    return assign_speakers(np.array(mids, dtype=float), starts, ends, codes).tolist()
+
+
+def _reference(mid, turns):
+    covering = [code for s, e, code in turns if s <= mid < e]
+    if covering:
+        return min(covering)
+    # of turns that ended equally close, the later-started one
+    before = [(mid - e, code) for s, e, code in reversed(turns) if s <= mid]
+    after = [(s - mid, code) for s, e, code in turns if s > mid]
+    prev = min(before, key=lambda t: t[0]) if before else (np.inf, None)
+    nxt = min(after, key=lambda t: t[0]) if after else (np.inf, None)
+    return prev[1] if prev[0] <= nxt[0] else nxt[1]
+
+
+def test_midpoint_takes_the_covering_turn():
+    assert _assign([2, 6], [(0, 4, 0), (5, 9, 1)]) == [0, 1]
+
+
+def test_overlap_resolves_to_lowest_label():
+    turns = [(0, 6, 1), (2, 5, 0)]
+    assert _assign([1, 3, 5.5], turns) == [1, 0, 1]
+    # a short turn nested inside a long one
+    assert _assign([1.5, 5], [(0, 10, 1), (1, 2, 0)]) == [0, 1]
+
+
+def test_gap_takes_nearest_turn_and_ties_go_to_the_previous():
+    turns = [(0, 4, 0), (6, 10, 1)]
+    assert _assign([4.5, 5.0, 5.5], turns) == [0, 0, 1]
+    assert _assign([-1, 20], turns) == [0, 1]
+    # the previous turn is the one that ended last, not the one that started last
+    assert _assign([6.5], [(0, 6, 2), (1, 2, 0), (8, 10, 1)]) == [2]
+
+
+def test_no_turns():
+    empty = np.array([], dtype=float)
+    assert assign_speakers(np.array([1.0]), empty, empty, np.array([], dtype=np.int64)).tolist() == [-1]
+
+
+def test_matches_reference_on_random_turns():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        starts = np.sort(rng.uniform(0, 60, 12).round(1))
+        turns = [(s, round(s + rng.uniform(0.2, 8), 1), int(rng.integers(0, 4))) for s in starts]
+        mids = rng.uniform(-2, 70, 40).round(2)
+        assert _assign(mids, turns) == [_reference(m, turns) for m in mids]
@@ -0,0 +1,77 @@
+import asyncio
+
+import httpx
+import pytest
+
+import api_client
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    delays = []
+
+    async def sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(api_client.asyncio, "sleep", sleep)
+    c = api_client.ApiClient()
+    c.delays = delays
+    return c
+
+
+def _status_error(status, headers=None):
+    request = httpx.Request("GET", "https://example.test/call.wav")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"HTTP {status}", request=request, response=response)
+
+
+def _failing(errors, result="ok"):
+    calls = []
+
+    async def make_call():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    return make_call, calls
+
+
+def test_retry_after_is_honoured(client):
+    make_call, calls = _failing([_status_error(429, {"retry-after": "3"}), _status_error(503)])
+    assert asyncio.run(client._with_retry("chat", make_call)) == "ok"
+    assert len(calls) == 3
+    assert client.delays[0] == 3.0
+    # no Retry-After: jittered exponential backoff, capped
+    assert 0 <= client.delays[1] <= min(api_client.BACKOFF_CAP, api_client.BACKOFF_BASE * 2 ** 2)
+    assert client.retries["chat"] == 2
+
+
+def test_non_retryable_status_raises_at_once(client):
+    make_call, calls = _failing([_status_error(400)])
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(client._with_retry("chat", make_call))
+    assert len(calls) == 1 and client.delays == []
+
+
+def test_gives_up_after_max_attempts(client, monkeypatch):
+    monkeypatch.setattr(api_client, "MAX_ATTEMPTS", 3)
+    make_call, calls = _failing([httpx.ConnectError("refused")] * 5)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(client._with_retry("download", make_call))
+    assert len(calls) == 3 and len(client.delays) == 2
+    assert all(d <= api_client.BACKOFF_CAP for d in client.delays)
+
+
+def test_download_retries_a_503(client):
+    statuses = iter([503, 200])
+
+    def handler(request):
+        status = next(statuses)
+        return httpx.Response(status, content=b"RIFF" if status == 200 else b"",
+                              headers={"retry-after": "1"} if status == 503 else None)
+
+    client.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    assert asyncio.run(client.download("https://example.test/call.wav")) == b"RIFF"
+    assert client.delays == [1.0] and client.retries["download"] == 1
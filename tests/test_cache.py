@@ -0,0 +1,49 @@
+import os
+
+import cache
+from cache import ResultCache
+
+
+def _cache(tmp_path, max_bytes=10**6):
+    return ResultCache(str(tmp_path), max_bytes=max_bytes)
+
+
+def test_key_changes_with_content_params_and_version(tmp_path, monkeypatch):
+    c = _cache(tmp_path)
+    base = c.key("score", "abc", model="m1", temperature=0)
+    assert base == c.key("score", "abc", temperature=0, model="m1")
+    assert base.startswith("score-")
+    assert base != c.key("score", "abd", model="m1", temperature=0)
+    assert base != c.key("score", "abc", model="m2", temperature=0)
+    assert base != c.key("summary", "abc", model="m1", temperature=0)
+    monkeypatch.setattr(cache, "PIPELINE_VERSION", cache.PIPELINE_VERSION + "-next")
+    assert base != c.key("score", "abc", model="m1", temperature=0)
+
+
+def test_get_or_compute_computes_once(tmp_path):
+    c, calls = _cache(tmp_path), []
+    compute = lambda: calls.append(1) or {"x": 1}
+    assert c.get_or_compute("k", compute) == {"x": 1}
+    assert c.get_or_compute("k", compute) == {"x": 1}
+    assert len(calls) == 1
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    c = ResultCache(str(tmp_path), max_bytes=10**6, enabled=False)
+    c.put("k", 1)
+    assert c.get("k") == (False, None)
+    assert not list(tmp_path.iterdir())
+
+
+def test_eviction_drops_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "EVICT_EVERY", 1)
+    blob = b"x" * 1000
+    c = _cache(tmp_path, max_bytes=10**6)
+    for i, name in enumerate(["old", "used", "new"]):
+        c.put(name, blob)
+        os.utime(tmp_path / f"{name}.pkl", (1000 + i, 1000 + i))
+    assert c.get("used")[0]             # reading refreshes its mtime
+    c.max_bytes = 3500                  # room for three entries
+    c.put("newest", blob)
+    assert sorted(p.stem for p in tmp_path.glob("*.pkl")) == ["new", "newest", "used"]
+    assert not c.get("old")[0]
@@ -0,0 +1,34 @@
+from keywords import KEYWORDS, KeywordMatcher
+
+
+def test_english_inflections_match():
+    assert KEYWORDS.categories("we have loans for you") == {"loan"}
+    assert KEYWORDS.categories("applying now") == {"eligibility"}
+    assert KEYWORDS.categories("your loan is approved") == {"loan"}
+    assert KEYWORDS.categories("interested in a top-up?") == {"loan"}
+
+
+def test_inflected_span_covers_suffix():
+    assert KEYWORDS.find("two loans") == [(4, 9, "loan", {"loan"})]
+
+
+def test_english_terms_still_need_a_boundary():
+    assert KEYWORDS.categories("much") == set()          # "uh"
+    assert KEYWORDS.categories("emission") == set()      # "emi"
+    assert KEYWORDS.categories("loanee") == set()
+
+
+def test_tamil_terms_take_any_suffix():
+    assert KEYWORDS.categories("கடனுக்கு வட்டி") == {"loan"}
+    assert KEYWORDS.categories("பஜாஜ்ல இருந்து பேசறேன்") == {"company"}
+
+
+def test_shorter_term_inside_longer_one():
+    matcher = KeywordMatcher({"a": ["can"], "b": ["can i help"]})
+    assert matcher.categories("cans i help") == {"a"}
+    assert matcher.categories("can i helps") == {"a", "b"}
+
+
+def test_categories_many_matches_per_text():
+    texts = ["loans", "nothing here", "applied yesterday"]
+    assert KEYWORDS.categories_many(texts) == [{"loan"}, set(), {"eligibility"}]
@@ -0,0 +1,71 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from pyannote.core import Annotation, Segment
+
+import analyse_staff
+import streaming
+import voice_bank
+from audio import AUDIO_SAMPLE_RATE
+from cache import cache
+
+AGENT_WORDS = ["வணக்கம்", "பஜாஜ்", "finance", "loan"]
+CUSTOMER_WORDS = ["சரி", "ஆமா", "எவ்வளவு", "okay"]
+TURN_SEC = 3.0
+
+
+def fake_whisper(audio, language=None):
+    """Half-second words; the agent and the customer alternate every TURN_SEC."""
+    words = []
+    for i in range(int(audio.duration * 2)):
+        t = i / 2
+        vocab = AGENT_WORDS if int(t // TURN_SEC) % 2 == 0 else CUSTOMER_WORDS
+        words.append(SimpleNamespace(word=" " + vocab[i % 4], start=t, end=t + 0.4))
+    return SimpleNamespace(words=words, text="")
+
+
+def fake_diarize(audio, *args, **kwargs):
+    diar = Annotation()
+    for i, t in enumerate(np.arange(0, audio.duration, TURN_SEC)):
+        diar[Segment(t, min(t + TURN_SEC, audio.duration)), i] = "A" if i % 2 == 0 else "B"
+    return diar
+
+
+@pytest.fixture
+def offline(monkeypatch, tmp_path):
+    monkeypatch.setattr(streaming, "whisper_json", fake_whisper)
+    monkeypatch.setattr(streaming, "diarize", fake_diarize)
+    monkeypatch.setattr(analyse_staff, "gpt_assess",
+                        lambda text, model=None, fallback=True: ({k: 70 for k in analyse_staff.SCORE_KEYS}, "ok"))
+    monkeypatch.setattr(cache, "enabled", False)
+    # an enrolled agent: the voice stage is active for calls scored with audio
+    bank = voice_bank.VoiceBank(str(tmp_path / "bank.npz"))
+    bank.enroll("agent_1", np.ones(8, dtype=np.float32), save=False)
+    monkeypatch.setattr(voice_bank, "_bank", bank)
+    assert voice_bank.active()
+
+
+def test_streaming_scores_with_enrolled_voice_bank(offline):
+    updates = []
+    stream = streaming.StreamingAnalyzer("call_1", window_sec=12, context_sec=6,
+                                         score_every_sec=24, on_update=updates.append)
+    pcm = (np.random.default_rng(0).normal(size=AUDIO_SAMPLE_RATE * 60) * 1000).astype(np.int16)
+    second = AUDIO_SAMPLE_RATE
+    for i in range(0, 40 * second, second):
+        stream.feed(pcm[i:i + second].tobytes())
+    deadline = time.monotonic() + 10
+    while stream.provisional is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert stream.provisional is not None and stream.provisional["staff_score"] == 70
+    for i in range(40 * second, len(pcm), second):
+        stream.feed(pcm[i:i + second].tobytes())
+    result = stream.finish()
+
+    assert result["staff_score"] == 70
+    assert result["staff_label"] == stream.segments[0]["speaker"]
+    assert updates[-1]["final"] and updates[-1]["provisional"] == result
+    # frozen + open segments equal build_segments over every committed word
+    assert stream.segments == analyse_staff.build_segments(stream.words)
+    assert stream.flags and {f["keyword"] for f in stream.flags} <= {"பஜாஜ்", "finance"}
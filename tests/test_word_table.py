@@ -0,0 +1,30 @@
+from word_table import SegmentTable, WordTable
+
+
+def _table(rows):
+    return WordTable.from_dicts([{"word": w, "start": float(i), "end": i + 0.9, "speaker": sp}
+                                 for i, (w, sp) in enumerate(rows)])
+
+
+def test_segments_match_dicts():
+    table = _table([("a1", "A"), ("a2", "A"), ("b1", "B"), ("a3", "A")])
+    assert table.segments(min_sec=0).to_dicts() == [
+        {"speaker": "A", "text": "a1 a2", "start": 0.0, "end": 1.9},
+        {"speaker": "B", "text": "b1", "start": 2.0, "end": 2.9},
+        {"speaker": "A", "text": "a3", "start": 3.0, "end": 3.9},
+    ]
+
+
+def test_by_speaker_view_segments_only_hold_that_speaker():
+    view = _table([("a1", "A"), ("b1", "B"), ("a2", "A")]).by_speaker()["A"]
+    assert not view.contiguous
+    assert view.segments(min_sec=0).texts() == ["a1 a2"]
+    assert WordTable.concat([view]).words() == ["a1", "a2"]
+
+
+def test_segment_table_from_dicts_round_trips():
+    segments = _table([("a1", "A"), ("b1", "B"), ("a2", "A")]).segments(min_sec=0).to_dicts()
+    table = SegmentTable.from_dicts(segments)
+    assert table.to_dicts() == segments
+    assert table.text_of("A") == "a1 a2"
+    assert table[-1] == segments[-1] and list(table[:1]) == segments[:1]
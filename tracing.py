@@ -0,0 +1,247 @@
+"""
+tracing.py  –  structured per-call, per-stage spans and their export.
+
+    with tracing.trace(call_id):               # one per call
+        with tracing.span("whisper", audio_sec=audio.duration):
+            ...                                # api_client adds bytes / tokens / retries
+
+Every span records wall and CPU time (CPU of the thread that ran the stage,
+plus whatever a stage reports from worker processes), bytes in/out, audio
+seconds and real-time factor, prompt/completion tokens, retries and cache hits.
+When a call finishes its spans are appended to TRACE_JSONL (one JSON object per
+line) and folded into Prometheus counters/histograms written to TRACE_PROM,
+which worker.py also serves at GET /metrics.  TRACING=off disables export.
+Outside a trace, span() and add() cost next to nothing and record nothing.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+TRACE_JSONL = os.getenv("TRACE_JSONL", "logs/trace.jsonl")
+TRACE_PROM = os.getenv("TRACE_PROM", "logs/metrics.prom")
+ENABLED = os.getenv("TRACING", "on").lower() not in ("0", "off", "false", "no")
+WALL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+COUNTERS = ("bytes_in", "bytes_out", "prompt_tokens", "completion_tokens", "retries", "cache_hits")
+
+_trace = ContextVar("trace", default=None)
+_span = ContextVar("span", default=None)
+
+
+class Span:
+    def __init__(self, stage: str, call_id: str = None, **attrs):
+        self.stage = stage
+        self.call_id = call_id
+        self.attrs = attrs
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.extra_cpu = 0.0
+        self.start = time.time()
+        self.wall_sec = self.cpu_sec = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def add(self, cpu_sec: float = 0.0, **counts):
+        """Accumulate counters; safe from any thread working for this span."""
+        with self._lock:
+            self.extra_cpu += cpu_sec
+            for k, v in counts.items():
+                self.counts[k] = self.counts.get(k, 0) + v
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def record(self) -> dict:
+        out = {"call_id": self.call_id, "stage": self.stage, "start": round(self.start, 3),
+               "wall_sec": self.wall_sec, "cpu_sec": self.cpu_sec, **self.counts, **self.attrs}
+        audio_sec = self.attrs.get("audio_sec")
+        if audio_sec:
+            out["rtf"] = round(self.wall_sec / audio_sec, 4)
+        if self.error:
+            out["error"] = self.error
+        return out
+
+
+class Trace:
+    def __init__(self, call_id: str):
+        self.call_id = call_id
+        self.spans = []
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self):
+        """Make this the current trace in this thread (e.g. a batch stage worker)."""
+        token = _trace.set(self)
+        try:
+            yield self
+        finally:
+            _trace.reset(token)
+
+    def _add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def close(self, error: str = None):
+        """Add the root "call" span (wall since creation, CPU summed over stages) and export."""
+        root = Span("call", self.call_id)
+        root.start = self.start
+        root.wall_sec = round(time.perf_counter() - self._t0, 4)
+        root.cpu_sec = round(sum(sp.cpu_sec or 0 for sp in self.spans), 4)
+        root.error = error
+        self._add(root)
+        if ENABLED:
+            export(self)
+
+
+@contextmanager
+def trace(call_id: str):
+    """Trace one call; every span started inside (in any thread it is carried to) joins it."""
+    t = Trace(call_id)
+    with t.activate():
+        try:
+            yield t
+        except Exception as e:
+            t.close(error=f"{type(e).__name__}: {e}")
+            raise
+        t.close()
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    t = _trace.get()
+    sp = Span(stage, t.call_id if t else None, **attrs)
+    token = _span.set(sp)
+    cpu0, t0 = time.thread_time(), time.perf_counter()
+    try:
+        yield sp
+    except Exception as e:
+        sp.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        sp.wall_sec = round(time.perf_counter() - t0, 4)
+        sp.cpu_sec = round(time.thread_time() - cpu0 + sp.extra_cpu, 4)
+        _span.reset(token)
+        if t is not None:
+            t._add(sp)
+
+
+def spanned(stage: str):
+    """Decorator: run the function inside span(<stage>)."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def set_attrs(**attrs):
+    """Set attributes (e.g. audio_sec) on the innermost open span, if any."""
+    sp = _span.get()
+    if sp is not None:
+        sp.set(**attrs)
+
+
+def add(**counts):
+    """Add counters (bytes_in, retries, ...) to the innermost open span, if any."""
+    sp = _span.get()
+    if sp is not None:
+        sp.add(**counts)
+
+
+def current_span():
+    return _span.get()
+
+
+def enter(sp):
+    """Make <sp> current in this task/thread (carrying a span across a thread hop)."""
+    if sp is not None:
+        _span.set(sp)
+
+
+# ---------- export ----------
+_lock = threading.Lock()
+_hist = {}          # stage -> [bucket counts..., +Inf count, sum]
+_totals = {}        # (metric, stage, extra label) -> value
+
+
+def export(t: Trace):
+    records = [sp.record() for sp in t.spans]
+    with _lock:
+        try:
+            os.makedirs(os.path.dirname(TRACE_JSONL) or ".", exist_ok=True)
+            with open(TRACE_JSONL, "a", encoding="utf-8") as f:
+                for r in records:
+                    f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logging.warning(f"Could not write {TRACE_JSONL}: {e}")
+        for r in records:
+            _observe(r)
+        _write_prom()
+
+
+def _observe(r: dict):
+    stage = r["stage"]
+    h = _hist.setdefault(stage, [0] * (len(WALL_BUCKETS) + 1) + [0.0])
+    for i, le in enumerate(WALL_BUCKETS):
+        if r["wall_sec"] <= le:
+            h[i] += 1
+    h[len(WALL_BUCKETS)] += 1
+    h[-1] += r["wall_sec"]
+
+    def inc(metric, value, extra=None):
+        if value:
+            key = (metric, stage, extra)
+            _totals[key] = _totals.get(key, 0) + value
+
+    inc("call_stage_cpu_seconds_total", r["cpu_sec"])
+    inc("call_stage_audio_seconds_total", r.get("audio_sec"))
+    inc("call_stage_bytes_total", r["bytes_in"], ("direction", "in"))
+    inc("call_stage_bytes_total", r["bytes_out"], ("direction", "out"))
+    inc("call_stage_tokens_total", r["prompt_tokens"], ("kind", "prompt"))
+    inc("call_stage_tokens_total", r["completion_tokens"], ("kind", "completion"))
+    inc("call_stage_retries_total", r["retries"])
+    inc("call_stage_cache_hits_total", r["cache_hits"])
+    inc("call_stage_errors_total", 1 if r.get("error") else 0)
+
+
+def prometheus_text() -> str:
+    """Current metrics in the Prometheus text exposition format."""
+    with _lock:
+        return _prom_text()
+
+
+def _prom_text() -> str:
+    lines = ["# HELP call_stage_wall_seconds Wall time per pipeline stage.",
+             "# TYPE call_stage_wall_seconds histogram"]
+    for stage, h in sorted(_hist.items()):
+        for le, n in zip(WALL_BUCKETS, h):
+            lines.append(f'call_stage_wall_seconds_bucket{{stage="{stage}",le="{le}"}} {n}')
+        lines.append(f'call_stage_wall_seconds_bucket{{stage="{stage}",le="+Inf"}} {h[len(WALL_BUCKETS)]}')
+        lines.append(f'call_stage_wall_seconds_sum{{stage="{stage}"}} {round(h[-1], 4)}')
+        lines.append(f'call_stage_wall_seconds_count{{stage="{stage}"}} {h[len(WALL_BUCKETS)]}')
+    typed = set()
+    for (metric, stage, extra), value in sorted(_totals.items(), key=lambda kv: str(kv[0])):
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        labels = f'stage="{stage}"' + (f',{extra[0]}="{extra[1]}"' if extra else "")
+        lines.append(f"{metric}{{{labels}}} {round(value, 4)}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_prom():
+    try:
+        os.makedirs(os.path.dirname(TRACE_PROM) or ".", exist_ok=True)
+        tmp = f"{TRACE_PROM}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(_prom_text())
+        os.replace(tmp, TRACE_PROM)     # scrapers never see a half-written file
+    except OSError as e:
+        logging.warning(f"Could not write {TRACE_PROM}: {e}")
@@ -0,0 +1,65 @@
+"""
+translate.py  –  text-only translation of timestamped transcript segments.
+
+Instead of uploading the audio a second time for English, the Tamil
+verbose_json segments are translated as text.  Segments are sent in small
+groups, groups run concurrently, and every English line keeps the start/end of
+the Tamil segment it came from, so it stays aligned with diarized segments.
+"""
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import api_client
+
+TRANSLATE_MODEL = "gpt-4o-mini"
+GROUP_SIZE = 20        # segments per request
+MAX_PARALLEL = 8
+
+
+def _translate_group(texts: list[str], source: str, target: str) -> list[str]:
+    prompt = (
+        f"Translate each {source} call-centre utterance to {target}.\n"
+        f"Return JSON {{\"translations\": [...]}} with exactly {len(texts)} strings, in order.\n\n"
+        + json.dumps(texts, ensure_ascii=False)
+    )
+    resp = api_client.chat(
+        model=TRANSLATE_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        response_format={"type": "json_object"},
+        temperature=0,
+    )
+    try:
+        out = json.loads(resp.choices[0].message.content)["translations"]
+    except (json.JSONDecodeError, KeyError, TypeError):
+        out = None
+    if not isinstance(out, list) or len(out) != len(texts):
+        if len(texts) == 1:
+            logging.warning("Translation reply unusable, keeping source text")
+            return texts
+        # model merged or split lines: fall back to one request per segment
+        logging.warning(f"Translation group of {len(texts)} came back misaligned; retrying singly")
+        return [_translate_group([t], source, target)[0] for t in texts]
+    return [str(t).strip() for t in out]
+
+
+def translate_segments(segments: list, source: str = "Tamil", target: str = "English") -> list[dict]:
+    """
+    <segments>: objects or dicts with start/end/text (verbose_json segments).
+    Returns [{"start", "end", "text", "translation"}, ...] in the same order.
+    """
+    rows = [
+        {"start": _get(s, "start"), "end": _get(s, "end"), "text": _get(s, "text").strip()}
+        for s in segments
+    ]
+    groups = [rows[i:i + GROUP_SIZE] for i in range(0, len(rows), GROUP_SIZE)]
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_PARALLEL, len(groups)))) as pool:
+        results = pool.map(lambda g: _translate_group([r["text"] for r in g], source, target), groups)
+        for group, translated in zip(groups, results):
+            for row, english in zip(group, translated):
+                row["translation"] = english
+    return rows
+
+
+def _get(seg, key):
+    return seg[key] if isinstance(seg, dict) else getattr(seg, key)
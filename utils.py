@@ -1,11 +1,13 @@
 import os
-import librosa
-import soundfile as sf
-import noisereduce as nr
+
+import numpy as np
 from pydub import AudioSegment
 from pydub.effects import normalize
 
 def reduce_noise(input_path, output_path):
+    import librosa
+    import noisereduce as nr
+    import soundfile as sf
     y, sr = librosa.load(input_path, sr=None)
     reduced = nr.reduce_noise(y=y, sr=sr)
     sf.write(output_path, reduced, sr)
@@ -16,8 +18,14 @@ def normalize_audio(input_path, output_path):
     normalized.export(output_path, format="wav")
 
 def chunk_audio(input_path, chunk_dir, chunk_length_ms=60000):
+    """Chunks of at most <chunk_length_ms>, cut at the quietest point near each limit."""
+    from audio import plan_chunks
+
     audio = AudioSegment.from_file(input_path)
-    chunks = [audio[i:i+chunk_length_ms] for i in range(0, len(audio), chunk_length_ms)]
+    mono = np.array(audio.set_channels(1).get_array_of_samples())
+    bounds = plan_chunks(mono, audio.frame_rate, chunk_length_ms / 1000,
+                         search_sec=min(5.0, chunk_length_ms / 4000))
+    chunks = [audio[s * 1000 // audio.frame_rate:e * 1000 // audio.frame_rate] for s, e in bounds]
     os.makedirs(chunk_dir, exist_ok=True)
     chunk_paths = []
     for idx, chunk in enumerate(chunks):
@@ -25,3 +33,372 @@ def chunk_audio(input_path, chunk_dir, chunk_length_ms=60000):
         chunk.export(chunk_path, format="wav")
         chunk_paths.append(chunk_path)
     return chunk_paths
+
+
+# ---------- in-memory preprocessing chain ----------
+# PreprocessChain replaces the reduce_noise -> normalize_audio -> chunk_audio
+# file round-trips: the call is read block by block, every stage works on
+# float32 NumPy blocks and keeps only the context it needs, and nothing is
+# written unless to_files() is asked to.
+#
+#     chain = PreprocessChain(chunk_sec=60)
+#     chunks = list(chain.iter_chunks("call.wav"))          # int16 arrays at 16 kHz
+#     chain.to_files("call.wav", "call_norm.wav", "chunks/call_0")
+#
+# A stage is any object with process(block) -> block and flush() -> block.
+PREP_SAMPLE_RATE = 16_000
+PREP_BLOCK_SEC = float(os.getenv("PREP_BLOCK_SEC", "30"))
+PEAK_HEADROOM_DB = 0.1          # same headroom as pydub.effects.normalize
+_EMPTY = np.zeros(0, np.float32)
+
+
+class _Overlapped:
+    """
+    Stage computed on [margin | block | margin] segments and cropped to the
+    block, which gives the same samples as transforming the whole signal at
+    once.  Block edges fall on multiples of <align> input samples.
+    """
+    align = 1
+    margin = 0
+
+    def __init__(self):
+        self._buf = _EMPTY          # input from <_buf_start> on
+        self._buf_start = 0
+        self._done = 0              # input samples whose output was emitted
+
+    def _transform(self, seg: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def _out_len(self, n_in: int) -> int:
+        return n_in
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        self._buf = np.concatenate([self._buf, x]) if len(self._buf) else x
+        end = self._buf_start + len(self._buf) - self.margin
+        return self._emit(end - end % self.align, final=False)
+
+    def flush(self) -> np.ndarray:
+        return self._emit(self._buf_start + len(self._buf), final=True)
+
+    def _emit(self, end: int, final: bool) -> np.ndarray:
+        if end <= self._done:
+            return _EMPTY
+        seg_start = max(self._done - self.margin, 0)
+        seg = self._buf[seg_start - self._buf_start:end + self.margin - self._buf_start]
+        y = self._transform(seg)
+        lo = self._out_len(self._done - seg_start)
+        out = y[lo:] if final else y[lo:self._out_len(end - seg_start)]
+        keep = max(end - self.margin, self._buf_start)
+        self._buf = self._buf[keep - self._buf_start:]
+        self._buf_start, self._done = keep, end
+        return out
+
+
+class Resample(_Overlapped):
+    """Polyphase resampling (scipy.signal.resample_poly) with exact block edges."""
+
+    def __init__(self, sr_in: int, sr_out: int = PREP_SAMPLE_RATE):
+        from math import gcd
+        super().__init__()
+        g = gcd(sr_in, sr_out)
+        self.up, self.down = sr_out // g, sr_in // g
+        if (self.up, self.down) != (1, 1):
+            # resample_poly's filter reaches 10 * max(up, down) upsampled samples each way
+            reach = 10 * max(self.up, self.down) // self.up + 2
+            self.align = self.down
+            self.margin = -(-reach // self.down) * self.down
+
+    def _transform(self, seg):
+        if (self.up, self.down) == (1, 1):
+            return seg
+        from scipy.signal import resample_poly
+        return resample_poly(seg, self.up, self.down).astype(np.float32)
+
+    def _out_len(self, n_in):
+        return n_in * self.up // self.down
+
+
+class SpectralGate(_Overlapped):
+    """
+    Stationary spectral gating: one noise profile (per-bin mean + n_std * std
+    of the quietest frames in the first <profile_sec>) gates the whole call.
+    Bins under the threshold are attenuated by <reduce_db>; the mask is
+    smoothed over neighbouring bins and frames to avoid musical noise.
+    """
+
+    def __init__(self, sample_rate: int = PREP_SAMPLE_RATE, n_fft: int = 512, hop: int = 128,
+                 n_std: float = 1.5, reduce_db: float = 20.0, profile_sec: float = 10.0,
+                 quiet_fraction: float = 0.2, smooth: tuple = (3, 5)):
+        super().__init__()
+        self.n_fft, self.hop = n_fft, hop
+        self.n_std, self.quiet_fraction, self.smooth = n_std, quiet_fraction, smooth
+        self.floor = 10 ** (-reduce_db / 20)
+        self.profile_len = int(profile_sec * sample_rate)
+        self.align = hop
+        self.margin = n_fft + (smooth[1] // 2 + 1) * hop
+        self.threshold = None
+        self._pending = []
+
+    def _stft(self, x):
+        from scipy.signal import stft
+        return stft(x, nperseg=self.n_fft, noverlap=self.n_fft - self.hop)[2]
+
+    def fit(self, x: np.ndarray):
+        """Noise threshold per frequency bin, from the quietest frames of <x>."""
+        db = 20 * np.log10(np.abs(self._stft(x)) + 1e-10)
+        frame_db = db.mean(axis=0)
+        quiet = db[:, frame_db <= np.quantile(frame_db, self.quiet_fraction)]
+        self.threshold = (quiet.mean(axis=1) + self.n_std * quiet.std(axis=1))[:, None]
+
+    def _transform(self, seg):
+        from scipy.ndimage import uniform_filter
+        from scipy.signal import istft
+        z = self._stft(seg)
+        speech = (20 * np.log10(np.abs(z) + 1e-10) > self.threshold).astype(np.float32)
+        gain = self.floor + (1 - self.floor) * uniform_filter(speech, self.smooth, mode="nearest")
+        y = istft(z * gain, nperseg=self.n_fft, noverlap=self.n_fft - self.hop)[1]
+        return y[:len(seg)].astype(np.float32)
+
+    def process(self, x):
+        if self.threshold is None:
+            # hold the first <profile_sec> back until the profile is known
+            self._pending.append(x)
+            if sum(map(len, self._pending)) < self.profile_len:
+                return _EMPTY
+            x, self._pending = np.concatenate(self._pending), []
+            self.fit(x[:self.profile_len])
+        return super().process(x)
+
+    def flush(self):
+        head = _EMPTY
+        if self.threshold is None:
+            x, self._pending = np.concatenate(self._pending or [_EMPTY]), []
+            if not len(x):
+                return _EMPTY
+            self.fit(x)
+            head = super().process(x)
+        return np.concatenate([head, super().flush()])
+
+
+class Gain:
+    """Constant gain with clipping to [-1, 1]."""
+
+    def __init__(self, gain: float):
+        self.gain = gain
+
+    def process(self, x):
+        return np.clip(x * self.gain, -1.0, 1.0) if self.gain != 1 else x
+
+    def flush(self):
+        return _EMPTY
+
+
+class Chunker:
+    """Cuts the stream into chunks of at most <chunk_sec>, at pauses (audio.plan_chunks)."""
+
+    def __init__(self, sample_rate: int, chunk_sec: float, search_sec: float = None):
+        self.sample_rate, self.chunk_sec = sample_rate, chunk_sec
+        self.search_sec = min(5.0, chunk_sec / 4) if search_sec is None else search_sec
+        self.max_len = int(chunk_sec * sample_rate)
+        self._buf = _EMPTY
+
+    def _cut(self, x: np.ndarray) -> list:
+        from audio import plan_chunks
+        return plan_chunks(x, self.sample_rate, self.chunk_sec, self.search_sec)
+
+    def process(self, x) -> list:
+        self._buf = np.concatenate([self._buf, x]) if len(self._buf) else x
+        chunks = []
+        while len(self._buf) > self.max_len:
+            _, end = self._cut(self._buf[:self.max_len + 1])[0]
+            chunks.append(self._buf[:end])
+            self._buf = self._buf[end:]
+        return chunks
+
+    def flush(self) -> list:
+        chunks = [self._buf[s:e] for s, e in self._cut(self._buf)] if len(self._buf) else []
+        self._buf = _EMPTY
+        return chunks
+
+
+def _to_int16(x: np.ndarray) -> np.ndarray:
+    return (np.clip(x, -1.0, 32767 / 32768) * 32768).astype(np.int16)
+
+
+def _source(src, sample_rate: int = None, block_sec: float = PREP_BLOCK_SEC):
+    """
+    (sample_rate, blocks) for <src>: a path, WAV/other bytes, a CallAudio or a
+    NumPy array (int16 or float, (n,) or (n, channels)) with <sample_rate>.
+    blocks() yields float32 mono blocks and can be called again for another pass.
+    16-bit WAV files are read block by block; other formats are decoded by pydub
+    in one piece first.
+    """
+    import io
+    import wave
+
+    if hasattr(src, "pcm"):                       # CallAudio
+        src, sample_rate = src.pcm, src.sample_rate
+    if isinstance(src, np.ndarray):
+        if sample_rate is None:
+            raise ValueError("sample_rate is required for array input")
+        arr = src
+        scale = 1 / 32768 if arr.dtype == np.int16 else 1.0
+        step = max(int(block_sec * sample_rate), 1)
+
+        def blocks():
+            for i in range(0, len(arr), step):
+                b = arr[i:i + step].astype(np.float32) * scale
+                yield b.mean(axis=1) if b.ndim > 1 else b
+        return sample_rate, blocks
+
+    if isinstance(src, (bytes, bytearray)):
+        data = bytes(src)
+        opener = lambda: io.BytesIO(data)
+    else:
+        path = src
+        opener = lambda: open(path, "rb")
+    try:
+        with opener() as f, wave.open(f) as wf:
+            sr, ch, width = wf.getframerate(), wf.getnchannels(), wf.getsampwidth()
+    except (wave.Error, EOFError):
+        width = None
+    if width != 2:
+        with opener() as f:
+            seg = AudioSegment.from_file(f).set_sample_width(2)
+        pcm = np.frombuffer(seg.raw_data, np.int16).reshape(-1, seg.channels)
+        return _source(pcm, seg.frame_rate, block_sec)
+
+    def blocks():
+        step = max(int(block_sec * sr), 1)
+        with opener() as f, wave.open(f) as wf:
+            while True:
+                raw = wf.readframes(step)
+                if not raw:
+                    return
+                b = np.frombuffer(raw, np.int16).astype(np.float32) / 32768
+                yield b.reshape(-1, ch).mean(axis=1) if ch > 1 else b
+    return sr, blocks
+
+
+class PreprocessChain:
+    """
+    resample -> noise reduction -> peak/loudness normalization -> chunking, in memory.
+
+    normalize: "peak" (to -PEAK_HEADROOM_DB dBFS, like normalize_audio), "loudness"
+    (speech RMS to <target_dbfs>, never clipping) or None.  The gain is measured in
+    a first pass over the input, so normalization costs one extra read, not memory.
+    """
+
+    def __init__(self, sample_rate: int = PREP_SAMPLE_RATE, denoise: bool = True,
+                 normalize: str = "peak", target_dbfs: float = -20.0, chunk_sec: float = None,
+                 block_sec: float = PREP_BLOCK_SEC, gate: dict = None):
+        if normalize not in (None, "peak", "loudness"):
+            raise ValueError(f"normalize must be 'peak', 'loudness' or None, not {normalize!r}")
+        self.sample_rate, self.denoise, self.normalize = sample_rate, denoise, normalize
+        self.target_dbfs, self.chunk_sec, self.block_sec = target_dbfs, chunk_sec, block_sec
+        self.gate = gate or {}
+
+    def stages(self, sr_in: int, gain: float) -> list:
+        """Fresh stage instances for one recording."""
+        stages = [Resample(sr_in, self.sample_rate)]
+        if self.denoise:
+            stages.append(SpectralGate(self.sample_rate, **self.gate))
+        if gain != 1:
+            stages.append(Gain(gain))
+        return stages
+
+    def measure_gain(self, blocks) -> float:
+        peak, frame_power = 0.0, []
+        for b in blocks:
+            if not len(b):
+                continue
+            peak = max(peak, float(np.abs(b).max()))
+            n = len(b) // 480 * 480             # 30 ms frames at 16 kHz; close enough at others
+            if n:
+                frame_power.append(np.einsum("ij,ij->i", *[b[:n].reshape(-1, 480)] * 2) / 480)
+        if peak == 0:
+            return 1.0
+        max_gain = 10 ** (-PEAK_HEADROOM_DB / 20) / peak
+        if self.normalize == "peak" or not frame_power:
+            return max_gain
+        power = np.concatenate(frame_power)
+        speech = power[power >= np.quantile(power, 0.5)]     # louder half of the frames
+        rms = float(np.sqrt(speech.mean())) or 1e-9
+        return min(10 ** (self.target_dbfs / 20) / rms, max_gain)
+
+    def iter_blocks(self, src, sample_rate: int = None):
+        """Processed int16 blocks (unchunked) at self.sample_rate."""
+        sr, blocks = _source(src, sample_rate, self.block_sec)
+        gain = self.measure_gain(blocks()) if self.normalize else 1.0
+        stages = self.stages(sr, gain)
+        for x in blocks():
+            for st in stages:
+                x = st.process(x)
+            if len(x):
+                yield _to_int16(x)
+        for i, st in enumerate(stages):
+            x = st.flush()
+            for later in stages[i + 1:]:
+                x = later.process(x)
+            if len(x):
+                yield _to_int16(x)
+
+    def iter_chunks(self, src, sample_rate: int = None):
+        """int16 chunks of at most chunk_sec, cut at pauses (one piece without chunk_sec)."""
+        if not self.chunk_sec:
+            yield self.run(src, sample_rate)
+            return
+        chunker = Chunker(self.sample_rate, self.chunk_sec)
+        for block in self.iter_blocks(src, sample_rate):
+            yield from chunker.process(block)
+        yield from chunker.flush()
+
+    def run(self, src, sample_rate: int = None) -> np.ndarray:
+        """The whole processed call as one int16 array."""
+        return np.concatenate([np.zeros(0, np.int16), *self.iter_blocks(src, sample_rate)])
+
+    def to_files(self, src, out_path: str = None, chunk_dir: str = None,
+                 sample_rate: int = None) -> tuple:
+        """
+        Write the processed call to <out_path> and/or its chunks to
+        <chunk_dir>/chunk_<i>.wav in one pass.  Returns (out_path, chunk_paths).
+        """
+        import wave
+
+        def open_wav(path):
+            wf = wave.open(path, "wb")
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(self.sample_rate)
+            return wf
+
+        out = open_wav(out_path) if out_path else None
+        chunker = Chunker(self.sample_rate, self.chunk_sec) if chunk_dir and self.chunk_sec else None
+        pieces = [] if chunk_dir and not chunker else None
+        chunk_paths = []
+
+        def write_chunks(chunks):
+            for c in chunks:
+                path = os.path.join(chunk_dir, f"chunk_{len(chunk_paths)}.wav")
+                with open_wav(path) as wf:
+                    wf.writeframes(c.tobytes())
+                chunk_paths.append(path)
+
+        if chunk_dir:
+            os.makedirs(chunk_dir, exist_ok=True)
+        try:
+            for block in self.iter_blocks(src, sample_rate):
+                if out:
+                    out.writeframes(block.tobytes())
+                if chunker:
+                    write_chunks(chunker.process(block))
+                elif pieces is not None:
+                    pieces.append(block)
+            if chunker:
+                write_chunks(chunker.flush())
+            elif pieces is not None:
+                write_chunks([np.concatenate(pieces or [np.zeros(0, np.int16)])])
+        finally:
+            if out:
+                out.close()
+        return out_path, chunk_paths
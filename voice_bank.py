@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+voice_bank.py  –  enrolled agent voices and staff identification by voice.
+
+The bank holds one L2-normalised speaker embedding (WeSpeaker, the model the
+diarization pipeline already uses) per agent in VOICE_BANK (npz).  Matching a
+call is a single (clusters x agents) cosine product over the whole bank, so
+thousands of agents cost a millisecond or two:
+
+    voices = speaker_embeddings(audio, diar)   # {diar label: embedding}
+    bank().identify(voices)                    # {"label", "agent_id", "score"} or None
+
+Scoring uses the match to pick the staff label before falling back to the
+keyword heuristic.  Each confident match (score >= VOICE_REFRESH_SCORE) moves
+the agent's stored voice a little towards the new call, and a call that
+arrives with a staff_id the bank does not know yet enrolls that agent from the
+keyword-tagged speaker, so the bank fills and stays current as calls arrive.
+
+When the call's agent is known up front, DIAR_MODE=enrolled replaces the
+pipeline's open clustering with a two-class assignment: each local speaker
+embedding is the agent if it is close enough to the enrolled voice, the
+customer otherwise (see EnrolledClustering).
+
+    python voice_bank.py enroll agent_17 sample1.wav sample2.wav
+    python voice_bank.py list
+    python voice_bank.py identify call.wav
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+VOICE_BANK = os.getenv("VOICE_BANK", ".cache/voice_bank.npz")
+# "auto": identify whenever the bank has voices (or the call names its agent); "off": never
+VOICE_ID = os.getenv("VOICE_ID", "auto").lower()
+MATCH_THRESHOLD = float(os.getenv("VOICE_MATCH_THRESHOLD", "0.55"))      # cosine similarity
+REFRESH_SCORE = float(os.getenv("VOICE_REFRESH_SCORE", "0.7"))
+REFRESH_MAX_CALLS = int(os.getenv("VOICE_REFRESH_MAX_CALLS", "50"))      # then an EMA over ~this many
+DIAR_THRESHOLD = float(os.getenv("VOICE_DIAR_THRESHOLD", "0.5"))
+WINDOW_SEC = 3.0
+MAX_WINDOWS = int(os.getenv("VOICE_MAX_WINDOWS", "8"))                   # per speaker
+SAVE_EVERY_SEC = 30.0
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-9)
+
+
+class VoiceBank:
+    def __init__(self, path: str = VOICE_BANK):
+        self.path = path
+        self.ids = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int32)
+        self._row = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        if Path(path).exists():
+            with np.load(path) as z:
+                self.ids = z["ids"].tolist()
+                self.vectors = z["vectors"].astype(np.float32)
+                self.counts = z["counts"].astype(np.int32)
+            self._row = {a: i for i, a in enumerate(self.ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, agent_id) -> bool:
+        return agent_id in self._row
+
+    def vector(self, agent_id: str) -> np.ndarray:
+        return self.vectors[self._row[agent_id]]
+
+    # ---------- matching ----------
+    def identify(self, voices: dict, agent_id: str = None) -> dict:
+        """
+        The (diar label, agent) pair with the highest similarity above
+        MATCH_THRESHOLD, or None.  With <agent_id> (an enrolled agent) only
+        that agent's voice is matched.
+        """
+        if not voices or not len(self.ids):
+            return None
+        labels = list(voices)
+        queries = _normalize(np.stack([voices[label] for label in labels]))
+        with self._lock:
+            if agent_id is not None:
+                if agent_id not in self:
+                    return None
+                sims = queries @ self.vector(agent_id)
+                i = int(np.argmax(sims))
+                best, score = agent_id, float(sims[i])
+            else:
+                sims = queries @ self.vectors.T                  # (labels, agents)
+                i, j = np.unravel_index(int(np.argmax(sims)), sims.shape)
+                best, score = self.ids[j], float(sims[i, j])
+        if score < MATCH_THRESHOLD:
+            return None
+        return {"label": labels[i], "agent_id": best, "score": round(score, 3)}
+
+    def nearest(self, vector: np.ndarray, k: int = 5) -> list:
+        """[(agent_id, similarity)] for the <k> closest enrolled voices."""
+        if not len(self.ids):
+            return []
+        sims = self.vectors @ _normalize(vector)
+        top = np.argsort(-sims)[:k]
+        return [(self.ids[j], round(float(sims[j]), 3)) for j in top]
+
+    # ---------- updates ----------
+    def enroll(self, agent_id: str, vectors, save: bool = True):
+        """Add or refresh <agent_id> with one embedding or several (one per call/sample)."""
+        vectors = _normalize(np.atleast_2d(vectors))
+        with self._lock:
+            for v in vectors:
+                if agent_id in self._row:
+                    r = self._row[agent_id]
+                    n = min(int(self.counts[r]), REFRESH_MAX_CALLS - 1)
+                    self.vectors[r] = _normalize((self.vectors[r] * n + v) / (n + 1))
+                    self.counts[r] += 1
+                else:
+                    self._row[agent_id] = len(self.ids)
+                    self.ids.append(agent_id)
+                    self.vectors = (v[None] if not self.vectors.size
+                                    else np.vstack([self.vectors, v[None]]))
+                    self.counts = np.append(self.counts, 1).astype(np.int32)
+            self._dirty = True
+        if save:
+            self.save()
+
+    def observe(self, voices: dict, match: dict, agent_id: str = None, staff_label: str = None,
+                keyword_tagged: bool = False):
+        """
+        Keep the bank current from a scored call: refresh the matched agent on
+        a confident match, or enroll <agent_id> (given with the call) from the
+        keyword-tagged staff speaker when the bank does not know it yet.
+        """
+        if match and match["score"] >= REFRESH_SCORE:
+            self.enroll(match["agent_id"], voices[match["label"]], save=False)
+        elif agent_id and agent_id not in self and keyword_tagged and staff_label in voices:
+            logging.info(f"Enrolling {agent_id} from speaker {staff_label}")
+            self.enroll(agent_id, voices[staff_label], save=False)
+        else:
+            return
+        if time.monotonic() - self._saved_at >= SAVE_EVERY_SEC:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{threading.get_ident()}.tmp.npz"
+            np.savez(tmp, ids=np.array(self.ids, dtype=str), vectors=self.vectors, counts=self.counts)
+            os.replace(tmp, self.path)
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+
+_bank = None
+_bank_lock = threading.Lock()
+
+
+def bank() -> VoiceBank:
+    """The process-wide bank at VOICE_BANK, loaded on first use."""
+    global _bank
+    if _bank is None:
+        with _bank_lock:
+            if _bank is None:
+                _bank = VoiceBank(VOICE_BANK)
+                import atexit
+                atexit.register(_bank.save)
+    return _bank
+
+
+def active(agent_id: str = None) -> bool:
+    """Whether a call should get the voice stage: something to match or to enroll."""
+    return VOICE_ID != "off" and (agent_id is not None or len(bank()) > 0)
+
+
+# ---------- embeddings ----------
+def _windows(turns: list, sample_rate: int, max_windows: int = MAX_WINDOWS) -> list:
+    """Up to <max_windows> WINDOW_SEC sample ranges, spread over one speaker's turns."""
+    w = int(WINDOW_SEC * sample_rate)
+    spans = []
+    for start, end in turns:
+        a, b = int(start * sample_rate), int(end * sample_rate)
+        spans.extend((s, s + w) for s in range(a, b - w + 1, w))
+    if len(spans) > max_windows:
+        spans = [spans[int(i)] for i in np.linspace(0, len(spans) - 1, max_windows)]
+    return spans
+
+
+def embed(samples: np.ndarray, spans: list) -> np.ndarray:
+    """(len(spans), dim) embeddings of float32 16 kHz <samples>[a:b] windows."""
+    import torch
+
+    import models
+    model = models.get("speaker-embedding")
+    out = []
+    for i in range(0, len(spans), 32):
+        batch = np.stack([samples[a:b] for a, b in spans[i:i + 32]])
+        with torch.inference_mode():
+            out.append(np.asarray(model(torch.from_numpy(batch).unsqueeze(1))))
+    return np.concatenate(out) if out else np.zeros((0, 0), np.float32)
+
+
+def speaker_embeddings(audio, diar) -> dict:
+    """
+    {label: normalised mean embedding} for every diarized speaker with at
+    least one WINDOW_SEC stretch of speech (one batched model pass per call).
+    """
+    turns = {}
+    for seg, _, label in diar.itertracks(yield_label=True):
+        turns.setdefault(label, []).append((seg.start, seg.end))
+    spans = {label: _windows(t, audio.sample_rate) for label, t in turns.items()}
+    flat = [(label, s) for label, ss in spans.items() for s in ss]
+    if not flat:
+        return {}
+    emb = embed(audio.samples, [s for _, s in flat])
+    voices = {}
+    for label in spans:
+        rows = _normalize(emb[[i for i, (l, _) in enumerate(flat) if l == label]])
+        rows = rows[~np.isnan(rows).any(axis=1)]
+        if len(rows):
+            voices[label] = _normalize(rows.mean(axis=0))
+    return voices
+
+
+# ---------- two-class diarization ----------
+_agent = contextvars.ContextVar("enrolled_agent_vector", default=None)
+
+
+class EnrolledClustering:
+    """
+    Mixin over the pipeline's clustering class for when the agent's voice is
+    known: local speaker embeddings at least <threshold> similar to it are the
+    agent (at most one per chunk), every other active speaker the customer.
+    No distance matrix, no hierarchy, no cluster-count search.
+    """
+    threshold = DIAR_THRESHOLD
+
+    def __call__(self, embeddings, segmentations=None, num_clusters=None, min_clusters=None,
+                 max_clusters=None, **kwargs):
+        agent = _agent.get()
+        if agent is None:
+            return super().__call__(embeddings, segmentations=segmentations, num_clusters=num_clusters,
+                                    min_clusters=min_clusters, max_clusters=max_clusters, **kwargs)
+        e = _normalize(embeddings)                                    # (chunks, local, dim)
+        sims = e @ agent
+        missing = np.isnan(sims)
+        scored = np.where(missing, -np.inf, sims)
+        top = scored.argmax(axis=1)
+        rows = np.arange(len(scored))
+        is_agent = np.zeros(scored.shape, dtype=bool)
+        is_agent[rows, top] = scored[rows, top] >= self.threshold
+        hard = np.where(is_agent, 0, 1)
+        hard[missing] = -2
+        soft = np.nan_to_num(np.stack([sims, 2 * self.threshold - sims], axis=-1), nan=-np.inf)
+        customer = e[hard == 1]
+        centroids = np.stack([agent, _normalize(customer.mean(axis=0)) if len(customer)
+                              else np.zeros_like(agent)])
+        return hard, soft, centroids
+
+
+def configure_enrolled(pipeline, threshold: float = DIAR_THRESHOLD):
+    """
+    Switch a loaded SpeakerDiarization pipeline to EnrolledClustering in place.
+    The clustering instance keeps its parameters and other behaviour, and calls
+    made without an agent (see enrolled_agent) still cluster normally.
+    """
+    clustering = pipeline.clustering
+    base = type(clustering)
+    clustering.__class__ = type(f"Enrolled{base.__name__}", (EnrolledClustering, base),
+                                {"threshold": threshold})
+    return pipeline
+
+
+class enrolled_agent:
+    """Context manager: pipeline calls in this thread assign against <vector>."""
+
+    def __init__(self, vector: np.ndarray):
+        self.vector = _normalize(vector)
+
+    def __enter__(self):
+        self._token = _agent.set(self.vector)
+        return self
+
+    def __exit__(self, *exc):
+        _agent.reset(self._token)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    ap = argparse.ArgumentParser(description="Enrolled agent voices.")
+    ap.add_argument("--bank", default=VOICE_BANK)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("enroll", help="enroll an agent from recordings of their voice alone")
+    p.add_argument("agent_id")
+    p.add_argument("files", nargs="+")
+    sub.add_parser("list", help="enrolled agents")
+    p = sub.add_parser("identify", help="diarize a call and match its speakers")
+    p.add_argument("file")
+    args = ap.parse_args()
+
+    from audio import CallAudio
+
+    vb = VoiceBank(args.bank)
+    if args.cmd == "enroll":
+        for path in args.files:
+            with open(path, "rb") as f:
+                audio = CallAudio.from_bytes(f)
+            spans = _windows([(0.0, audio.duration)], audio.sample_rate, max_windows=4 * MAX_WINDOWS)
+            vb.enroll(args.agent_id, _normalize(embed(audio.samples, spans).mean(axis=0)))
+        print(f"{args.agent_id}: {int(vb.counts[vb._row[args.agent_id]])} sample(s) in {args.bank}")
+    elif args.cmd == "list":
+        print(json.dumps(dict(zip(vb.ids, vb.counts.tolist())), indent=2))
+    else:
+        import analyse_staff as core
+        with open(args.file, "rb") as f:
+            audio = CallAudio.from_bytes(f)
+        voices = speaker_embeddings(audio, core.diarize(audio))
+        print(json.dumps({"match": vb.identify(voices),
+                          "nearest": {label: vb.nearest(v) for label, v in voices.items()}}, indent=2))
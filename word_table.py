@@ -0,0 +1,268 @@
+"""
+word_table.py  –  columnar storage for aligned words and their segments.
+
+A long call is tens of thousands of words; as one dict per word (plus the
+segment texts re-joined from them) that is ~350 bytes a word and a lot of
+allocation.  WordTable keeps the same data as columns:
+
+    start, end      float64 arrays (seconds)
+    speaker         int16 codes into .labels (interned speaker names)
+    text            one str: the stripped words joined by single spaces
+    char_start/end  int32 span of each word in .text
+
+so a run of consecutive words is one slice of .text, segment grouping and
+talk time are array operations, slices are zero-copy views, and the whole
+table pickles or saves (to_npz) as a handful of flat buffers.  by_speaker()
+views are not runs of .text; segments() and concat() compact them first.
+
+    table = WordTable.from_words(whisper.words, codes, labels)
+    segments = table.segments(min_sec=1.0)          # SegmentTable
+    segments.to_dicts()                             # build_segments() output
+"""
+import io
+
+import numpy as np
+
+UNKNOWN = "UNKNOWN"
+
+
+class WordTable:
+    def __init__(self, start, end, speaker, labels, text: str, char_start, char_end):
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self.speaker = np.asarray(speaker, dtype=np.int16)
+        self.labels = list(labels)
+        self.text = text
+        self.char_start = np.asarray(char_start, dtype=np.int32)
+        self.char_end = np.asarray(char_end, dtype=np.int32)
+        self._by_speaker = None
+        self._contiguous = None
+
+    # ---------- construction ----------
+    @classmethod
+    def from_columns(cls, words: list, start, end, codes, labels) -> "WordTable":
+        """
+        <words> are strings (stripped here), <codes> index into <labels>;
+        a negative code means no speaker and becomes UNKNOWN.
+        """
+        words = [w.strip() for w in words]
+        codes = np.asarray(codes, dtype=np.int64)
+        labels = list(labels)
+        if len(codes) and codes.min() < 0:
+            if UNKNOWN not in labels:
+                labels.append(UNKNOWN)
+            codes = np.where(codes < 0, labels.index(UNKNOWN), codes)
+        lengths = np.fromiter(map(len, words), dtype=np.int32, count=len(words))
+        char_start = np.zeros(len(words), dtype=np.int32)
+        if len(words):
+            np.cumsum(lengths[:-1] + 1, out=char_start[1:])
+        return cls(start, end, codes, labels, " ".join(words), char_start, char_start + lengths)
+
+    @classmethod
+    def from_words(cls, words, codes, labels) -> "WordTable":
+        """From Whisper word objects (.word/.start/.end) and their speaker codes."""
+        return cls.from_columns([w.word for w in words],
+                                np.fromiter((w.start for w in words), np.float64, len(words)),
+                                np.fromiter((w.end for w in words), np.float64, len(words)),
+                                codes, labels)
+
+    @classmethod
+    def from_dicts(cls, words: list) -> "WordTable":
+        """From align_words_to_speakers()-style dicts."""
+        labels, codes = {}, []
+        for w in words:
+            codes.append(labels.setdefault(w["speaker"], len(labels)))
+        return cls.from_columns([w["word"] for w in words],
+                                [w["start"] for w in words], [w["end"] for w in words],
+                                codes, list(labels))
+
+    @classmethod
+    def concat(cls, tables: list) -> "WordTable":
+        """One table from several (e.g. streaming windows); labels are merged by name."""
+        labels, parts, texts, offset = {}, [], [], 0
+        for t in map(WordTable.compact, tables):
+            remap = np.array([labels.setdefault(name, len(labels)) for name in t.labels] or [0],
+                             dtype=np.int16)
+            base = int(t.char_start[0]) if len(t) else 0
+            parts.append((t.start, t.end, remap[t.speaker],
+                          t.char_start - base + offset, t.char_end - base + offset))
+            if len(t):
+                texts.append(t.text[base:int(t.char_end[-1])])
+                offset += int(t.char_end[-1]) - base + 1
+        cols = [np.concatenate([p[i] for p in parts]) if parts else [] for i in range(5)]
+        return cls(cols[0], cols[1], cols[2], list(labels), " ".join(texts), cols[3], cols[4])
+
+    @property
+    def contiguous(self) -> bool:
+        """Whether consecutive words are consecutive in .text (false for by_speaker() views)."""
+        if self._contiguous is None:
+            self._contiguous = bool(np.all(self.char_start[1:] == self.char_end[:-1] + 1))
+        return self._contiguous
+
+    def compact(self) -> "WordTable":
+        """This table with its own, contiguous text buffer (self if it already is)."""
+        if self.contiguous:
+            return self
+        return WordTable.from_columns(self.words(), self.start, self.end, self.speaker, self.labels)
+
+    # ---------- access ----------
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            # zero-copy: column views over the same text buffer
+            return WordTable(self.start[i], self.end[i], self.speaker[i], self.labels,
+                             self.text, self.char_start[i], self.char_end[i])
+        return {"word": self.word(i), "start": float(self.start[i]), "end": float(self.end[i]),
+                "speaker": self.labels[self.speaker[i]]}
+
+    def __iter__(self):
+        return iter(self.to_dicts())
+
+    def word(self, i: int) -> str:
+        return self.text[self.char_start[i]:self.char_end[i]]
+
+    def words(self) -> list:
+        cs, ce, text = self.char_start.tolist(), self.char_end.tolist(), self.text
+        return [text[a:b] for a, b in zip(cs, ce)]
+
+    def to_dicts(self) -> list:
+        """align_words_to_speakers()-style list of dicts."""
+        names = [self.labels[c] for c in self.speaker.tolist()]
+        return [{"word": w, "start": s, "end": e, "speaker": n}
+                for w, s, e, n in zip(self.words(), self.start.tolist(), self.end.tolist(), names)]
+
+    def speaker_code(self, label: str) -> int:
+        return self.labels.index(label) if label in self.labels else -1
+
+    def by_speaker(self) -> dict:
+        """
+        {label: WordTable} of each speaker's words in time order.  One stable
+        speaker-sorted copy is made on first use; every view is a slice of it.
+        """
+        if self._by_speaker is None:
+            order = np.argsort(self.speaker, kind="stable")
+            sorted_codes = self.speaker[order]
+            bounds = np.searchsorted(sorted_codes, np.arange(len(self.labels) + 1))
+            cols = WordTable(self.start[order], self.end[order], sorted_codes, self.labels,
+                             self.text, self.char_start[order], self.char_end[order])
+            self._by_speaker = {label: cols[bounds[c]:bounds[c + 1]]
+                                for c, label in enumerate(self.labels) if bounds[c + 1] > bounds[c]}
+        return self._by_speaker
+
+    def talk_time(self) -> dict:
+        """Seconds of words per speaker."""
+        sec = np.bincount(self.speaker, weights=self.end - self.start, minlength=len(self.labels))
+        return {label: float(sec[c]) for c, label in enumerate(self.labels) if sec[c] > 0}
+
+    # ---------- segments ----------
+    def segments(self, min_sec: float = 1.0) -> "SegmentTable":
+        """
+        Runs of consecutive same-speaker words lasting at least <min_sec>
+        (first word start to last word end), as in build_segments().
+        """
+        if not self.contiguous:
+            return self.compact().segments(min_sec)
+        n = len(self)
+        if n == 0:
+            return SegmentTable(self, np.zeros(0, np.int64), np.zeros(0, np.int64))
+        first = np.flatnonzero(np.concatenate(([True], self.speaker[1:] != self.speaker[:-1])))
+        last = np.append(first[1:] - 1, n - 1)
+        keep = self.end[last] - self.start[first] >= min_sec
+        return SegmentTable(self, first[keep], last[keep])
+
+    # ---------- serialization ----------
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_by_speaker"] = state["_contiguous"] = None         # derived
+        return state
+
+    def to_npz(self, file=None):
+        """Save to <file> (path or file object); without one, return the npz bytes."""
+        out = io.BytesIO() if file is None else file
+        np.savez(out, start=self.start, end=self.end, speaker=self.speaker,
+                 labels=np.array(self.labels, dtype=str),
+                 text=np.frombuffer(self.text.encode("utf-8"), dtype=np.uint8),
+                 char_start=self.char_start, char_end=self.char_end)
+        return out.getvalue() if file is None else None
+
+    @classmethod
+    def from_npz(cls, file) -> "WordTable":
+        """Load from a path, file object or the bytes to_npz() returned."""
+        if isinstance(file, (bytes, bytearray)):
+            file = io.BytesIO(file)
+        with np.load(file) as z:
+            return cls(z["start"], z["end"], z["speaker"], z["labels"].tolist(),
+                       z["text"].tobytes().decode("utf-8"), z["char_start"], z["char_end"])
+
+
+class SegmentTable:
+    """Segments as word-index ranges [first, last] into a contiguous WordTable."""
+
+    def __init__(self, words: WordTable, first, last):
+        self.words = words
+        self.first = first
+        self.last = last
+
+    @classmethod
+    def from_dicts(cls, segments: list) -> "SegmentTable":
+        """From build_segments()-style dicts: one row per segment, its text as one "word"."""
+        words = WordTable.from_dicts([{"word": s["text"], "start": s["start"], "end": s["end"],
+                                       "speaker": s["speaker"]} for s in segments])
+        rows = np.arange(len(segments))
+        return cls(words, rows, rows)
+
+    def __len__(self) -> int:
+        return len(self.first)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return SegmentTable(self.words, self.first[i], self.last[i])
+        i = range(len(self))[i]
+        return SegmentTable(self.words, self.first[i:i + 1], self.last[i:i + 1]).to_dicts()[0]
+
+    def __iter__(self):
+        return iter(self.to_dicts())
+
+    def speakers(self) -> list:
+        """Speaker label of each segment."""
+        labels = self.words.labels
+        return [labels[c] for c in self.speaker.tolist()]
+
+    @property
+    def start(self) -> np.ndarray:
+        return self.words.start[self.first]
+
+    @property
+    def end(self) -> np.ndarray:
+        return self.words.end[self.last]
+
+    @property
+    def speaker(self) -> np.ndarray:
+        return self.words.speaker[self.first]
+
+    def texts(self) -> list:
+        text = self.words.text
+        return [text[a:b] for a, b in zip(self.words.char_start[self.first].tolist(),
+                                          self.words.char_end[self.last].tolist())]
+
+    def to_dicts(self) -> list:
+        """build_segments()-style list of dicts."""
+        return [{"speaker": sp, "text": t, "start": s, "end": e}
+                for sp, t, s, e in zip(self.speakers(), self.texts(),
+                                       self.start.tolist(), self.end.tolist())]
+
+    def talk_time(self) -> dict:
+        """Seconds of segments per speaker."""
+        sec = np.bincount(self.speaker, weights=self.end - self.start,
+                          minlength=len(self.words.labels))
+        return {label: float(sec[c]) for c, label in enumerate(self.words.labels) if sec[c] > 0}
+
+    def text_of(self, label: str) -> str:
+        """All of one speaker's segment texts, space-joined."""
+        code = self.words.speaker_code(label)
+        mask = self.speaker == code
+        text = self.words.text
+        return " ".join(text[a:b] for a, b in zip(self.words.char_start[self.first[mask]].tolist(),
+                                                  self.words.char_end[self.last[mask]].tolist()))
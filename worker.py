@@ -0,0 +1,210 @@
+"""
+worker.py  –  resident analysis worker with a local job queue.
+
+Keeps the models analyse_call uses loaded – by default those of the configured
+DIAR_MODE and WHISPER_BACKEND (analyse_staff.pipeline_models) – and serves it
+over local HTTP or a Unix socket, so a job costs inference time only.
+
+    python worker.py --port 8765 --concurrency 2 --queue 16
+    python worker.py --socket /tmp/call_analysis.sock --preload diarization faster-whisper:small
+
+API (JSON):
+    POST /analyse   {"url": ..., "staff_id": ...}  -> analyse_call result (blocks until done)
+    POST /jobs      {"url": ..., "staff_id": ...}  -> {"job_id": ...}  (202, runs in background)
+    GET  /jobs/<id>               -> {"status": "queued|running|done|error", ...}
+    GET  /health                  -> loaded models, running / queued counts
+    GET  /metrics                 -> per-stage Prometheus metrics (see tracing.py)
+"staff_id" (optional) names the call's agent for voice identification and
+enrolled diarization (voice_bank.py).  A full queue answers 503 with
+Retry-After instead of piling up work.
+"""
+import json
+import logging
+import os
+import socketserver
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import analyse_staff as core
+import models
+import tracing
+
+MAX_KEPT_JOBS = 1000
+
+
+class JobQueue:
+    """<concurrency> calls run at once; at most <max_queued> more may wait."""
+
+    def __init__(self, concurrency: int, max_queued: int):
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job")
+        self._slots = threading.BoundedSemaphore(concurrency + max_queued)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.running = 0
+
+    def submit(self, url: str, staff_id: str = None):
+        """Return the job id, or None when the queue is full."""
+        if not self._slots.acquire(blocking=False):
+            return None
+        job_id = uuid.uuid4().hex[:12]
+        job = {"job_id": job_id, "url": url, "staff_id": staff_id, "status": "queued"}
+        with self._lock:
+            self._jobs[job_id] = job
+            while len(self._jobs) > MAX_KEPT_JOBS:
+                self._jobs.popitem(last=False)
+        job["future"] = self._pool.submit(self._run, job)
+        return job_id
+
+    def _run(self, job: dict):
+        with self._lock:
+            self.running += 1
+        job["status"] = "running"
+        try:
+            job["result"] = core.analyse_call(job["url"], show_conversation=False,
+                                              staff_id=job["staff_id"])
+            job["status"] = "done"
+        except Exception as e:
+            logging.error(f"Job {job['job_id']} ({job['url']}) failed: {e}")
+            job["error"] = str(e)
+            job["status"] = "error"
+        finally:
+            with self._lock:
+                self.running -= 1
+            self._slots.release()
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            queued = sum(1 for j in self._jobs.values() if j["status"] == "queued")
+            return {"running": self.running, "queued": queued}
+
+
+def _public(job: dict) -> dict:
+    return {k: v for k, v in job.items() if k != "future"}
+
+
+class Handler(BaseHTTPRequestHandler):
+    jobs: JobQueue = None   # set by serve()
+
+    def address_string(self):
+        # Unix-socket peers have no (host, port) tuple
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, fmt, *args):
+        logging.info("worker %s - " + fmt, self.address_string(), *args)
+
+    def _send(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_text(self, status: int, text: str):
+        data = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_job(self):
+        """(url, staff_id) from the request body; url is None after a 400 reply."""
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            url, staff_id = body.get("url"), body.get("staff_id")
+        except (ValueError, AttributeError):
+            url, staff_id = None, None
+        if not url or not isinstance(url, str) or not (staff_id is None or isinstance(staff_id, str)):
+            self._send(400, {"error": 'body must be JSON like {"url": "...", "staff_id": "..."} '
+                                      '(staff_id optional)'})
+            return None, None
+        return url, staff_id
+
+    def _busy(self):
+        self._send(503, {"error": "queue full", **self.jobs.stats()}, {"Retry-After": "5"})
+
+    def do_POST(self):
+        if self.path not in ("/analyse", "/jobs"):
+            return self._send(404, {"error": f"unknown path {self.path}"})
+        url, staff_id = self._read_job()
+        if not url:
+            return
+        job_id = self.jobs.submit(url, staff_id)
+        if job_id is None:
+            return self._busy()
+        if self.path == "/jobs":
+            return self._send(202, {"job_id": job_id})
+
+        job = self.jobs.get(job_id)
+        job["future"].result()
+        if job["status"] == "error":
+            return self._send(500, _public(job))
+        self._send(200, job["result"])
+
+    def do_GET(self):
+        if self.path == "/health":
+            return self._send(200, {"status": "ok", "loaded": models.loaded(), **self.jobs.stats()})
+        if self.path == "/metrics":
+            return self._send_text(200, tracing.prometheus_text())
+        if self.path.startswith("/jobs/"):
+            job = self.jobs.get(self.path[len("/jobs/"):])
+            if job is None:
+                return self._send(404, {"error": "unknown job"})
+            return self._send(200, _public(job))
+        self._send(404, {"error": f"unknown path {self.path}"})
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, socket_path: str = None,
+          concurrency: int = 2, max_queued: int = 16, preload=None):
+    for name in core.pipeline_models() if preload is None else preload:
+        models.get(name)   # pay model load once, before the first job
+    Handler.jobs = JobQueue(concurrency, max_queued)
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, Handler)
+        where = socket_path
+    else:
+        server = ThreadingHTTPServer((host, port), Handler)
+        where = f"http://{host}:{port}"
+    logging.info(f"Worker listening on {where} (concurrency={concurrency}, queue={max_queued})")
+    print(f"Worker listening on {where}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Resident call-analysis worker.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--socket", help="serve on this Unix socket instead of TCP")
+    ap.add_argument("--concurrency", type=int, default=2, help="calls analysed at once")
+    ap.add_argument("--queue", type=int, default=16, help="calls allowed to wait before 503")
+    ap.add_argument("--preload", nargs="*", default=None,
+                    help="models to load at startup, e.g. diarization faster-whisper:small "
+                         "(default: those the configured pipeline uses)")
+    args = ap.parse_args()
+    serve(args.host, args.port, args.socket, args.concurrency, args.queue, args.preload)